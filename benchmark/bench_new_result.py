@@ -0,0 +1,173 @@
+"""
+Micro benchmark for per result cost of OpenTmiReport._new_upload_result.
+
+Compares creation of the uploaded result document, a plain dict which references
+the session template serialized once, against building environment, SUT, DUT and
+metadata to opentmi_client Result for every result and serializing it with Result.data
+(behaviour before the template was introduced).
+
+Also compares size and serialization time of uploaded results when shared fields
+are uploaded once in suite summary result (--opentmi_suite_document).
+
+Request body encoding time with stdlib json and the encoder used by uploads
+(orjson when installed), and body size with and without gzip compression.
+
+Usage: python benchmark/bench_new_result.py [--metadata 50] [--results 2000]
+"""
+import argparse
+import datetime
+import json
+import time
+
+from pytest_opentmi import documents, serialize
+from pytest_opentmi.OpenTmiReport import OpenTmiReport
+
+
+class PluginManager:
+    @staticmethod
+    def hasplugin(_name):
+        return False
+
+
+class Option:  # pylint: disable=too-few-public-methods
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+
+class Config:  # pylint: disable=too-few-public-methods
+    pluginmanager = PluginManager()
+
+    def __init__(self, metadata):
+        self.option = Option(metadata)
+
+    @staticmethod
+    def getoption(name):
+        return {'opentmi': 'http://127.0.0.1:3000',
+                'opentmi_batch_bytes': 1024 * 1024,
+                'opentmi_log_limit': 1024 * 1024,
+                'opentmi_stream_queue': 1000,
+                'opentmi_upload_workers': 10,
+                'opentmi_timeout': 30,
+                'opentmi_retries': 3,
+                'opentmi_breaker_threshold': 10,
+                'opentmi_login_check': 'warn',
+                'opentmi_profiling': False,
+                'opentmi_resources': None,
+                'opentmi_stats': False,
+                'opentmi_stats_file': None,
+                'opentmi_suite_document': False,
+                'opentmi_schedule': False,
+                'opentmi_failed_first': False,
+                'opentmi_upload_policy': 'all',
+                'opentmi_detach': False,
+                'opentmi_detach_dir': None,
+                'opentmi_regressions': None,
+                'opentmi_collapse_reruns': False,
+                'opentmi_gzip_threshold': 4096}.get(name)
+
+
+class Item:  # pylint: disable=too-few-public-methods
+    nodeid = 'test_bench.py::test_bench'
+    location = ('test_bench.py', 1, 'test_bench')
+
+    def obj(self):
+        """ test docstring """
+
+
+class Report:  # pylint: disable=too-few-public-methods
+    nodeid = 'test_bench.py::test_bench'
+    head_line = 'test_bench'
+    location = Item.location
+    when = 'call'
+    duration = 0.1
+    skipped = False
+    passed = True
+    capstdout = ''
+    capstderr = ''
+    user_properties = []
+    keywords = {'test_bench': 1, 'smoke': 1, 'test_bench.py': 1}
+
+
+def legacy_result(report, record):
+    """ Build session invariant fields directly to each Result and serialize it """
+    result = documents.new_template(report.config.option.metadata, report._job_id)  # pylint: disable=protected-access
+    result.tcid = record.tcid
+    result.execution.duration = record.duration
+    result.execution.verdict = record.verdict
+    result.execution.profiling['keywords'] = [key for key in record.keywords if key != ""]
+    result.execution.profiling['generated_at'] = report._generated.isoformat()  # pylint: disable=protected-access
+    return result.data
+
+
+def measure(report, results, rebuild):
+    """ per result time to create uploaded result document """
+    # pylint: disable=protected-access
+    report._options.suite_document = False
+    report._generated = datetime.datetime.now()
+    record = report._new_record(Report())
+    record.verdict = 'pass'
+    record.generated_at = report._generated.isoformat()
+    start = time.perf_counter()
+    for _ in range(results):
+        if rebuild:
+            legacy_result(report, record)
+        else:
+            report._new_upload_result(record)
+    return (time.perf_counter() - start) / results
+
+
+def measure_upload(report, results, suite_document):
+    """ per result upload document creation and serialization time and size """
+    # pylint: disable=protected-access
+    report._options.suite_document = suite_document
+    report._generated = datetime.datetime.now()
+    record = report._new_record(Report())
+    start = time.perf_counter()
+    for _ in range(results):
+        size = len(serialize.dumps(report._new_upload_result(record)))
+    return (time.perf_counter() - start) / results, size
+
+
+def measure_encoding(report, results, gzip_threshold):
+    """ request body encoding time and size on wire of one full result """
+    # pylint: disable=protected-access
+    report._options.suite_document = False
+    data = report._new_upload_result(report._new_record(Report()))
+    start = time.perf_counter()
+    for _ in range(results):
+        body = serialize.compress(json.dumps(data).encode('utf-8'), gzip_threshold)
+    legacy = (time.perf_counter() - start) / results
+    start = time.perf_counter()
+    for _ in range(results):
+        body = serialize.compress(serialize.dumps(data), gzip_threshold)
+    return legacy, (time.perf_counter() - start) / results, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--metadata', type=int, default=50)
+    parser.add_argument('--results', type=int, default=2000)
+    args = parser.parse_args()
+    metadata = [('DUT_SERIAL_NUMBER', '123'), ('DUT_MODEL', 'S5'), ('SUT_COMPONENT', 'core')]
+    metadata += [(f'key_{index}', {'value': index, 'list': list(range(10))})
+                 for index in range(args.metadata)]
+    report = OpenTmiReport(Config(metadata))
+    report._items[OpenTmiReport._get_test_key(Item)] = Item()  # pylint: disable=protected-access
+    rebuild = measure(report, args.results, rebuild=True)
+    reuse = measure(report, args.results, rebuild=False)
+    print(f'metadata keys: {len(metadata)}, results: {args.results}')
+    print(f'Result per result: {rebuild * 1e6:8.1f} us/result')
+    print(f'plain document:    {reuse * 1e6:8.1f} us/result')
+    for suite_document in (False, True):
+        elapsed, size = measure_upload(report, args.results, suite_document)
+        label = 'suite document:' if suite_document else 'full results:'
+        print(f'{label:<18} {elapsed * 1e6:8.1f} us/result serialized, {size} bytes/result')
+    for threshold in (0, 1):
+        legacy, elapsed, size = measure_encoding(report, args.results, threshold)
+        label = 'gzip body:' if threshold else 'plain body:'
+        print(f'{label:<18} {legacy * 1e6:8.1f} us/result json, {elapsed * 1e6:8.1f} us/result '
+              f'{serialize.ENCODER}, {size} bytes/result on wire')
+
+
+if __name__ == '__main__':
+    main()
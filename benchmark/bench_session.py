@@ -0,0 +1,192 @@
+"""
+Benchmark for plugin overhead in synthetic pytest sessions.
+
+Generates test sessions of given sizes and runs each of them in a pytest subprocess
+without the plugin (baseline) and with the plugin uploading to an in-process fake
+opentmi server. Scenarios:
+
+* plain: passing tests
+* logs: tests print captured output which is stored with --opentmi_store_logs
+* metadata: 50 pytest metadata keys are given with --metadata
+
+Measured per run: per-test overhead compared to baseline, time spent in plugin hooks
+(--opentmi_stats), peak memory, upload time at the end of session and number of requests.
+Every run must upload all results without failures (as reported in the terminal summary),
+so that compared modes do the same work. Not usable with --opentmi_detach.
+
+Peak memory is read with os.wait4, so the benchmark runs only on POSIX platforms.
+Results can be written as JSON and compared against earlier results, e.g. of another commit:
+
+  python benchmark/bench_session.py --tests 1000 10000 --output before.json
+  python benchmark/bench_session.py --tests 1000 10000 --compare before.json
+
+Usage: python benchmark/bench_session.py [--tests 1000 10000 100000]
+    [--scenarios plain logs metadata] [--latency 0.005] [--error-rate 0.01]
+    [--pytest-args="--opentmi_stream"] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from test.fake_server import FakeOpenTmiServer  # noqa: E402 pylint: disable=wrong-import-position
+
+SCENARIOS = ('plain', 'logs', 'metadata')
+# metrics where lower is better, compared with --compare,
+# and smallest absolute change which is not considered noise
+METRICS = dict(overhead_us=5, hook_us=5, upload_s=0.05, peak_rss_mb=2, requests=1)
+TESTS_PER_FUNCTION = 100
+UPLOADED = re.compile(r'Uploaded (\d+) results successfully, (\d+) failed')
+
+TEST_MODULE = '''
+import pytest
+
+LOG = {log!r}
+
+
+@pytest.mark.parametrize('index', range({count}))
+def test_synthetic_{function}(index):
+    """ synthetic test {function} """
+    if LOG:
+        print(LOG)
+    assert index >= 0
+'''
+
+
+def generate(directory, tests, logs):
+    """ write test modules with given number of tests """
+    log = ('captured line of synthetic test output ' * 2 + '\n') * 25 if logs else ''
+    functions = max(1, tests // TESTS_PER_FUNCTION)
+    for function in range(functions):
+        count = TESTS_PER_FUNCTION if function < functions - 1 else tests - TESTS_PER_FUNCTION * function
+        with open(os.path.join(directory, f'test_synthetic_{function}.py'), 'w', encoding='utf-8') as file:
+            file.write(TEST_MODULE.format(log=log, count=count, function=function))
+
+
+def run_pytest(directory, args):
+    """ run pytest in subprocess, return wall time, peak rss in MB and output """
+    command = [sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider', directory] + args
+    output_file = os.path.join(directory, 'output.txt')
+    start = time.perf_counter()
+    with open(output_file, 'w', encoding='utf-8') as output:
+        process = subprocess.Popen(command, stdout=output, stderr=subprocess.STDOUT, cwd=directory)
+        _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    if process.returncode:
+        raise RuntimeError(f'pytest failed ({process.returncode}): {" ".join(command)}')
+    # ru_maxrss is kilobytes on linux, bytes on macOS
+    rss = usage.ru_maxrss / 1024 if sys.platform != 'darwin' else usage.ru_maxrss / 1024 / 1024
+    with open(output_file, encoding='utf-8') as output:
+        return wall, rss, output.read()
+
+
+def check_uploads(output, tests, extra_args):
+    """ verify from terminal summary that results were uploaded, return number of uploaded results """
+    match = UPLOADED.search(output)
+    if not match:
+        raise RuntimeError('upload summary is missing from pytest output')
+    uploaded, failed = int(match.group(1)), int(match.group(2))
+    # with upload policy passed results are aggregated, otherwise suite summary result may be added
+    aggregated = any(arg.startswith(('--opentmi_upload_policy', '--opentmi-upload-policy')) for arg in extra_args)
+    if failed or (uploaded < tests and not aggregated):
+        raise RuntimeError(f'{uploaded} of {tests} results uploaded, {failed} failed')
+    return uploaded
+
+
+# pylint: disable=too-many-arguments, too-many-locals
+def bench(tests, scenario, latency, error_rate, extra_args):
+    """ benchmark single session size and scenario """
+    server = FakeOpenTmiServer(latency=latency, error_rate=error_rate, bulk=True).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix='opentmi-bench-') as directory:
+            generate(directory, tests, logs=scenario == 'logs')
+            base_args = []
+            if scenario == 'metadata':
+                for index in range(50):
+                    base_args += ['--metadata', f'KEY_{index}', f'value {index} ' * 10]
+            base_wall, base_rss, _ = run_pytest(directory, base_args)
+            stats_file = os.path.join(directory, 'stats.json')
+            args = base_args + ['--opentmi', server.url, '--opentmi_token', 'bench',
+                                f'--opentmi_stats_file={stats_file}'] + extra_args
+            if scenario == 'logs':
+                args += ['--opentmi_store_logs', '1']
+            wall, rss, output = run_pytest(directory, args)
+            uploaded = check_uploads(output, tests, extra_args)
+            with open(stats_file, encoding='utf-8') as file:
+                stats = json.load(file)
+    finally:
+        server.stop()
+    upload = stats['timings'].get('_upload_reports', {}).get('total', 0)
+    hook_time = sum(timing['total'] for name, timing in stats['timings'].items() if name.startswith('pytest_'))
+    return dict(tests=tests, scenario=scenario,
+                wall_s=round(wall, 3), baseline_wall_s=round(base_wall, 3),
+                overhead_us=round((wall - base_wall) * 1e6 / tests, 1),
+                hook_us=round(hook_time * 1e6 / tests, 1),
+                upload_s=round(upload, 3),
+                peak_rss_mb=round(rss, 1), baseline_peak_rss_mb=round(base_rss, 1),
+                requests=len(server.requests), bytes_received=server.bytes_received, uploaded=uploaded)
+
+
+def compare(results, baseline, threshold):
+    """ print changes against earlier results, return number of regressions """
+    earlier = {(item['tests'], item['scenario']): item for item in baseline['results']}
+    regressions = 0
+    for result in results:
+        before = earlier.get((result['tests'], result['scenario']))
+        if not before:
+            continue
+        for metric, noise in METRICS.items():
+            old, new = before[metric], result[metric]
+            if new <= old * (1 + threshold) or new - old < noise:
+                continue
+            regressions += 1
+            print(f'REGRESSION {result["tests"]} {result["scenario"]} {metric}: {old} -> {new} '
+                  f'(+{(new - old) * 100 / max(old, noise):.0f}%)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tests', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--latency', type=float, default=0, help='fake server response delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='probability of 503 response')
+    parser.add_argument('--pytest-args', default='',
+                        help='additional pytest arguments, e.g. --pytest-args=--opentmi_stream')
+    parser.add_argument('--output', help='write results to JSON file')
+    parser.add_argument('--compare', help='compare against results JSON file of earlier run')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative change reported as regression')
+    args = parser.parse_args()
+    if not hasattr(os, 'wait4'):
+        sys.exit('bench_session.py measures peak memory with os.wait4 and runs only on POSIX platforms')
+
+    results = []
+    print(f'{"tests":>7} {"scenario":>9} {"wall s":>8} {"base s":>8} {"us/test":>8} {"hook us":>8} '
+          f'{"upload s":>8} {"rss MB":>7} {"base MB":>7} {"requests":>8}')
+    for tests in args.tests:
+        for scenario in args.scenarios:
+            result = bench(tests, scenario, args.latency, args.error_rate, shlex.split(args.pytest_args))
+            results.append(result)
+            print(f'{tests:>7} {scenario:>9} {result["wall_s"]:>8} {result["baseline_wall_s"]:>8} '
+                  f'{result["overhead_us"]:>8} {result["hook_us"]:>8} {result["upload_s"]:>8} '
+                  f'{result["peak_rss_mb"]:>7} {result["baseline_peak_rss_mb"]:>7} {result["requests"]:>8}')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(dict(python=sys.version.split()[0], latency=args.latency, error_rate=args.error_rate,
+                           pytest_args=args.pytest_args, results=results), file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
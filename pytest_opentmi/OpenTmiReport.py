@@ -1,22 +1,40 @@
 """
 OpenTmiReport module
 """
-import json
 import os
 import time
 import datetime
+import functools
 import uuid
-import inspect
 import logging
+import threading
 from multiprocessing.dummy import Pool as ThreadPool
 
+import pytest
 from _pytest.fixtures import FixtureLookupErrorRepr
 
 # 3rd party modules
-from opentmi_client import OpenTmiClient, Result
-from opentmi_client.api import Dut, File, Provider, Testcase
+from opentmi_client.utils import OpentmiException, remove_empty_from_dict
 # app modules
-from . import __pytest_info__
+from .uploader import StreamUploader
+from .transport import UploadTransport
+from .batch import BatchUploader
+from . import documents, summary
+from .cache import TestcaseCache, TokenCache
+from .detach import log_path, read_synced_testcases, spawn_uploader, status_path
+from .login import BackgroundLogin
+from .spool import Spool, SpoolReplayer, SpoolState
+from .logstore import LogStore
+from .record import TestRecord, tcid_of
+from .profiler import FixtureProfiler
+from .aggregate import Aggregator
+from .sampler import new_sampler
+from .stats import Stats
+from .sync import TestcaseSync
+from .options import Options
+from .regression import new_regression_check
+from .reruns import RerunCollapse
+from .schedule import FailureHistory, new_scheduler
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +46,14 @@ class OpenTmiReport:
     """
 
     MAX_EXEC_NOTE_LENGTH: int = int(os.environ.get('OPENTMI_MAX_EXEC_NOTE_LENGTH', '1000'))
+    # counters which xdist workers report to controller
+    COUNTERS = ('passed', 'failed', 'errors', 'skipped', 'xpassed', 'xfailed',
+                '_uploaded_success', '_uploaded_failed', '_diverted', '_dropped')
+    # hooks and methods timed with --opentmi_stats
+    TIMED = ('pytest_runtest_logreport', 'pytest_itemcollected', 'pytest_sessionstart',
+             'pytest_collection_finish', 'pytest_sessionfinish', '_new_record', '_new_result',
+             '_new_upload_result', '_upload_reports', '_stream_pending',
+             '_spool_pending', '_upload_record', '_upload_batch', '_upload_testcase', '_wait_testcase_sync')
 
     def __init__(self, config):
         """
@@ -35,306 +61,730 @@ class OpenTmiReport:
         :param config: pytest config object
         """
         self.test_logs = []
-        self.results = []
-        self.tests = []
+        self.records = {}  # unfinished test records by nodeid
+        self.results = []  # finished test records
         self._items = {}
         self.errors = self.failed = 0
         self.passed = self.skipped = 0
         self.xfailed = self.xpassed = 0
-        self._uploaded_failed = 0
-        self._uploaded_success = 0
-        self._suite_time_delta = None
-        self._numtests = None
-        self._generated = None
+        self._uploaded_success = self._uploaded_failed = 0
+        self._diverted = self._dropped = 0
+        self._suite_time_delta = self._numtests = self._generated = None
         self.suite_start_time = None
-        has_rerun = config.pluginmanager.hasplugin("rerunfailures")
-        self.rerun = 0 if has_rerun else None
+        self._template = None
         self.config = config
-        host = config.getoption("opentmi")
-        self._store_logs = config.getoption('opentmi_store_logs')
-        self._client = OpenTmiClient(host)
+        self._options = Options(config)
+        self.rerun = 0 if config.pluginmanager.hasplugin("rerunfailures") else None
+        # rerun attempts are collapsed into final result of test
+        self._reruns = RerunCollapse() if self._options.collapse_reruns and self.rerun is not None else None
+        # xdist: workers upload their own results, controller only suite summary
+        workerinput = getattr(config, 'workerinput', None)
+        self._is_worker = workerinput is not None
+        self._worker_id = (workerinput or {}).get('workerid')
+        # one process syncs testcases of all collected tests, with xdist the first worker
+        self._syncs_testcases = (workerinput or {}).get('workerid', 'gw0') == 'gw0'
+        self._is_controller = False
+        self._worker_transfer = dict(requests=0, bytes_sent=0, bytes_encoded=0, encode_time=0.0,
+                                     testcases_skipped=0, breaker_trips=0)
+        self._job_id = (workerinput or {}).get('opentmi_job_id') or str(uuid.uuid1())
+        self._log_store = None
+        self._detached_pid = None
+        self._spool = self._spool_state = self._replayer = None
+        self._uploader = None
+        self.stats = Stats(node=self._worker_id or 'main') if self._options.stats else None
+        self._transport = UploadTransport(self._options.host, workers=self._options.workers,
+                                          timeout=self._options.timeout, retries=self._options.retries,
+                                          breaker_threshold=self._options.breaker_threshold, stats=self.stats,
+                                          gzip_threshold=self._options.gzip_threshold)
+        self._fallback_spool = None
+        self._lock = threading.Lock()  # upload counters and fallback spool are updated by upload threads
+        self._tc_cache = TestcaseCache(getattr(config, 'cache', None), self._options.host)
+        if self._options.detach_dir is not None:
+            self._tc_cache.merge(read_synced_testcases(self._options.detach_dir))
+        self._login = BackgroundLogin(self._transport, self._options.token,
+                                      TokenCache(getattr(config, 'cache', None), self._options.host))
+        self._testcase_sync = TestcaseSync(self._tc_cache, self._update_testcase, self._login,
+                                           self._options.workers)
+        self.profiler = FixtureProfiler() if self._options.profiling else None
+        self.sampler = new_sampler(config)
+        self._sampled = dict(tests=0, overhead=0.0)  # resource sampling totals of xdist workers
+        self.scheduler = new_scheduler(config, self._login.fetch, workerinput)
+        # duration regressions of performance tests
+        self._regressions = new_regression_check(config, self._login.fetch)
+        self._aggregator = Aggregator(self._options.upload_policy, rate=self._options.sample_rate) \
+            if self._options.upload_policy != 'all' else None
+        self._batcher = None
+        self._stream_batch = []
+        if self._options.batch_size:
+            self._batcher = BatchUploader(self._transport, self._transport.get_url('/api/v0/results'),
+                                          max_count=self._options.batch_size, max_bytes=self._options.batch_bytes,
+                                          on_failed=self._on_result_failed)
+        if self.stats:
+            self._instrument()
+
+    def _instrument(self):
+        """
+        Time hooks and methods of reporter and its helpers with --opentmi_stats
+        :return: None
+        """
+        self.stats.instrument(self, OpenTmiReport.TIMED)
+        self.stats.instrument(self._login, ('login', 'wait'), prefix='login.')
+        self.stats.instrument(self._testcase_sync, ('precompute',), prefix='testcases.')
+        if self._regressions:
+            self.stats.instrument(self._regressions, ('wait',), prefix='regressions.')
 
     def _append_passed(self, report):
         if report.when == "call":
-            result = self._new_result(report)
-            result.execution.verdict = 'pass'
+            record = self._new_record(report)
+            record.verdict = 'pass'
             if hasattr(report, "wasxfail"):
                 self.xpassed += 1
-                result.execution.note = 'xpass'
+                record.note = 'xpass'
             else:
                 self.passed += 1
-            self.results.append(result)
 
     def _append_failed(self, report):
-        result = self._new_result(report)
-        result.execution.note = f'{report.longrepr.reprcrash.message}\n' \
-                                f'{report.longrepr.reprcrash.path}:{report.longrepr.reprcrash.lineno}'
+        record = self._new_record(report)
+        record.note = f'{report.longrepr.reprcrash.message}\n' \
+                      f'{report.longrepr.reprcrash.path}:{report.longrepr.reprcrash.lineno}'
         if getattr(report, "when", None) == "call":
-            result.execution.verdict = 'fail'
+            record.verdict = 'fail'
             if hasattr(report, "wasxfail"):
                 # pytest < 3.0 marked xpasses as failures
                 self.xpassed += 1
-                result.execution.note = 'xfail'
+                record.note = 'xfail'
             else:
                 self.failed += 1
         else:
             self.errors += 1
-            result.execution.verdict = 'error'
-        self.results.append(result)
+            record.verdict = 'error'
 
     def _append_skipped(self, report):
-        result = self._new_result(report)
-        result.execution.verdict = 'skip'
+        record = self._new_record(report)
+        record.verdict = 'skip'
         if hasattr(report, "wasxfail"):
             self.xfailed += 1
-            result.execution.note = f'wasxfail: {report.longrepr.reprcrash.message}'
+            record.note = f'wasxfail: {report.longrepr.reprcrash.message}'
         else:
-            result.execution.note = report.longrepr[2]
+            record.note = report.longrepr[2]
             self.skipped += 1
-        self.results.append(result)
 
     def _append_inconclusive(self, report):
         # For now, the only "other" the plugin give support is rerun
-        result = self._new_result(report)
-        result.execution.verdict = 'inconclusive'
+        record = self._new_record(report)
+        record.verdict = 'inconclusive'
         if isinstance(report.longrepr, FixtureLookupErrorRepr):
             # reprcrash is not available for FixtureLookupError
-            result.execution.note = f'FixtureLookupError: {report.longrepr}'
+            record.note = f'FixtureLookupError: {report.longrepr}'
         else:
-            result.execution.note = f'{report.longrepr.reprcrash.message}\n' \
-                                f'{report.longrepr.reprcrash.path}:{report.longrepr.reprcrash.lineno}'
-        self.results.append(result)
+            record.note = f'{report.longrepr.reprcrash.message}\n' \
+                          f'{report.longrepr.reprcrash.path}:{report.longrepr.reprcrash.lineno}'
 
     # pylint: disable=too-many-branches
     def _append_other(self, report):
         # For now, the only "other" the plugin give support is rerun
         self.rerun += 1
-        result = self._new_result(report)
-        result.execution.verdict = 'inconclusive'
-        result.execution.note = 'rerun'
-        self.results.append(result)
+        record = self._new_record(report)
+        record.verdict = 'inconclusive'
+        record.note = 'rerun'
+
+    def _add_attempt(self, report):
+        """
+        Buffer rerun attempt to be collapsed into final result of test,
+        result of the attempt is discarded
+        :param report: TestReport with rerun outcome
+        :return: None
+        """
+        self.rerun += 1
+        record = self.records.pop(report.nodeid, None)
+        if record and record.verdict == 'pass':
+            # call passed but teardown failed and triggered rerun
+            if record.note == 'xpass':
+                self.xpassed -= 1
+            else:
+                self.passed -= 1
+        self._reruns.add(report, record)
+        if report.when == 'teardown' and self.plugins:
+            # forget profiling of the attempt
+            self._add_profiling(report.nodeid)
 
     def _update_teardown_result(self, report):
         """
-        Function to update last test result if teardown result != passed
-        Last test verdict == pass: Modify result as failed -> update verdict and notes
-        Last test verdict != pass, Update note with failed longrepr information
+        Function to update test result if teardown result != passed
+        Test verdict == pass: Modify result as failed -> update verdict and notes
+        Test verdict != pass, Update note with failed longrepr information
         Function should be called only if teardown result != passed
 
         :param report: report object
         """
-        last_result = self.results[-1]
-        if last_result.execution.verdict == 'pass':
+        record = self.records.get(report.nodeid)
+        if record is None:
+            logger.warning(f'No result for {report.nodeid} to update with teardown failure')
+            return
+        if record.verdict == 'pass':
             # Fail the test if teardown failed:
             self.passed -= 1  # self.passed was incremented in _append_passed() for call phase -> decrement passed
             self.failed += 1  # self.failed have to be updated accordingly -> increment failed
-            last_result.execution.verdict = 'fail'
-            last_result.execution.note = f'Failed on teardown: {report.longrepr.reprcrash.message}\n' \
-                                              f'{report.longrepr.reprcrash.path}:{report.longrepr.reprcrash.lineno}'
+            record.verdict = 'fail'
+            record.note = f'Failed on teardown: {report.longrepr.reprcrash.message}\n' \
+                          f'{report.longrepr.reprcrash.path}:{report.longrepr.reprcrash.lineno}'
         else:
             # No need for verdict modification, update info on execution note, to get info available in opentmi
-            last_result.execution.note += f'\nFailed on teardown: {report.longrepr.reprcrash.message}\n' \
-                                          f'{report.longrepr.reprcrash.path}:{report.longrepr.reprcrash.lineno}'
-        # update result with updated last_result
-        self.results[-1] = last_result
+            record.note += f'\nFailed on teardown: {report.longrepr.reprcrash.message}\n' \
+                           f'{report.longrepr.reprcrash.path}:{report.longrepr.reprcrash.lineno}'
 
-    def _update_user_properties(self, report, result=None):
+    def _update_user_properties(self, report, record=None):
         if report.user_properties:
-            if not result:
-                result = self.results[-1]
-            if not 'properties' in result.execution.profiling:
-                result.execution.profiling['properties'] = {}
+            if not record:
+                record = self.records.get(report.nodeid)
+                if not record:
+                    return
+            if record.properties is None:
+                record.properties = {}
             for (key, value) in report.user_properties:
-                result.execution.profiling['properties'][key] = value
-
-    @staticmethod
-    def _get_tcid(report):
-        return report.head_line.rstrip("[]")
+                record.properties[key] = value
 
-    def _parse_test(self, report):
-        tcid = OpenTmiReport._get_tcid(report)
+    def _new_record(self, report):
+        """
+        Create record for test result, replaces unfinished record of the same test
+        :param report: TestReport
+        :return: TestRecord
+        """
         key = OpenTmiReport._get_test_key(report)
         item = self._items[key]
-        doc = inspect.getdoc(item.obj)
-        test = Testcase(tcid=tcid)
-        test.status.value = "released"
-        if doc:
-            test.other_info.description = doc
-        type_list = ['installation',
-                     'compatibility',
-                     'smoke',
-                     'regression',
-                     'acceptance',
-                     'alpha',
-                     'beta',
-                     'stability',
-                     'functional',
-                     'destructive',
-                     'performance',
-                     'reliability']
-        keywords = list(report.keywords.keys())
-        test.other_info.keywords = keywords
-        for keyword in keywords:
-            if keyword in type_list:
-                test.other_info.type = keyword
-                break
+        record = TestRecord(report.nodeid, tcid_of(report),
+                            duration=report.duration, keywords=list(report.keywords),
+                            description=self._testcase_sync.describe(item))
         if report.skipped:
-            test.execution.skip.value = True
-            if hasattr(report, 'wasxfail'):
-                test.execution.skip.reason = report.wasxfail
-            else:
-                test.execution.skip.reason = report.longrepr[2]
-        return test
-
-    # pylint: disable=too-many-statements
-    def _new_result(self, report):
-        tcid = self._get_tcid(report)
-
-        self.tests.append(self._parse_test(report).data)
-
-        result = Result(tcid=tcid)
-        result.execution.duration = report.duration
-        result.execution.environment.framework.name = __pytest_info__.project_name
-        result.execution.environment.framework.version = __pytest_info__.version
-        result.execution.sut.commit_id = os.environ.get('GIT_COMMIT', "")
-        result.execution.sut.branch = os.environ.get('GIT_BRANCH', "")
-        result.execution.sut.git_url = os.environ.get('GIT_URL', "")
-        # there might be multiple tags so split by ','
-        tag = os.environ.get('GIT_TAG', '')
-        tag = list(filter(None, tag.split(',')))  # cleanup empty items
-        result.execution.sut.tag = tag
-        result.job.id = os.environ.get('BUILD_TAG', str(uuid.uuid1()))
-        result.campaign = os.environ.get('JOB_NAME', "")
-        self._update_user_properties(report=report, result=result)
-        if report.keywords:
-            result.execution.profiling['keywords'] = []
-        for key in report.keywords:
-            if key == "":
-                continue
-            result.execution.profiling['keywords'].append(key)
-        dut = None
-        for item in self.config.option.metadata:
-            key, value = item
+            record.skipped = True
+            record.skip_reason = report.wasxfail if hasattr(report, 'wasxfail') else report.longrepr[2]
+        self._update_user_properties(report=report, record=record)
+        if self._options.store_logs:
+            self._store_record_logs(record, report)
+        self._finish_record(report.nodeid)
+        self.records[report.nodeid] = record
+        return record
+
+    def _finish_record(self, nodeid):
+        """
+        Move record to finished results, no more updates to it are expected
+        :param nodeid: pytest node id
+        :return: None
+        """
+        record = self.records.pop(nodeid, None)
+        if record and (not self._aggregator or self._aggregator.keep(record, in_full=OpenTmiReport._in_full(record))):
+            self.results.append(record)
 
-            if not isinstance(key, str):
-                logger.warning(f"Metadata key is not string: {key}")
-                continue
-            # ensure value is JSON serializable with JSON.dumps
-            try:
-                json.dumps(value)
-            except TypeError:
-                logger.warning(f"Metadata value is not JSON serializable: {value}")
+    @staticmethod
+    def _in_full(record) -> bool:
+        """
+        Flaky tests and duration regressions are uploaded in full also with aggregate upload policy
+        :param record: TestRecord
+        :return: bool
+        """
+        profiling = record.profiling or {}
+        return bool(profiling.get('baseline', {}).get('regression') or profiling.get('reruns', {}).get('flaky'))
+
+    @property
+    def plugins(self):
+        """
+        Helper plugins which are registered to pytest together with reporter
+        :return: list
+        """
+        return [plugin for plugin in (self.profiler, self.sampler, self.scheduler) if plugin]
+
+    def _add_profiling(self, nodeid):
+        profiling = self.profiler.pop(nodeid) if self.profiler else None
+        resources = self.sampler.pop(nodeid) if self.sampler else None
+        if resources:
+            profiling = dict(profiling or {}, resources=resources)
+        record = self.records.get(nodeid)
+        if record and profiling:
+            record.profiling = profiling
+
+    def _finish_records(self):
+        for nodeid in list(self.records):
+            self._finish_record(nodeid)
+        self.records = {}
+
+    def _store_record_logs(self, record, report):
+        """
+        Store captured logs to disk, log content is read back when result is uploaded
+        :param record: TestRecord
+        :param report: TestReport
+        :return: None
+        """
+        for name, text in (('stdout', report.capstdout), ('stderr', report.capstderr)):
+            if not text:
                 continue
+            if not self._log_store:
+                self._log_store = LogStore(max_bytes=self._options.log_limit)
+            if record.logs is None:
+                record.logs = []
+            record.logs.append((name, self._log_store.store(text)))
 
-            # Dut
-            if key.startswith('DUT') and not dut:
-                dut = Dut()
-                dut.type = 'hw'
-                result.execution.append_dut(dut)
-            if key == 'DUT_SERIAL_NUMBER':
-                dut.serial_number = value
-            elif key == 'DUT_TYPE':
-                dut.type = value
-            # elif key == 'DUT_PLATFORM':
-            #     dut.platform = value
-            elif key == 'DUT_VERSION':
-                dut.ver = value
-            elif key == 'DUT_VENDOR':
-                dut.vendor = value
-            elif key == 'DUT_MODEL':
-                dut.model = value
-            elif key == 'DUT_PROVIDER':
-                dut.provider = Provider()
-                dut.provider.name = value
-
-            # Sut
-            elif key == 'SUT_COMPONENT':
-                result.execution.sut.append_cut(value)
-            elif key == 'SUT_FEATURE':
-                result.execution.sut.append_fut(value)
-            elif key == 'SUT_COMMIT_ID':
-                result.execution.sut.commit_id = value
-            elif key == 'SUT_BRANCH':
-                result.execution.sut.branch = value
-            elif key == 'SUT_TAG':
-                result.execution.sut.tag = [value]
-            elif key == 'SUT_GIT_URL':
-                result.execution.sut.git_url = value
-
-            # push to generic metadata
-            else:
-                result.execution.metadata[key] = value
+    def _wait_testcase_sync(self):
+        """
+        Wait for background testcase sync and retry documents which were not synced
+        :return: None
+        """
+        unsynced = self._testcase_sync.wait()
+        if unsynced and not self._transport.breaker.is_open and self._login.wait():
+            pool = ThreadPool(self._options.workers)
+            pool.map(self._update_testcase, unsynced)
+            pool.close()
+            pool.join()
 
-        if report.capstdout and self._store_logs:
-            log_file = File()
-            log_file.set_file_data(report.capstdout)
-            log_file.name = "stdout"
-            log_file.mime_type = "txt"
-            result.execution.append_log(log_file)
+    def _new_templated_result(self, tcid, shared: bool = True) -> dict:
+        """
+        Create result document which shares session invariant fields with result template.
+        Template is serialized once, its env, sut, duts and metadata are referenced
+        by every result document and must not be modified.
+        :param tcid: test case id
+        :param shared: include shared session fields, otherwise only job id refers to them
+        :return: dict
+        """
+        if self._template is None:
+            self._template = documents.new_template(self.config.option.metadata, self._job_id).data
+        return documents.templated_result(self._template, tcid, shared)
 
-        if report.capstderr and self._store_logs:
-            log_file = File()
-            log_file.set_file_data(report.capstderr)
-            log_file.name = "stderr"
-            log_file.mime_type = "txt"
-            result.execution.append_log(log_file)
+    def _new_result(self, record) -> dict:
+        """
+        Create result document from record, equal to opentmi_client Result.data
+        without its costly generic serialization of the whole document
+        :param record: TestRecord
+        :return: dict
+        """
+        # with suite document shared fields are uploaded only in suite summary result
+        document = self._new_templated_result(record.tcid, shared=not self._options.suite_document)
+        return documents.result_document(document, record, self._log_store)
 
-        return result
+    def _new_upload_result(self, record) -> dict:
+        """
+        Create result document to be uploaded from record
+        :param record: TestRecord
+        :return: dict
+        """
+        document = self._new_result(record)
+        if record.generated_at:
+            # streamed or spooled during session, suite fields are in suite summary
+            document.setdefault('exec', {}).setdefault('profiling', {})['generated_at'] = record.generated_at
+            documents.cut_long_note(document, OpenTmiReport.MAX_EXEC_NOTE_LENGTH)
+        elif self._options.suite_document:
+            # suite fields are in suite summary result
+            documents.cut_long_note(document, OpenTmiReport.MAX_EXEC_NOTE_LENGTH)
+        else:
+            self._link_session(document)
+        return document
+
+    def _link_session(self, document: dict):
+        profiling = document.setdefault('exec', {}).setdefault('profiling', {})
+        suite = dict(duration=self._suite_time_delta, numtests=self._numtests)
+        if self._is_worker:
+            # suite totals are known only when all xdist workers are finished, worker has its own share
+            suite['worker'] = self._worker_id
+        else:
+            self._add_suite_profiling(suite)
+        profiling['suite'] = remove_empty_from_dict(suite)
+        profiling['generated_at'] = self._generated.isoformat()
+        documents.cut_long_note(document, OpenTmiReport.MAX_EXEC_NOTE_LENGTH)
+
+    def _add_suite_profiling(self, suite: dict):
+        if self._reruns:
+            suite['reruns'] = self._reruns.totals(self.rerun)
+        if self._regressions:
+            suite['regressions'] = self._regressions.regressions
+        if self._aggregator:
+            suite['aggregated'] = self._aggregator.totals()
+        if self.profiler:
+            suite['slowest_fixtures'] = self.profiler.slowest_fixtures()
+        if self.sampler:
+            suite['resource_sampling'] = self._sampling_totals()
+
+    def _sampling_totals(self) -> dict:
+        return dict(tests=self.sampler.tests + self._sampled['tests'],
+                    overhead=self.sampler.overhead + self._sampled['overhead'])
+
+    def _divert(self, kind: str, data: dict):
+        """
+        Keep document which is not uploaded because circuit breaker is open.
+        Document stays in spool or is written to fallback spool, otherwise it is dropped.
+        :param kind: 'result' or 'testcase'
+        :param data: document
+        :return: None
+        """
+        with self._lock:
+            if self._spool:
+                # record is already in spool and can be uploaded later using opentmi-upload
+                self._diverted += 1
+            elif self._options.fallback_dir:
+                if not self._fallback_spool:
+                    self._fallback_spool = Spool(self._options.fallback_dir, host=self._options.host)
+                if self._fallback_spool.append(kind, data):
+                    self._diverted += 1
+                else:
+                    self._dropped += 1
+            else:
+                self._dropped += 1
 
-    @staticmethod
-    def _cut_long_note(result: Result):
-        if result.execution.note:
-            result.execution.note = result.execution.note[:OpenTmiReport.MAX_EXEC_NOTE_LENGTH]
+    def _count_uploaded(self, success: int = 0, failed: int = 0):
+        """
+        Add uploaded results, called also from upload threads
+        :param success: count of uploaded results
+        :param failed: count of results which failed to upload
+        :return: None
+        """
+        with self._lock:
+            self._uploaded_success += success
+            self._uploaded_failed += failed
 
-    def _link_session(self, session, result):  # pylint: disable=unused-argument
-        # dut = Dut()
-        # dut.serial_number = ''
-        # result.append_dut(dut)
+    def _on_result_failed(self, data: dict):
+        if self._transport.breaker.is_open:
+            self._divert('result', data)
+        else:
+            self._count_uploaded(failed=1)
 
-        result.execution.profiling['suite'] = dict(
+    def _upload_report(self, document: dict):
+        if self._transport.breaker.is_open:
+            self._divert('result', document)
+            return
+        self._upload_result_data(document)
+
+    def _upload_record(self, record):
+        self._upload_report(self._new_upload_result(record))
+
+    def _update_testcase(self, test: dict) -> bool:
+        """
+        Create or update testcase document unless identical document is already synced
+        :param test: testcase document
+        :return: True if document is synced
+        """
+        if not self._tc_cache.claim(test):
+            return True
+        try:
+            self._transport.upsert_testcase(test)
+            self._tc_cache.confirm(test)
+            return True
+        except OpentmiException as error:
+            logger.warning(f"Testcase {test['tcid']} upload failed: {error}")
+            self._tc_cache.release(test)
+            if self._transport.breaker.is_open:
+                self._divert('testcase', test)
+        return False
+
+    def _upload_testcase(self, record) -> bool:
+        return self._update_testcase(self._testcase_sync.document(record))
+
+    def _upload_result_data(self, data: dict) -> bool:
+        try:
+            stored = self._transport.post_result_data(data)
+            logger.info(f"Uploaded {data.get('tcid')} successfully, id: {(stored or {}).get('id')}")
+            self._count_uploaded(success=1)
+            return True
+        except OpentmiException as error:
+            logger.warning(f"Result {data.get('tcid')} upload failed: {error}")
+            self._on_result_failed(data)
+        except (TypeError, ValueError) as error:
+            # e.g. user property which is not JSON serializable, retrying or diverting does not help
+            logger.warning(f"Result {data.get('tcid')} is not serializable: {error}")
+            self._count_uploaded(failed=1)
+        return False
+
+    def _upload_batch(self, records):
+        succeeded, _ = self._batcher.upload([self._new_upload_result(record) for record in records])
+        self._count_uploaded(success=succeeded)
+
+    def _new_suite_result(self):
+        """
+        Create suite summary result document which carries suite level fields
+        when results are streamed during the session
+        :return: dict
+        """
+        campaign = os.environ.get('JOB_NAME', "")
+        document = self._new_templated_result(f'suite:{campaign or "pytest"}')
+        suite = dict(
             duration=self._suite_time_delta,
-            numtests=self._numtests
+            numtests=self._numtests,
+            passed=self.passed,
+            failed=self.failed,
+            errors=self.errors,
+            skipped=self.skipped,
+            xpassed=self.xpassed,
+            xfailed=self.xfailed
         )
-        result.execution.profiling['generated_at'] = self._generated.isoformat()
-        OpenTmiReport._cut_long_note(result)
+        self._add_suite_profiling(suite)
+        document.setdefault('exec', {}).update(remove_empty_from_dict(dict(
+            duration=self._suite_time_delta, verdict='fail' if self.failed or self.errors else 'pass',
+            note='suite summary', profiling=dict(suite=suite, generated_at=self._generated.isoformat()))))
+        return document
 
-    def _upload_report(self, result: Result):
-        try:
-            data = self._client.post_result(result)
-            logger.info(f"Uploaded {result.tcid} successfully, id: {data['id']}")
-            logger.debug(f"Uploaded {result.tcid} successfully, data: {data}")
-            self._uploaded_success += 1
-        except Exception:  # pylint: disable=broad-except
-            self._uploaded_failed += 1
-
-    def _upload_reports(self, session):
+    def _start_failures(self):
+        """
+        Fetch recent failures of the SUT branch to run recently failed tests first
+        :return: None
+        """
+        sut = self._template.get('exec', {}).get('sut', {})
+        failures = FailureHistory(getattr(self.config, "cache", None), self._options.host,
+                                  branch=sut.get('branch', ''), commit=sut.get('commit_id', ''))
+        self.scheduler.start_failures(failures, functools.partial(self._login.fetch, 'Recent failures', failures.fetch),
+                                      self._options.history_timeout)
+
+    def _start_streaming(self):
+        self._uploader = StreamUploader(workers=self._options.workers, maxsize=self._options.stream_queue_size).start()
+        logger.debug(f'Streaming results to opentmi (queue size: {self._options.stream_queue_size})')
+
+    def _check_streaming(self):
+        """
+        Stop streaming if login failed, results are uploaded at the end of session
+        :return: None
+        """
+        if self._uploader and not self._login.wait(retry=False):
+            logger.error('Results are uploaded at the end of session')
+            self._uploader.close()
+            self._uploader = None
+
+    def _stream_pending(self):
+        """
+        Push finished tests and results to background uploader
+        :return: None
+        """
+        generated_at = datetime.datetime.now().isoformat()
+        for record in self._testcase_sync.pending(self.results):
+            self._uploader.put(self._upload_testcase, record)
+        for record in self.results:
+            record.generated_at = generated_at
+            if self._batcher:
+                self._stream_batch.append(record)
+            else:
+                self._uploader.put(self._upload_record, record)
+        if self._batcher and len(self._stream_batch) >= self._options.batch_size:
+            self._uploader.put(self._upload_batch, self._stream_batch)
+            self._stream_batch = []
+        self.results = []
+        if self.stats:
+            self.stats.add_queue_depth(self._uploader.pending)
+
+    def _finish_streaming(self):
+        self._finish_records()
+        self._stream_pending()
+        if self._stream_batch:
+            self._uploader.put(self._upload_batch, self._stream_batch)
+            self._stream_batch = []
+        logger.info(f'Waiting for streaming uploads ({self._uploader.pending} pending)')
+        self._uploader.close()
+        if not self._is_worker:
+            self._upload_report(self._new_suite_result())
+
+    def _start_spooling(self):
+        self._spool = Spool(self._options.spool_dir, host=self._options.host)
+        self._spool_state = SpoolState(self._spool.path)
+        self._replayer = SpoolReplayer(self._upload_result_data, self._update_testcase, workers=self._options.workers)
+        logger.debug(f'Spooling results to {self._spool.path}')
+
+    def _spool_record(self, kind, data):
+        record = self._spool.append(kind, data)
+        if record is None:
+            if kind == 'result':
+                self._count_uploaded(failed=1)
+            return
+        if self._uploader:
+            self._uploader.put(self._replayer.upload_record, record, self._spool_state)
+
+    def _spool_testcase(self, document):
+        """
+        Write testcase document to spool. Detached uploader does not see the testcase cache,
+        so unchanged documents are not handed off to it
+        :param document: testcase document
+        :return: None
+        """
+        if self._options.detach_dir is not None and not self._options.stream and not self._tc_cache.claim(document):
+            return
+        self._spool_record('testcase', document)
+
+    def _spool_pending(self):
+        """
+        Write finished tests and results to spool
+        :return: None
+        """
+        generated_at = datetime.datetime.now().isoformat()
+        for record in self._testcase_sync.pending(self.results):
+            self._spool_testcase(self._testcase_sync.document(record))
+        for record in self.results:
+            record.generated_at = generated_at
+            self._spool_record('result', self._new_upload_result(record))
+        self.results = []
+        if self.stats and self._uploader:
+            self.stats.add_queue_depth(self._uploader.pending)
+
+    def _finish_spooling(self):
+        self._finish_records()
+        self._spool_pending()
+        if not self._is_worker:
+            self._spool_record('result', self._new_suite_result())
+        self._spool.close()
+        if self._uploader:
+            self._uploader.close()
+        if self._options.detach_dir is not None:
+            if not self._is_worker:
+                # xdist controller finishes after workers, uploader takes spools of all of them
+                self._detached_pid = spawn_uploader(self._options.spool_dir, self._options.token,
+                                                    self._options.workers)
+            self._spool_state.close()
+            return
+        if not self._uploader and not self._login.wait():
+            logger.error(f'Results are left in {self._spool.path}, upload them later using opentmi-upload')
+            self._spool_state.close()
+            return
+        self._replayer.replay_file(self._spool.path, self._spool_state)
+        self._spool_state.close()
+
+    def _upload_reports(self):
         suite_stop_time = time.time()
         self._suite_time_delta = suite_stop_time - self.suite_start_time
         self._numtests = self.passed + self.failed + self.xpassed + self.xfailed
         self._generated = datetime.datetime.now()
-
-        # pylint: disable=expression-not-assigned
-        [self._link_session(session, result) for result in self.results]
+        if self._aggregator and not self._is_worker:
+            self._finish_records()
+            self.results.extend(self._aggregator.records())
+        self._wait_testcase_sync()
+
+        if self._spool:
+            self._finish_spooling()
+            return
+        if self._uploader:
+            self._finish_streaming()
+            return
+        if self._is_controller:
+            if self._login.wait():
+                if self._options.suite_document:
+                    self._upload_report(self._new_suite_result())
+                # aggregated results of workers
+                for record in self._testcase_sync.pending(self.results):
+                    self._upload_testcase(record)
+                for record in self.results:
+                    self._upload_record(record)
+            return
+
+        self._finish_records()
+        tests = self._testcase_sync.pending(self.results)
 
         # pylint: disable=expression-not-assigned
         logger.info(f'Test results to be upload ({len(self.results)})')
-        [logger.debug(result.data) for result in self.results]
+        if logger.isEnabledFor(logging.DEBUG):
+            [logger.debug(self._new_upload_result(record)) for record in self.results]
 
-        logger.info(f'Test cases to be upload ({len(self.tests)})')
-        [logger.debug(test) for test in self.tests]
+        logger.info(f'Test cases to be upload ({len(tests)})')
+        if logger.isEnabledFor(logging.DEBUG):
+            [logger.debug(self._testcase_sync.document(record)) for record in tests]
 
-        token = self.config.getoption("opentmi_token")
-        pool = ThreadPool(10)
+        pool = ThreadPool(self._options.workers)
 
         try:
-            self._client.login_with_access_token(token)
-            pool.map(self._client.update_testcase, self.tests)
-            pool.map(self._upload_report, self.results)
+            if not self._login.wait():
+                raise OpentmiException(f'Login failed: {self._login.error}')
+            if self._options.suite_document and not self._is_worker:
+                self._upload_report(self._new_suite_result())
+            pool.map(self._upload_testcase, tests)
+            if self._batcher:
+                batches = [self.results[i:i + self._options.batch_size]
+                           for i in range(0, len(self.results), self._options.batch_size)]
+                pool.map(self._upload_batch, batches)
+            else:
+                pool.map(self._upload_record, self.results)
             pool.close()
             pool.join()
             logger.info('All results uploaded successfully')
         except Exception as error:  # pylint: disable=broad-except
             logger.error(error)
+            if self._transport.breaker.is_open:
+                # pylint: disable=expression-not-assigned
+                [self._divert('testcase', self._testcase_sync.document(record)) for record in tests]
+                [self._divert('result', self._new_upload_result(record)) for record in self.results]
+
+    def _counters(self) -> dict:
+        """
+        Collect counters to be reported from xdist worker to controller
+        :return: dict
+        """
+        counters = {name: getattr(self, name) for name in OpenTmiReport.COUNTERS}
+        counters.update(self._transfer(), rerun=self.rerun or 0)
+        if self.profiler:
+            counters['fixtures'] = self.profiler.totals
+        if self.sampler:
+            counters['sampled'] = dict(tests=self.sampler.tests, overhead=self.sampler.overhead)
+        if self.stats:
+            counters['stats'] = self.stats.state()
+        if self.scheduler and self.scheduler.summary:
+            counters['schedule'] = self.scheduler.summary
+        counters['testcases'] = self._tc_cache.confirmed
+        if self._aggregator:
+            counters['aggregated'] = self._aggregator.functions
+        if self._regressions:
+            counters['regressions'] = self._regressions.regressions
+        if self._reruns:
+            counters['reruns'] = self._reruns.totals(self.rerun)
+        return counters
+
+    def _transfer(self) -> dict:
+        """
+        Upload transfer totals of this process, xdist workers report those to controller
+        :return: dict
+        """
+        return dict(requests=self._transport.requests,
+                    bytes_sent=self._transport.bytes_sent,
+                    bytes_encoded=self._transport.bytes_encoded,
+                    encode_time=self._transport.encode_time,
+                    testcases_skipped=self._tc_cache.skipped,
+                    breaker_trips=self._transport.breaker.trips)
+
+    def _add_counters(self, counters: dict):
+        """
+        Aggregate counters reported by xdist worker
+        :param counters: dict from _counters()
+        :return: None
+        """
+        for name in OpenTmiReport.COUNTERS:
+            setattr(self, name, getattr(self, name) + counters.get(name, 0))
+        if self.rerun is not None:
+            self.rerun += counters.get('rerun', 0)
+        for name in self._worker_transfer:
+            self._worker_transfer[name] += counters.get(name, 0)
+        self._tc_cache.merge(counters.get('testcases', {}))
+        if self.profiler:
+            self.profiler.add_totals(counters.get('fixtures', {}))
+        for name, value in counters.get('sampled', {}).items():
+            self._sampled[name] += value
+        if self.stats and 'stats' in counters:
+            self.stats.merge(counters['stats'])
+        if self.scheduler and counters.get('schedule'):
+            # all workers collect the same tests
+            self.scheduler.summary = counters['schedule']
+        if self._aggregator:
+            self._aggregator.merge(counters.get('aggregated', {}))
+        if self._regressions and 'regressions' in counters:
+            self._regressions.merge(counters['regressions'])
+        if self._reruns:
+            self._reruns.merge(counters.get('reruns', {}))
+
+    def dump_stats(self):
+        """
+        Write collected stats to JSON file given with --opentmi_stats_file
+        :return: None
+        """
+        if self.stats and self._options.stats_path and not self._is_worker:
+            try:
+                self.stats.dump(self._options.stats_path, session=dict(duration=self._suite_time_delta,
+                                                               wall_time=self._wall_time(),
+                                                               workers=self.stats.merged))
+            except (OSError, ValueError) as error:
+                logger.warning(f"Stats not written: {error}")
+
+    def _wall_time(self):
+        """
+        Seconds since session start, including uploads at the end of session
+        :return: float or None
+        """
+        return time.time() - self.suite_start_time if self.suite_start_time else None
 
     @staticmethod
     def _get_test_key(item):
@@ -348,6 +798,12 @@ class OpenTmiReport:
         :param report: TestReport
         :return: None
         """
+        if self._is_controller:
+            # results are handled by xdist workers
+            return
+        if self._reruns and report.outcome == 'rerun':
+            self._add_attempt(report)
+            return
         if report.when == 'call':
             # after test
             if report.passed:
@@ -368,6 +824,19 @@ class OpenTmiReport:
             # Update test result only if teardown result != passed
             if not report.passed:
                 self._update_teardown_result(report)
+            # test is finished, no more updates to its results
+            if self.plugins:
+                self._add_profiling(report.nodeid)
+            if self._reruns and report.nodeid in self.records:
+                self._reruns.collapse(self.records[report.nodeid])
+            if self._regressions and report.nodeid in self.records:
+                self._regressions.check(self.records[report.nodeid])
+            self._finish_record(report.nodeid)
+            self._check_streaming()
+            if self._spool:
+                self._spool_pending()
+            elif self._uploader:
+                self._stream_pending()
 
     def pytest_itemcollected(self, item):
         """
@@ -386,6 +855,40 @@ class OpenTmiReport:
         :return: None
         """
         self.suite_start_time = time.time()
+        self._template = documents.new_template(self.config.option.metadata, self._job_id).data
+        if self._options.login_check == 'fail' and not self._is_worker:
+            if not self._login.wait():
+                pytest.exit(f'opentmi login failed: {self._login.error}', returncode=pytest.ExitCode.USAGE_ERROR)
+        else:
+            self._login.start()
+        if self._options.failed_first and not self._is_worker:
+            self._start_failures()
+        if self._options.stream:
+            self._start_streaming()
+        if self._options.spool_dir:
+            self._start_spooling()
+
+    def pytest_collection_finish(self, session):
+        """
+        collection finish hook, starts syncing testcases of collected tests and
+        warns early if background login is already failed
+        :param session: pytest session
+        :return: None
+        """
+        self._testcase_sync.precompute(session.items)
+        if self._testcase_sync.testcases and self._syncs_testcases:
+            if self._spool:
+                # uploaded with spool, in background with --opentmi_stream
+                for document in self._testcase_sync.early():
+                    self._spool_testcase(document)
+            else:
+                self._testcase_sync.start()
+        if self._regressions:
+            self._regressions.start(session.items)
+        if self._login.finished and not self._login.wait(retry=False):
+            terminal = self.config.pluginmanager.get_plugin('terminalreporter')
+            if terminal:
+                terminal.write_line(f'opentmi: login failed: {self._login.error}', yellow=True)
 
     def pytest_sessionfinish(self, session):
         """
@@ -393,7 +896,47 @@ class OpenTmiReport:
         :param session:
         :return:
         """
-        self._upload_reports(session)
+        self._upload_reports()
+        if not self._is_worker:
+            # with xdist controller saves hashes confirmed by all workers once
+            self._tc_cache.save()
+        if self._regressions:
+            self._regressions.save()
+        if self._regressions and self._regressions.failed and not self._is_worker \
+                and session.exitstatus == pytest.ExitCode.OK:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+        if self._log_store:
+            self._log_store.close()
+        if self._fallback_spool:
+            self._fallback_spool.close()
+        if self._is_worker:
+            self.config.workeroutput['opentmi'] = self._counters()
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_configure_node(self, node):
+        """
+        xdist hook, called on controller for each worker node
+        :param node: WorkerController
+        :return: None
+        """
+        self._is_controller = True
+        node.workerinput['opentmi_job_id'] = self._job_id
+        for plugin in (self.profiler, self.sampler):
+            if plugin and self.config.pluginmanager.is_registered(plugin):
+                # tests are profiled by workers, controller only aggregates totals
+                self.config.pluginmanager.unregister(plugin)
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_testnodedown(self, node, error):  # pylint: disable=unused-argument
+        """
+        xdist hook, called on controller when worker node is finished
+        :param node: WorkerController
+        :param error: unused
+        :return: None
+        """
+        counters = getattr(node, 'workeroutput', {}).get('opentmi')
+        if counters:
+            self._add_counters(counters)
 
     def pytest_terminal_summary(self, terminalreporter):
         """
@@ -401,5 +944,37 @@ class OpenTmiReport:
         :param terminalreporter:
         :return:
         """
-        terminalreporter.write_sep("-", f"Uploaded {self._uploaded_success} "
-                                        f"results successfully, {self._uploaded_failed} failed")
+        if self._detached_pid:
+            terminalreporter.write_sep("-", f"Results handed off to detached uploader (pid {self._detached_pid})")
+            terminalreporter.write_line(f"opentmi: upload status in {status_path(self._options.spool_dir)}, "
+                                        f"log in {log_path(self._options.spool_dir)}")
+        else:
+            terminalreporter.write_sep("-", f"Uploaded {self._uploaded_success} "
+                                            f"results successfully, {self._uploaded_failed} failed")
+        transfer = {name: value + self._worker_transfer[name] for name, value in self._transfer().items()}
+        summary.write_transfer(terminalreporter, self._transport, transfer)
+        if self.profiler:
+            summary.write_fixtures(terminalreporter, self.profiler.slowest_fixtures(5))
+        if self.sampler:
+            summary.write_sampling(terminalreporter, self._sampling_totals())
+        if self.scheduler and self.scheduler.summary:
+            summary.write_schedule(terminalreporter, self.scheduler)
+        if self._aggregator:
+            summary.write_aggregated(terminalreporter, self._aggregator.totals())
+        if self._reruns and self.rerun:
+            summary.write_reruns(terminalreporter, self._reruns.totals(self.rerun))
+        if self._regressions:
+            summary.write_regressions(terminalreporter, self._regressions)
+        if self._login.logged_in is False:
+            terminalreporter.write_line(f"opentmi: login failed: {self._login.error}", red=True)
+        if transfer['breaker_trips'] or self._diverted or self._dropped:
+            location = ''
+            if self._spool:
+                location = f" kept in {os.path.dirname(self._spool.path)}"
+            elif self._fallback_spool:
+                location = f" saved to {self._fallback_spool.path}"
+            terminalreporter.write_line(f"opentmi: upload circuit breaker opened {transfer['breaker_trips']} times, "
+                                        f"{self._diverted} records{location}, {self._dropped} dropped",
+                                        red=True)
+        if self.stats:
+            summary.write_stats(terminalreporter, self.stats, self._wall_time(), self._options.stats_path)
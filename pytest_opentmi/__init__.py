@@ -1,13 +1,15 @@
 """
 pytest-opentmi
 """
-from pkg_resources import get_distribution, DistributionNotFound
+try:
+    from importlib.metadata import version, PackageNotFoundError
+except ImportError:  # python < 3.8
+    from importlib_metadata import version, PackageNotFoundError
 
 try:
-    __version__ = get_distribution(__name__).version
-except DistributionNotFound:
+    __version__ = version(__name__.replace('_', '-'))
+except PackageNotFoundError:
     # package is not installed
     __version__ = "unknown"
 
 __pypi_url__ = "https://pypi.python.org/pypi/pytest-opentmi"
-__pytest_info__ = get_distribution("pytest")
@@ -0,0 +1,157 @@
+"""
+Upload policy module, aggregates passed and skipped results per test function
+"""
+import zlib
+
+from .record import TestRecord
+
+
+class Aggregator:
+    """
+    Aggregator class.
+    Failed, errored and inconclusive results are always uploaded in full.
+    Passed and skipped results are aggregated per test function: counts and duration
+    min/mean/max with histogram are uploaded as one result per function.
+    With 'sample' policy given fraction of passed and skipped results is uploaded also in full,
+    sample is selected by nodeid so that the same tests are sampled in every run.
+    Keywords of function are those common to all its results, so that its testcase document
+    does not depend on the order in which results were aggregated. Function which results were
+    all uploaded in full, e.g. flaky test which is not parametrized, gets no aggregated result,
+    it would only count the same results again, with the same tcid when not parametrized.
+    """
+
+    VERDICTS = ('pass', 'skip')
+    # upper bounds of duration histogram buckets in seconds, last bucket is unbounded
+    BUCKETS = (0.001, 0.01, 0.1, 1, 10, 60)
+
+    def __init__(self, policy: str = 'aggregate', rate: float = 0.0):
+        """
+        Constructor
+        :param policy: 'aggregate' or 'sample'
+        :param rate: fraction of passed and skipped results uploaded in full with 'sample' policy
+        """
+        self.policy = policy
+        self.rate = rate if policy == 'sample' else 0.0
+        self._threshold = int(self.rate * 0x100000000)
+        self.functions = {}  # function tcid -> aggregate
+
+    @staticmethod
+    def function(record: TestRecord) -> tuple:
+        """
+        Test function of parametrized test
+        :param record: TestRecord
+        :return: tuple of (nodeid, tcid) without parameters
+        """
+        return record.nodeid.split('[')[0], record.tcid.split('[')[0]
+
+    def sampled(self, nodeid: str) -> bool:
+        """
+        Check if test is in sample
+        :param nodeid: pytest node id
+        :return: bool
+        """
+        return zlib.crc32(nodeid.encode()) < self._threshold
+
+    def keep(self, record: TestRecord, in_full: bool = False) -> bool:
+        """
+        Aggregate passed and skipped record
+        :param record: finished TestRecord
+        :param in_full: upload record in full also when it is not in sample
+        :return: True if record is uploaded in full
+        """
+        if record.verdict not in Aggregator.VERDICTS:
+            return True
+        nodeid, tcid = Aggregator.function(record)
+        aggregate = self.functions.get(tcid)
+        if aggregate is None:
+            aggregate = self.functions[tcid] = dict(
+                nodeid=nodeid, keywords=[key for key in record.keywords or () if key != ""],
+                description=record.description, skip_reason=None, passed=0, skipped=0, sampled=0,
+                min=None, max=None, total=0.0, histogram=[0] * (len(Aggregator.BUCKETS) + 1))
+        else:
+            aggregate['keywords'] = Aggregator._common(aggregate['keywords'], record.keywords or ())
+        if record.verdict == 'pass':
+            aggregate['passed'] += 1
+        else:
+            aggregate['skipped'] += 1
+            aggregate['skip_reason'] = aggregate['skip_reason'] or record.skip_reason
+        duration = record.duration or 0.0
+        aggregate['min'] = duration if aggregate['min'] is None else min(aggregate['min'], duration)
+        aggregate['max'] = duration if aggregate['max'] is None else max(aggregate['max'], duration)
+        aggregate['total'] += duration
+        aggregate['histogram'][Aggregator._bucket(duration)] += 1
+        if in_full or self.sampled(record.nodeid):
+            aggregate['sampled'] += 1
+            return True
+        return False
+
+    @staticmethod
+    def _common(keywords: list, others) -> list:
+        others = set(others)
+        return [keyword for keyword in keywords if keyword in others]
+
+    @staticmethod
+    def _bucket(duration: float) -> int:
+        for index, bound in enumerate(Aggregator.BUCKETS):
+            if duration <= bound:
+                return index
+        return len(Aggregator.BUCKETS)
+
+    def merge(self, functions: dict):
+        """
+        Merge aggregates of xdist worker
+        :param functions: Aggregator.functions of worker
+        :return: None
+        """
+        for tcid, other in functions.items():
+            aggregate = self.functions.get(tcid)
+            if aggregate is None:
+                self.functions[tcid] = dict(other, histogram=list(other['histogram']))
+                continue
+            for name in ('passed', 'skipped', 'sampled', 'total'):
+                aggregate[name] += other[name]
+            aggregate['skip_reason'] = aggregate['skip_reason'] or other['skip_reason']
+            aggregate['keywords'] = Aggregator._common(aggregate['keywords'], other['keywords'])
+            aggregate['min'] = min(aggregate['min'], other['min'])
+            aggregate['max'] = max(aggregate['max'], other['max'])
+            aggregate['histogram'] = [mine + theirs for mine, theirs in
+                                      zip(aggregate['histogram'], other['histogram'])]
+
+    def records(self) -> list:
+        """
+        Aggregated results, one per test function which has results not uploaded in full
+        :return: list of TestRecord
+        """
+        records = []
+        for tcid, aggregate in self._aggregated():
+            count = aggregate['passed'] + aggregate['skipped']
+            record = TestRecord(aggregate['nodeid'], tcid, duration=aggregate['total'],
+                                keywords=aggregate['keywords'], description=aggregate['description'])
+            record.verdict = 'pass' if aggregate['passed'] else 'skip'
+            if not aggregate['passed']:
+                record.skipped = True
+                record.skip_reason = aggregate['skip_reason'] or ''
+            record.note = f"aggregated: {aggregate['passed']} passed, {aggregate['skipped']} skipped, " \
+                          f"{aggregate['sampled']} uploaded in full"
+            record.profiling = dict(aggregate=dict(
+                policy=self.policy, count=count, passed=aggregate['passed'], skipped=aggregate['skipped'],
+                sampled=aggregate['sampled'], duration=dict(
+                    min=aggregate['min'], mean=aggregate['total'] / count, max=aggregate['max'],
+                    total=aggregate['total'], buckets=list(Aggregator.BUCKETS),
+                    histogram=aggregate['histogram'])))
+            records.append(record)
+        return records
+
+    def _aggregated(self):
+        return ((tcid, aggregate) for tcid, aggregate in self.functions.items()
+                if aggregate['sampled'] < aggregate['passed'] + aggregate['skipped'])
+
+    def totals(self) -> dict:
+        """
+        What was aggregated, for suite summary
+        :return: dict
+        """
+        return dict(policy=self.policy, rate=self.rate, functions=sum(1 for _ in self._aggregated()),
+                    passed=sum(aggregate['passed'] for aggregate in self.functions.values()),
+                    skipped=sum(aggregate['skipped'] for aggregate in self.functions.values()),
+                    sampled=sum(aggregate['sampled'] for aggregate in self.functions.values()))
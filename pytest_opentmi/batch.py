@@ -0,0 +1,135 @@
+"""
+Bulk upload module
+"""
+import logging
+
+# 3rd party modules
+from opentmi_client.utils import OpentmiException, TransportException
+# app modules
+from .serialize import join
+
+logger = logging.getLogger(__name__)
+
+# status codes which tells that server does not accept a list payload
+UNSUPPORTED_CODES = (400, 404, 405, 413, 415, 422, 501)
+
+
+class BatchUploader:
+    """
+    BatchUploader class.
+    Groups payloads to bulk requests limited by count and size in bytes.
+    Falls back to per-item requests if the server does not support bulk payloads.
+    Each payload is encoded once, bulk request body is joined from encoded payloads.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, transport, url, max_count: int = 100, max_bytes: int = 1024 * 1024,
+                 on_failed=None):
+        """
+        Constructor
+        :param transport: UploadTransport instance
+        :param url: collection url where payloads are posted
+        :param max_count: maximum number of items in single request
+        :param max_bytes: maximum serialized size of single request
+        :param on_failed: optional callable(payload) called for each payload which upload failed
+        """
+        self._transport = transport
+        self._on_failed = on_failed
+        self._url = url
+        self._max_count = max(1, max_count)
+        self._max_bytes = max_bytes
+        self.bulk_supported = None  # unknown until first bulk request
+
+    def split(self, payloads, rejected: list = None):
+        """
+        Encode payloads and split them into batches.
+        Payloads which are not JSON serializable are left out and passed to on_failed.
+        :param payloads: list of dicts
+        :param rejected: optional list where payloads which could not be encoded are appended
+        :return: generator of lists of (payload, encoded payload) tuples
+        """
+        batch = []
+        batch_bytes = 0
+        for payload in payloads:
+            try:
+                data = self._transport.encode(payload)
+            except (TypeError, ValueError) as error:
+                logger.warning(f'Payload is not serializable: {error}')
+                if rejected is not None:
+                    rejected.append(payload)
+                self._failed(payload)
+                continue
+            if batch and (len(batch) >= self._max_count or batch_bytes + len(data) > self._max_bytes):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append((payload, data))
+            batch_bytes += len(data)
+        if batch:
+            yield batch
+
+    def upload(self, payloads):
+        """
+        Upload payloads
+        :param payloads: list of dicts
+        :return: tuple of (succeeded, failed) counts
+        """
+        succeeded = failed = 0
+        rejected = []
+        for batch in self.split(payloads, rejected):
+            if self.bulk_supported is not False and len(batch) > 1:
+                uploaded = self._post_bulk(batch)
+                if uploaded is not None:
+                    succeeded += uploaded
+                    failed += len(batch) - uploaded
+                    for payload, _ in batch[uploaded:]:
+                        self._failed(payload)
+                    continue
+            batch_succeeded, batch_failed = self._post_each(batch)
+            succeeded += batch_succeeded
+            failed += batch_failed
+        return succeeded, failed + len(rejected)
+
+    def _post_bulk(self, batch):
+        """
+        Post batch as single request
+        :param batch: list of (payload, encoded payload) tuples
+        :return: number of stored items or None when batch need to be posted item by item
+        """
+        try:
+            data = self._transport.post_encoded(self._url, join([encoded for _, encoded in batch]))
+        except TransportException as error:
+            if self.bulk_supported is None and error.code in UNSUPPORTED_CODES:
+                logger.warning(f'Bulk upload not supported by server (status: {error.code}), '
+                               f'falling back to per item upload')
+                self.bulk_supported = False
+            else:
+                logger.warning(f'Bulk upload failed: {error.message}, retrying per item')
+            return None
+        except OpentmiException as error:
+            logger.warning(f'Bulk upload failed: {error}, retrying per item')
+            return None
+        if not isinstance(data, list):
+            logger.warning('Bulk upload not supported by server (unexpected response), '
+                           'falling back to per item upload')
+            self.bulk_supported = False
+            return None
+        self.bulk_supported = True
+        logger.info(f'Uploaded {len(data)}/{len(batch)} items in bulk')
+        return min(len(data), len(batch))
+
+    def _post_each(self, batch):
+        succeeded = failed = 0
+        for payload, encoded in batch:
+            try:
+                self._transport.post_encoded(self._url, encoded)
+                succeeded += 1
+            except OpentmiException as error:
+                logger.warning(f'Upload failed: {error}')
+                failed += 1
+                self._failed(payload)
+        return succeeded, failed
+
+    def _failed(self, payload):
+        if self._on_failed:
+            self._on_failed(payload)
@@ -0,0 +1,185 @@
+"""
+Testcase and login token cache module
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+# environment variables which identify CI job, first one which is set is used
+CI_JOB_VARIABLES = ('BUILD_TAG', 'CI_JOB_ID', 'GITHUB_RUN_ID', 'BUILD_BUILDID', 'CIRCLE_WORKFLOW_JOB_ID')
+
+
+def _host_key(prefix: str, host: str) -> str:
+    return f'{prefix}/{hashlib.sha1(host.encode("utf-8")).hexdigest()[:12]}'
+
+
+class TestcaseCache:
+    """
+    TestcaseCache class.
+    Keeps content hash per tcid of testcase documents already synced to opentmi,
+    optionally persisted across sessions using pytest cache.
+    """
+    __test__ = False  # not a test class for pytest collection
+
+    CACHE_KEY = 'opentmi/testcases'
+
+    def __init__(self, cache=None, host: str = ''):
+        """
+        Constructor
+        :param cache: pytest config.cache or None to keep hashes only in memory
+        :param host: opentmi host, hashes are kept separately per host
+        """
+        self._cache = cache
+        self._key = _host_key(TestcaseCache.CACHE_KEY, host)
+        self._lock = threading.Lock()
+        self._synced = dict(cache.get(self._key, {})) if cache else {}
+        self._claimed = {}
+        self._confirmed = {}  # hashes synced in this session
+        self.skipped = 0
+
+    @staticmethod
+    def digest(data: dict) -> str:
+        """
+        Calculate content hash for testcase document
+        :param data: testcase document
+        :return: hex digest
+        """
+        return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def claim(self, data: dict) -> bool:
+        """
+        Check if testcase document need to be sent and reserve it for sending
+        :param data: testcase document
+        :return: True if document is new or changed and not yet being sent
+        """
+        tcid = data['tcid']
+        digest = TestcaseCache.digest(data)
+        with self._lock:
+            if digest in (self._synced.get(tcid), self._claimed.get(tcid)):
+                self.skipped += 1
+                return False
+            self._claimed[tcid] = digest
+            return True
+
+    def changed(self, data: dict) -> bool:
+        """
+        Check if testcase was synced earlier with other document,
+        e.g. with skip fields when test was skipped at runtime
+        :param data: testcase document
+        :return: True if tcid is known and its document differs
+        """
+        with self._lock:
+            synced = self._synced.get(data['tcid'])
+        return synced is not None and synced != TestcaseCache.digest(data)
+
+    def confirm(self, data: dict):
+        """
+        Mark claimed testcase document successfully synced
+        :param data: testcase document
+        :return: None
+        """
+        with self._lock:
+            digest = self._claimed.pop(data['tcid'], None)
+            if digest:
+                self._synced[data['tcid']] = self._confirmed[data['tcid']] = digest
+
+    def release(self, data: dict):
+        """
+        Release claim of testcase document which failed to sync
+        :param data: testcase document
+        :return: None
+        """
+        with self._lock:
+            self._claimed.pop(data['tcid'], None)
+
+    @property
+    def confirmed(self) -> dict:
+        """
+        Hashes of testcase documents synced in this session, e.g. by xdist worker
+        :return: dict of tcid -> hex digest
+        """
+        with self._lock:
+            return dict(self._confirmed)
+
+    def merge(self, confirmed: dict):
+        """
+        Add hashes synced elsewhere, by xdist worker or detached uploader
+        :param confirmed: dict of tcid -> hex digest, e.g. TestcaseCache.confirmed of worker
+        :return: None
+        """
+        with self._lock:
+            self._synced.update(confirmed)
+
+    def save(self):
+        """
+        Persist synced hashes
+        :return: None
+        """
+        if self._cache:
+            with self._lock:
+                self._cache.set(self._key, self._synced)
+
+
+class TokenCache:
+    """
+    TokenCache class.
+    Keeps login token in pytest cache for following pytest invocations of the same CI job.
+    Token is reused only with the same access token, CI job and host, and until ttl is passed.
+    """
+    __test__ = False  # not a test class for pytest collection
+
+    CACHE_KEY = 'opentmi/token'
+
+    def __init__(self, cache=None, host: str = '', ttl: float = 3600, environ=None):
+        """
+        Constructor
+        :param cache: pytest config.cache or None to disable caching
+        :param host: opentmi host
+        :param ttl: seconds how long token is reused
+        :param environ: environment variables, defaults to os.environ
+        """
+        environ = os.environ if environ is None else environ
+        self._cache = cache
+        self._key = _host_key(TokenCache.CACHE_KEY, host)
+        self._ttl = ttl
+        self.job = next((f'{name}={environ[name]}' for name in CI_JOB_VARIABLES if environ.get(name)), None)
+
+    @staticmethod
+    def _digest(access_token) -> str:
+        return hashlib.sha256(str(access_token).encode('utf-8')).hexdigest()
+
+    def get(self, access_token):
+        """
+        Get cached login token
+        :param access_token: access token used to login
+        :return: login token or None
+        """
+        if not self._cache or not self.job:
+            return None
+        entry = self._cache.get(self._key, None) or {}
+        if entry.get('job') != self.job or entry.get('access_token') != TokenCache._digest(access_token):
+            return None
+        if time.time() - entry.get('created', 0) > self._ttl:
+            return None
+        return entry.get('token')
+
+    def set(self, access_token, token: str):
+        """
+        Store login token
+        :param access_token: access token used to login
+        :param token: login token
+        :return: None
+        """
+        if self._cache and self.job and token:
+            self._cache.set(self._key, dict(job=self.job, access_token=TokenCache._digest(access_token),
+                                            token=token, created=time.time()))
+
+    def clear(self):
+        """
+        Forget cached login token
+        :return: None
+        """
+        if self._cache and self.job:
+            self._cache.set(self._key, None)
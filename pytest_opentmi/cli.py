@@ -0,0 +1,135 @@
+"""
+opentmi-upload command line tool.
+Uploads results spooled with `pytest --opentmi_spool <dir>`
+and waits for uploads detached with `pytest --opentmi_detach_dir <dir>`.
+"""
+import argparse
+import logging
+import os
+import sys
+
+# 3rd party modules
+from opentmi_client import OpenTmiClient
+# app modules
+from .cache import TestcaseCache
+from .detach import FINAL_STATES, add_synced_testcases, status_path, upload_lock, wait, write_status
+from .spool import SpoolReplayer, find_spools, read_records
+from .transport import UploadTransport
+
+logger = logging.getLogger(__name__)
+
+
+def get_parser():
+    """
+    Create argument parser
+    :return: ArgumentParser
+    """
+    parser = argparse.ArgumentParser(prog='opentmi-upload',
+                                     description='Upload spooled pytest results to opentmi')
+    parser.add_argument('directory', help='spool directory')
+    parser.add_argument('--host', default=None,
+                        help='opentmi host, defaults to host stored in spool files')
+    parser.add_argument('--token', default=os.environ.get('OPENTMI_TOKEN', None),
+                        help='opentmi access token, defaults to OPENTMI_TOKEN env variable')
+    parser.add_argument('--workers', type=int, default=10, help='number of parallel uploads')
+    parser.add_argument('--status', default=None, metavar='FILE',
+                        help='write upload state and counts to JSON status file')
+    parser.add_argument('--wait', action='store_true',
+                        help='wait for detached upload of directory to finish instead of uploading')
+    parser.add_argument('--timeout', type=float, default=None, help='seconds to wait with --wait')
+    parser.add_argument('-v', '--verbose', action='store_true', help='verbose logging')
+    return parser
+
+
+def _new_replayer(host, token, workers, synced):
+    transport = UploadTransport(host, workers=workers)
+    client = OpenTmiClient(transport=transport)
+    if token:
+        client.login_with_access_token(token)
+
+    def upload_result(data):
+        transport.post_result_data(data)
+        return True
+
+    def upload_testcase(data):
+        transport.upsert_testcase(data)
+        synced[data['tcid']] = TestcaseCache.digest(data)
+        return True
+    return SpoolReplayer(upload_result, upload_testcase, workers=workers)
+
+
+def replay(directory, host=None, token=None, workers=10):
+    """
+    Upload all spool files from directory
+    :param directory: spool directory
+    :param host: opentmi host, defaults to host stored in spool files
+    :param token: opentmi access token
+    :param workers: number of parallel uploads
+    :return: tuple of (uploaded, failed, already uploaded) counts
+    """
+    replayers = {}
+    synced = {}  # hashes of uploaded testcases for testcase cache of next pytest session
+    totals = [0, 0, 0]
+    for path in find_spools(directory):
+        header, _ = read_records(path)
+        spool_host = host or header.get('host')
+        if not spool_host:
+            logger.error(f'{path}: opentmi host not known, use --host')
+            continue
+        if spool_host not in replayers:
+            replayers[spool_host] = _new_replayer(spool_host, token, workers, synced)
+        counts = replayers[spool_host].replay_file(path)
+        totals = [total + count for total, count in zip(totals, counts)]
+    if synced:
+        add_synced_testcases(directory, synced)
+    return tuple(totals)
+
+
+def main(args=None):
+    """
+    opentmi-upload entry point
+    :param args: command line arguments, defaults to sys.argv
+    :return: exit code, 0 when all records are uploaded
+    """
+    args = get_parser().parse_args(args)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    if not os.path.isdir(args.directory):
+        logger.error(f'{args.directory} is not a directory')
+        return 2
+    if args.wait:
+        return _wait(args.directory, args.timeout)
+    with upload_lock(args.directory):
+        return _upload(args)
+
+
+def _upload(args):
+    if args.status:
+        write_status(args.status, 'running', pid=os.getpid())
+    try:
+        uploaded, failed, done = replay(args.directory, args.host, args.token, args.workers)
+    except Exception as error:  # pylint: disable=broad-except
+        logger.error(f'Upload failed: {error}')
+        if args.status:
+            write_status(args.status, 'failed', pid=os.getpid(), error=str(error))
+        return 1
+    print(f'Uploaded {uploaded} records, {failed} failed, {done} already uploaded')
+    if args.status:
+        write_status(args.status, 'failed' if failed else 'done', pid=os.getpid(),
+                     uploaded=uploaded, failed=failed, skipped=done)
+    return 1 if failed else 0
+
+
+def _wait(directory, timeout):
+    status = wait(status_path(directory), timeout)
+    if status is None:
+        logger.error(f'No detached upload in {directory}')
+        return 2
+    print(f"Detached upload {status['state']}: {status.get('uploaded', 0)} records uploaded, "
+          f"{status.get('failed', 0)} failed")
+    if status['state'] not in FINAL_STATES:
+        return 3
+    return 0 if status['state'] == 'done' else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
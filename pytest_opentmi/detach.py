@@ -0,0 +1,171 @@
+"""
+Detached uploader module.
+With `pytest --opentmi_detach` results are handed off in a spool directory
+to an `opentmi-upload` process which outlives pytest. Progress is written
+to a status file which later CI steps can wait on. Hashes of testcases it
+uploaded are left in the directory for the testcase cache of next session.
+"""
+import contextlib
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import warnings
+
+STATUS_FILE = 'status.json'
+LOG_FILE = 'upload.log'
+TESTCASES_FILE = 'testcases.json'
+LOCK_FILE = 'upload.lock'
+# states of upload which are final
+FINAL_STATES = ('done', 'failed')
+
+
+def status_path(directory: str) -> str:
+    """
+    :param directory: handoff directory
+    :return: path of status file
+    """
+    return os.path.join(directory, STATUS_FILE)
+
+
+def log_path(directory: str) -> str:
+    """
+    :param directory: handoff directory
+    :return: path of uploader log file
+    """
+    return os.path.join(directory, LOG_FILE)
+
+
+def _replace_json(path: str, data: dict):
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+def write_status(path: str, state: str, **fields):
+    """
+    Atomically replace status file
+    :param path: status file path
+    :param state: 'pending', 'running', 'done' or 'failed'
+    :param fields: additional status fields, e.g. pid and counts
+    :return: None
+    """
+    _replace_json(path, dict(state=state, updated=datetime.datetime.now().isoformat(), **fields))
+
+
+def read_status(path: str) -> dict:
+    """
+    :param path: status file path
+    :return: status dict or None when there is no status
+    """
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def read_synced_testcases(directory: str) -> dict:
+    """
+    :param directory: handoff directory
+    :return: dict of tcid -> hash of testcase document uploaded by detached uploader
+    """
+    return read_status(os.path.join(directory, TESTCASES_FILE)) or {}
+
+
+def add_synced_testcases(directory: str, hashes: dict):
+    """
+    Add hashes of uploaded testcase documents, read by next session
+    :param directory: handoff directory
+    :param hashes: dict of tcid -> TestcaseCache.digest of uploaded document
+    :return: None
+    """
+    _replace_json(os.path.join(directory, TESTCASES_FILE), dict(read_synced_testcases(directory), **hashes))
+
+
+def spawn_uploader(directory: str, token: str = None, workers: int = 10) -> int:
+    """
+    Start opentmi-upload process for handoff directory, process is not waited
+    and keeps running when pytest exits. Its output is appended to log file.
+    :param directory: handoff directory
+    :param token: opentmi access token, passed in environment
+    :param workers: number of parallel uploads
+    :return: process id
+    """
+    status = status_path(directory)
+    write_status(status, 'pending')
+    env = dict(os.environ)
+    if token:
+        env['OPENTMI_TOKEN'] = token
+    if os.name == 'nt':
+        options = dict(creationflags=subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        # own session, so that it is not killed together with pytest process group
+        options = dict(start_new_session=True)
+    command = [sys.executable, '-m', 'pytest_opentmi.cli', directory,
+               '--workers', str(workers), '--status', status]
+    with open(log_path(directory), 'a', encoding='utf-8') as log:
+        # pylint: disable=consider-using-with
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                                   env=env, close_fds=True, **options)
+    pid = process.pid
+    # process is not waited, subprocess module reaps it after it exits
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', ResourceWarning)
+        del process
+    return pid
+
+
+@contextlib.contextmanager
+def upload_lock(directory: str):
+    """
+    Exclusive lock of handoff directory, held while its spools are uploaded so that
+    uploaders of two sessions do not upload the same records. Waits until lock is free,
+    lock is released by operating system also when uploader is killed.
+    :param directory: handoff directory
+    :return: context manager
+    """
+    with open(os.path.join(directory, LOCK_FILE), 'a+b') as file:
+        if os.name == 'nt':
+            import msvcrt  # pylint: disable=import-outside-toplevel,import-error
+            file.seek(0)
+            while True:
+                try:
+                    # retries for 10 seconds before giving up
+                    msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl  # pylint: disable=import-outside-toplevel
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+
+
+def wait(path: str, timeout: float = None, interval: float = 0.5) -> dict:
+    """
+    Wait until detached upload is finished
+    :param path: status file path
+    :param timeout: seconds, None waits forever
+    :param interval: polling interval in seconds
+    :return: last status or None when there is no status
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    while True:
+        status = read_status(path)
+        if status is None or status['state'] in FINAL_STATES:
+            return status
+        if deadline is not None and time.time() >= deadline:
+            return status
+        time.sleep(interval)
@@ -0,0 +1,177 @@
+"""
+Result and testcase document module.
+Documents are built as plain dicts equal to opentmi_client Result.data and Testcase.data
+without their costly generic serialization.
+"""
+import json
+import logging
+import os
+
+import pytest
+from opentmi_client import Result
+from opentmi_client.api import Dut, Provider
+from opentmi_client.utils import remove_empty_from_dict
+
+# app modules
+from .logstore import StoredLog
+
+logger = logging.getLogger(__name__)
+
+# first keyword which is one of these classifies testcase type
+TESTCASE_TYPES = frozenset(('installation', 'compatibility', 'smoke', 'regression', 'acceptance', 'alpha',
+                            'beta', 'stability', 'functional', 'destructive', 'performance', 'reliability'))
+
+
+def new_template(metadata: list, job_id: str) -> Result:  # pylint: disable=too-many-statements,too-many-branches
+    """
+    Build session invariant part of results: environment, SUT, DUT and metadata.
+    :param metadata: list of (key, value) tuples of pytest-metadata
+    :param job_id: job id used when BUILD_TAG is not set
+    :return: Result
+    """
+    template = Result()
+    template.execution.environment.framework.name = 'pytest'
+    template.execution.environment.framework.version = pytest.__version__
+    template.execution.sut.commit_id = os.environ.get('GIT_COMMIT', "")
+    template.execution.sut.branch = os.environ.get('GIT_BRANCH', "")
+    template.execution.sut.git_url = os.environ.get('GIT_URL', "")
+    # there might be multiple tags so split by ','
+    tag = os.environ.get('GIT_TAG', '')
+    tag = list(filter(None, tag.split(',')))  # cleanup empty items
+    template.execution.sut.tag = tag
+    template.job.id = os.environ.get('BUILD_TAG', job_id)
+    template.campaign = os.environ.get('JOB_NAME', "")
+    dut = None
+    for item in metadata:
+        key, value = item
+
+        if not isinstance(key, str):
+            logger.warning(f"Metadata key is not string: {key}")
+            continue
+        # ensure value is JSON serializable with JSON.dumps
+        try:
+            json.dumps(value)
+        except TypeError:
+            logger.warning(f"Metadata value is not JSON serializable: {value}")
+            continue
+
+        # Dut
+        if key.startswith('DUT') and not dut:
+            dut = Dut()
+            dut.type = 'hw'
+            template.execution.append_dut(dut)
+        if key == 'DUT_SERIAL_NUMBER':
+            dut.serial_number = value
+        elif key == 'DUT_TYPE':
+            dut.type = value
+        # elif key == 'DUT_PLATFORM':
+        #     dut.platform = value
+        elif key == 'DUT_VERSION':
+            dut.ver = value
+        elif key == 'DUT_VENDOR':
+            dut.vendor = value
+        elif key == 'DUT_MODEL':
+            dut.model = value
+        elif key == 'DUT_PROVIDER':
+            dut.provider = Provider()
+            dut.provider.name = value
+
+        # Sut
+        elif key == 'SUT_COMPONENT':
+            template.execution.sut.append_cut(value)
+        elif key == 'SUT_FEATURE':
+            template.execution.sut.append_fut(value)
+        elif key == 'SUT_COMMIT_ID':
+            template.execution.sut.commit_id = value
+        elif key == 'SUT_BRANCH':
+            template.execution.sut.branch = value
+        elif key == 'SUT_TAG':
+            template.execution.sut.tag = [value]
+        elif key == 'SUT_GIT_URL':
+            template.execution.sut.git_url = value
+
+        # push to generic metadata
+        else:
+            template.execution.metadata[key] = value
+    return template
+
+
+def testcase_document(tcid: str, description: str, keywords: list) -> dict:
+    """
+    Create testcase document
+    :param tcid: test case id
+    :param description: test docstring
+    :param keywords: test keywords
+    :return: dict
+    """
+    document = dict(tcid=tcid, status=dict(value='released'))
+    other_info = {}
+    if description:
+        other_info['description'] = description
+    keywords = [keyword for keyword in keywords or () if keyword != ""]
+    if keywords:
+        other_info['keywords'] = keywords
+    test_type = next((keyword for keyword in keywords if keyword in TESTCASE_TYPES), None)
+    if test_type:
+        other_info['type'] = test_type
+    if other_info:
+        document['other_info'] = other_info
+    return document
+
+
+def templated_result(template: dict, tcid: str, shared: bool = True) -> dict:
+    """
+    Create result document which shares session invariant fields with serialized result template.
+    Fields of template are referenced by every result document and must not be modified.
+    :param template: Result.data of new_template
+    :param tcid: test case id
+    :param shared: include shared session fields, otherwise only job id refers to them
+    :return: dict
+    """
+    document = dict(tcid=tcid, job=dict(id=template['job']['id']))
+    if not shared:
+        return document
+    if template.get('campaign'):
+        document['campaign'] = template['campaign']
+    execution = template.get('exec', {})
+    shared_fields = {key: execution[key] for key in ('env', 'sut', 'duts', 'metadata') if key in execution}
+    if shared_fields:
+        document['exec'] = shared_fields
+    return document
+
+
+def result_document(document: dict, record, log_store=None) -> dict:
+    """
+    Add execution fields of record to result document
+    :param document: result document of templated_result
+    :param record: TestRecord
+    :param log_store: LogStore of stored logs of record
+    :return: dict
+    """
+    profiling = {}
+    if record.properties:
+        profiling['properties'] = dict(record.properties)
+    if record.keywords:
+        profiling['keywords'] = [key for key in record.keywords if key != ""]
+    if record.profiling:
+        profiling.update(record.profiling)
+    # empty fields are left out like opentmi_client does
+    execution = remove_empty_from_dict(dict(duration=record.duration, verdict=record.verdict,
+                                            note=record.note, profiling=profiling))
+    if record.logs:
+        execution['logs'] = [StoredLog(log_store, digest, name).data for name, digest in record.logs]
+    if execution:
+        document.setdefault('exec', {}).update(execution)
+    return document
+
+
+def cut_long_note(document: dict, max_length: int):
+    """
+    Cut execution note of result document
+    :param document: result document
+    :param max_length: maximum length of note
+    :return: None
+    """
+    note = document.get('exec', {}).get('note')
+    if note:
+        document['exec']['note'] = note[:max_length]
@@ -0,0 +1,106 @@
+"""
+Background login module
+"""
+import logging
+import threading
+
+from opentmi_client import OpenTmiClient
+from opentmi_client.utils import OpentmiException
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLogin:
+    """
+    BackgroundLogin class.
+    Logs in to opentmi in background, which also opens connection for uploads,
+    while tests are collected and executed. Login token is reused within CI job using TokenCache.
+    """
+
+    def __init__(self, transport, access_token, token_cache):
+        """
+        Constructor
+        :param transport: UploadTransport
+        :param access_token: access token used to login
+        :param token_cache: TokenCache
+        """
+        self._transport = transport
+        self._client = OpenTmiClient(transport=transport)
+        self._access_token = access_token
+        self.token_cache = token_cache
+        self._thread = None
+        self.logged_in = None
+        self.error = None
+
+    def login(self) -> bool:
+        """
+        Login, cached login token of the CI job is used when server accepts it
+        :return: True if logged in
+        """
+        cached = self.token_cache.get(self._access_token)
+        try:
+            if cached:
+                self._transport.set_token(cached)
+                try:
+                    # validates cached token and opens connection for uploads
+                    self._transport.get_json(self._transport.get_url('/auth/me'))
+                    logger.debug('Reusing login token of this CI job')
+                    return True
+                except OpentmiException as error:
+                    logger.debug(f'Cached login token not accepted: {error}')
+                    self.token_cache.clear()
+            self._client.login_with_access_token(self._access_token)
+            self.token_cache.set(self._access_token, self._transport.token)
+            self.error = None
+            return True
+        except Exception as error:  # pylint: disable=broad-except
+            logger.error(f'Login failed: {error}')
+            self.error = str(error)
+        return False
+
+    def start(self):
+        """
+        Login in background
+        :return: None
+        """
+        def login():
+            self.logged_in = self.login()
+        self._thread = threading.Thread(target=login, name='opentmi-login', daemon=True)
+        self._thread.start()
+
+    @property
+    def finished(self) -> bool:
+        """
+        Check if background login is started and finished
+        :return: bool
+        """
+        return self._thread is not None and not self._thread.is_alive()
+
+    def wait(self, retry: bool = True) -> bool:
+        """
+        Wait for background login, can be called also from other background threads
+        :param retry: login again if earlier login failed
+        :return: True if logged in
+        """
+        thread = self._thread
+        if thread:
+            thread.join()
+        if not self.logged_in and retry:
+            self.logged_in = self.login()
+        return bool(self.logged_in)
+
+    def fetch(self, what: str, func, *args):
+        """
+        Fetch history from opentmi once logged in, cached history is used if it fails
+        :param what: fetched data for warnings, e.g. 'Test durations'
+        :param func: callable which takes UploadTransport and args
+        :param args: additional arguments of func
+        :return: None
+        """
+        if not self.wait(retry=False):
+            logger.warning(f'{what} are not fetched, login failed: {self.error}')
+            return
+        try:
+            func(self._transport, *args)
+        except OpentmiException as error:
+            logger.warning(f'{what} are not fetched: {error}')
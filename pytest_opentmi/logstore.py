@@ -0,0 +1,115 @@
+"""
+Captured log store module.
+Captured stdout/stderr are written gzip compressed to temporary files
+as soon as a result is created, and read back only when the result is uploaded.
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+
+# 3rd party modules
+from opentmi_client.api import File
+
+
+class LogStore:
+    """
+    LogStore class.
+    Logs are deduplicated by content hash and limited to max_bytes per log,
+    keeping the head and the tail of longer logs.
+    """
+
+    def __init__(self, max_bytes: int = 1024 * 1024, directory: str = None):
+        """
+        Constructor
+        :param max_bytes: maximum size of single log in bytes, 0 disables the limit
+        :param directory: optional directory, temporary directory is used by default
+        """
+        self._max_bytes = max_bytes
+        self._own_directory = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix='opentmi-logs-')
+        os.makedirs(self.directory, exist_ok=True)
+        self.stored = 0
+        self.deduplicated = 0
+        self.truncated = 0
+        self.bytes_written = 0
+
+    def _limit(self, text: str) -> str:
+        data = text.encode('utf-8')
+        if not self._max_bytes or len(data) <= self._max_bytes:
+            return text
+        self.truncated += 1
+        half = self._max_bytes // 2
+        head = data[:half].decode('utf-8', errors='ignore')
+        tail = data[-half:].decode('utf-8', errors='ignore')
+        return f'{head}\n...[{len(data) - 2 * half} bytes truncated]...\n{tail}'
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f'{digest}.gz')
+
+    def store(self, text: str) -> str:
+        """
+        Store log
+        :param text: captured log
+        :return: content hash used to load log
+        """
+        text = self._limit(text)
+        data = text.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        path = self._path(digest)
+        if os.path.exists(path):
+            self.deduplicated += 1
+            return digest
+        with gzip.open(path, 'wb', compresslevel=6) as file:
+            file.write(data)
+        self.stored += 1
+        self.bytes_written += os.path.getsize(path)
+        return digest
+
+    def load(self, digest: str) -> str:
+        """
+        Load log
+        :param digest: content hash returned by store()
+        :return: log as a string
+        """
+        with gzip.open(self._path(digest), 'rb') as file:
+            return file.read().decode('utf-8')
+
+    def close(self):
+        """
+        Remove stored logs
+        :return: None
+        """
+        if self._own_directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class StoredLog(File):
+    """
+    opentmi File which content is kept in LogStore until serialized
+    """
+
+    def __init__(self, store: LogStore, digest: str, name: str):
+        """
+        Constructor
+        :param store: LogStore
+        :param digest: content hash in store
+        :param name: log name
+        """
+        super().__init__()
+        self._store = store
+        self._digest = digest
+        self.name = name
+        self.mime_type = "txt"
+        self.encoding = "raw"
+
+    @property
+    def data(self):
+        """
+        Get plain dictionary including log content read from store
+        :return: dict
+        """
+        data = super().data
+        data['data'] = self._store.load(self._digest)
+        return data
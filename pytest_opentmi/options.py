@@ -0,0 +1,48 @@
+"""
+Reporter options module
+"""
+
+
+# pylint: disable=too-many-instance-attributes, too-few-public-methods
+class Options:
+    """
+    Options class.
+    Upload and reporting options of OpenTmiReport parsed from pytest config once per session.
+    Helper plugins, e.g. scheduler, read their own options, see new_scheduler.
+    """
+
+    DETACH_DIR = '.opentmi-upload'  # default hand off directory of --opentmi_detach
+
+    def __init__(self, config):
+        """
+        Constructor
+        :param config: pytest config object
+        """
+        self.host = config.getoption('opentmi')
+        self.token = config.getoption('opentmi_token')
+        self.login_check = config.getoption('opentmi_login_check')
+        self.store_logs = config.getoption('opentmi_store_logs')
+        self.log_limit = config.getoption('opentmi_log_limit')
+        self.stream = config.getoption('opentmi_stream')
+        self.stream_queue_size = config.getoption('opentmi_stream_queue')
+        self.suite_document = config.getoption('opentmi_suite_document')
+        self.batch_size = config.getoption('opentmi_batch_size')
+        self.batch_bytes = config.getoption('opentmi_batch_bytes')
+        self.workers = config.getoption('opentmi_upload_workers')
+        self.timeout = config.getoption('opentmi_timeout')
+        self.retries = config.getoption('opentmi_retries')
+        self.breaker_threshold = config.getoption('opentmi_breaker_threshold')
+        self.gzip_threshold = config.getoption('opentmi_gzip_threshold')
+        self.fallback_dir = config.getoption('opentmi_fallback_dir')
+        # results are handed off in spool to detached uploader process
+        self.detach_dir = config.getoption('opentmi_detach_dir') or \
+            (Options.DETACH_DIR if config.getoption('opentmi_detach') else None)
+        self.spool_dir = config.getoption('opentmi_spool') or self.detach_dir
+        self.stats_path = config.getoption('opentmi_stats_file')
+        self.stats = bool(config.getoption('opentmi_stats') or self.stats_path)
+        self.profiling = config.getoption('opentmi_profiling')
+        self.upload_policy = config.getoption('opentmi_upload_policy')
+        self.sample_rate = config.getoption('opentmi_sample_rate')
+        self.collapse_reruns = config.getoption('opentmi_collapse_reruns')
+        self.failed_first = config.getoption('opentmi_failed_first')
+        self.history_timeout = config.getoption('opentmi_history_timeout')
@@ -1,11 +1,11 @@
 """
 pytest plugin
 """
+import argparse
 import os
 import logging
 # app modules
 from . import __version__
-from .OpenTmiReport import OpenTmiReport
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +20,21 @@ def pytest_report_header(config):
     return f'pytest-opentmi version: {__version__}'
 
 
+def _shard(value: str) -> tuple:
+    """
+    Parse shard option
+    :param value: '<index>/<count>', e.g. '1/4'
+    :return: tuple of (index, count)
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(f'expected <index>/<count>, got {value!r}') from error
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f'shard index must be between 1 and {count}, got {index}')
+    return index, count
+
+
 def pytest_addoption(parser):
     """
     add option hook
@@ -41,6 +56,156 @@ def pytest_addoption(parser):
         default=os.environ.get('OPENTMI_TOKEN', None),
         help="Opentmi access token",
     )
+    group.addoption(
+        "--opentmi_login_check",
+        action="store",
+        choices=["warn", "fail"],
+        default="warn",
+        help="Login is done in background at session start. "
+             "warn: report failed login before tests are run (default), "
+             "fail: login before tests are collected and exit if it fails",
+    )
+    group.addoption(
+        "--opentmi_profiling",
+        action="store_true",
+        default=False,
+        help="Record setup, call and teardown durations and fixture setup and teardown times "
+             "to result profiling",
+    )
+    group.addoption(
+        "--opentmi_resources",
+        action="store",
+        nargs="?",
+        const="performance",
+        choices=["performance", "all"],
+        default=None,
+        help="Record CPU time, peak resident memory growth and read/write bytes of tests "
+             "to result profiling: performance tests (default) or all tests",
+    )
+    group.addoption(
+        "--opentmi_resources_interval",
+        action="store",
+        type=float,
+        metavar="seconds",
+        default=0.1,
+        help="Resident memory sampling interval for --opentmi_resources, "
+             "0 takes snapshots only when test starts and finishes",
+    )
+    group.addoption(
+        "--opentmi_stats",
+        "--opentmi-stats",
+        action="store_true",
+        default=False,
+        help="Measure plugin overhead: time spent in plugin hooks, upload latencies per endpoint, "
+             "serialized bytes, retries and upload queue depth. Printed in terminal summary",
+    )
+    group.addoption(
+        "--opentmi_stats_file",
+        action="store",
+        metavar="file.json",
+        default=None,
+        help="Write --opentmi_stats to given JSON file, implies --opentmi_stats. "
+             "Existing file which is not JSON is not overwritten",
+    )
+    group.addoption(
+        "--opentmi_schedule",
+        "--opentmi-schedule",
+        action="store_true",
+        default=False,
+        help="Run tests longest first using durations of earlier runs stored in opentmi, "
+             "with xdist --dist loadgroup tests are grouped to balanced groups",
+    )
+    group.addoption(
+        "--opentmi_shard",
+        action="store",
+        type=_shard,
+        metavar="index/count",
+        default=None,
+        help="Run only given shard of tests, shards are balanced using durations of earlier runs, "
+             "e.g. 1/4 on first of four CI nodes",
+    )
+    group.addoption(
+        "--opentmi_schedule_ttl",
+        action="store",
+        type=float,
+        metavar="seconds",
+        default=24 * 3600,
+        help="How long test durations fetched from opentmi are cached, "
+             "cached durations are used also when opentmi is not available",
+    )
+    group.addoption(
+        "--opentmi_failed_first",
+        "--opentmi-failed-first",
+        action="store_true",
+        default=False,
+        help="Run first tests which failed or were flaky recently on the same SUT branch, "
+             "failures on the same SUT commit first. Use with --maxfail to stop after first failures",
+    )
+    group.addoption(
+        "--opentmi_history_timeout",
+        action="store",
+        type=float,
+        metavar="seconds",
+        default=5,
+        help="How long collection waits for recent failures and tests wait for duration baselines "
+             "from opentmi before cached ones are used (default: 5)",
+    )
+    group.addoption(
+        "--opentmi_regressions",
+        "--opentmi-regressions",
+        action="store",
+        nargs="?",
+        const="warn",
+        choices=('warn', 'fail'),
+        default=None,
+        help="Compare durations of performance tests to median and MAD of recent passed runs "
+             "stored in opentmi, flag slowdowns in results and terminal summary. "
+             "'fail' fails the session when regressions are found",
+    )
+    group.addoption(
+        "--opentmi_regression_runs",
+        action="store",
+        type=int,
+        metavar="count",
+        default=20,
+        help="Number of recent passed runs in duration baseline (default: 20)",
+    )
+    group.addoption(
+        "--opentmi_regression_threshold",
+        action="store",
+        type=float,
+        metavar="score",
+        default=3.5,
+        help="Robust z-score, distance from baseline median in scaled MADs, "
+             "above which slower run is a regression (default: 3.5)",
+    )
+    group.addoption(
+        "--opentmi_upload_policy",
+        "--opentmi-upload-policy",
+        action="store",
+        choices=('all', 'aggregate', 'sample'),
+        default='all',
+        help="Upload all results (default), or aggregate passed and skipped results per test function "
+             "and upload only failed, errored and inconclusive results in full. "
+             "'sample' uploads also --opentmi_sample_rate of passed and skipped results in full",
+    )
+    group.addoption(
+        "--opentmi_sample_rate",
+        action="store",
+        type=float,
+        metavar="fraction",
+        default=0.01,
+        help="Fraction of passed and skipped results uploaded in full with --opentmi_upload_policy sample "
+             "(default: 0.01)",
+    )
+    group.addoption(
+        "--opentmi_collapse_reruns",
+        "--opentmi-collapse-reruns",
+        action="store_true",
+        default=False,
+        help="With pytest-rerunfailures upload one result per test instead of an inconclusive result "
+             "per rerun: final verdict with history of attempts and flaky flag in profiling.reruns",
+    )
     group.addoption(
         "--opentmi_store_logs",
         action="store",
@@ -48,6 +213,126 @@ def pytest_addoption(parser):
         default=None,
         help="Store logs to opentmi",
     )
+    group.addoption(
+        "--opentmi_log_limit",
+        action="store",
+        type=int,
+        metavar="bytes",
+        default=1024 * 1024,
+        help="Maximum size of single stored log, head and tail of longer logs are kept. "
+             "0 disables the limit",
+    )
+    group.addoption(
+        "--opentmi_stream",
+        action="store_true",
+        default=False,
+        help="Upload results in background while tests are running",
+    )
+    group.addoption(
+        "--opentmi_stream_queue",
+        action="store",
+        metavar="size",
+        type=int,
+        default=1000,
+        help="Maximum number of queued uploads in streaming mode",
+    )
+    group.addoption(
+        "--opentmi_suite_document",
+        action="store_true",
+        default=False,
+        help="Upload environment, SUT, DUT, metadata and suite fields once in suite summary result, "
+             "test results refer to it by job id",
+    )
+    group.addoption(
+        "--opentmi_batch_size",
+        action="store",
+        metavar="count",
+        type=int,
+        default=0,
+        help="Upload results in bulk requests of given size, 0 disables bulk upload",
+    )
+    group.addoption(
+        "--opentmi_batch_bytes",
+        action="store",
+        metavar="bytes",
+        type=int,
+        default=1024 * 1024,
+        help="Maximum size of single bulk request in bytes",
+    )
+    group.addoption(
+        "--opentmi_upload_workers",
+        "--opentmi-upload-workers",
+        action="store",
+        metavar="count",
+        type=int,
+        default=10,
+        help="Number of concurrent uploads, also size of the connection pool",
+    )
+    group.addoption(
+        "--opentmi_timeout",
+        action="store",
+        metavar="seconds",
+        type=float,
+        default=30,
+        help="Timeout for single opentmi request",
+    )
+    group.addoption(
+        "--opentmi_retries",
+        action="store",
+        metavar="count",
+        type=int,
+        default=3,
+        help="Maximum retries for failed opentmi request (connection errors, 429 and 5xx)",
+    )
+    group.addoption(
+        "--opentmi_breaker_threshold",
+        action="store",
+        metavar="count",
+        type=int,
+        default=10,
+        help="Stop uploading after given number of consecutive failed requests, 0 disables",
+    )
+    group.addoption(
+        "--opentmi_gzip_threshold",
+        action="store",
+        metavar="bytes",
+        type=int,
+        default=4096,
+        help="Gzip compress request bodies larger than given size (default: 4096), 0 disables",
+    )
+    group.addoption(
+        "--opentmi_fallback_dir",
+        action="store",
+        metavar="dir",
+        default=None,
+        help="Directory where results are spooled when uploads are stopped by circuit breaker, "
+             "by default those are dropped",
+    )
+    group.addoption(
+        "--opentmi_spool",
+        "--opentmi-spool",
+        action="store",
+        metavar="dir",
+        default=None,
+        help="Append finished results to spool files in given directory, "
+             "left over spools can be uploaded using opentmi-upload",
+    )
+    group.addoption(
+        "--opentmi_detach",
+        "--opentmi-detach",
+        action="store_true",
+        default=False,
+        help="Hand off results in spool files to an uploader process which keeps running when pytest exits. "
+             "Upload state is written to status.json and log to upload.log in --opentmi_detach_dir, "
+             "use 'opentmi-upload <dir> --wait' to wait for it",
+    )
+    group.addoption(
+        "--opentmi_detach_dir",
+        action="store",
+        metavar="dir",
+        default=None,
+        help="Directory of --opentmi_detach hand off (default: .opentmi-upload), implies --opentmi_detach",
+    )
 
 
 def pytest_configure(config):
@@ -58,11 +343,15 @@ def pytest_configure(config):
     """
     host = config.getoption("opentmi")
     if host:
-        if not hasattr(config, "slaveinput"):
-            # prevent opening opentmi reporter on slave nodes (xdist)
-            config._opentmi = OpenTmiReport(config)  # pylint: disable=protected-access
-            config.pluginmanager.register(config._opentmi)  # pylint: disable=protected-access
-            logger.debug(f'Opentmi reporter enabled: {host}')
+        # reporter and opentmi client are imported only when needed to keep plugin import light
+        from .OpenTmiReport import OpenTmiReport  # pylint: disable=import-outside-toplevel
+        # with xdist reporter is enabled also on worker nodes,
+        # workers upload their own results and controller uploads suite summary
+        config._opentmi = OpenTmiReport(config)  # pylint: disable=protected-access
+        config.pluginmanager.register(config._opentmi)  # pylint: disable=protected-access
+        for plugin in config._opentmi.plugins:  # pylint: disable=protected-access
+            config.pluginmanager.register(plugin)
+        logger.debug(f'Opentmi reporter enabled: {host}')
 
 
 def pytest_unconfigure(config):
@@ -74,4 +363,8 @@ def pytest_unconfigure(config):
     opentmi = getattr(config, "_opentmi", None)
     if opentmi:
         del config._opentmi  # pylint: disable=protected-access
+        opentmi.dump_stats()
         config.pluginmanager.unregister(opentmi)
+        for plugin in opentmi.plugins:
+            if config.pluginmanager.is_registered(plugin):
+                config.pluginmanager.unregister(plugin)
@@ -0,0 +1,118 @@
+"""
+Test phase and fixture profiler module
+"""
+import time
+
+import pytest
+
+
+class FixtureProfiler:
+    """
+    FixtureProfiler pytest plugin.
+    Measures wall time of setup, call and teardown phases and of each fixture setup and teardown.
+    Fixture time is accounted to the test which was running when fixture was set up or torn down,
+    e.g. module scoped fixture teardown belongs to the last test of the module.
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._nodeid = None
+        self._tests = {}
+        self._teardown_started = {}
+        self.totals = {}  # fixture name -> dict(setup, teardown, count)
+
+    def _test(self, nodeid):
+        return self._tests.setdefault(nodeid, dict(phases={}, fixtures={}))
+
+    def _add(self, fixturedef, phase: str, elapsed: float):
+        if self._nodeid is not None:
+            fixture = self._test(self._nodeid)['fixtures'].setdefault(
+                fixturedef.argname, dict(scope=str(fixturedef.scope)))
+            fixture[phase] = fixture.get(phase, 0) + elapsed
+        total = self.totals.setdefault(fixturedef.argname, dict(setup=0, teardown=0, count=0))
+        total[phase] += elapsed
+        if phase == 'setup':
+            total['count'] += 1
+
+    def pop(self, nodeid: str):
+        """
+        Get and forget profiling of finished test
+        :param nodeid: pytest node id
+        :return: dict with phases and fixtures or None
+        """
+        profiling = self._tests.pop(nodeid, None)
+        if profiling and not profiling['fixtures']:
+            del profiling['fixtures']
+        return profiling
+
+    def slowest_fixtures(self, limit: int = 10):
+        """
+        Rank fixtures by total setup and teardown time
+        :param limit: maximum number of fixtures
+        :return: list of dicts
+        """
+        ranking = [dict(name=name, total=total['setup'] + total['teardown'], **total)
+                   for name, total in self.totals.items()]
+        ranking.sort(key=lambda fixture: fixture['total'], reverse=True)
+        return ranking[:limit]
+
+    def add_totals(self, totals: dict):
+        """
+        Aggregate fixture totals, e.g. reported by xdist worker
+        :param totals: dict from totals attribute
+        :return: None
+        """
+        for name, values in totals.items():
+            total = self.totals.setdefault(name, dict(setup=0, teardown=0, count=0))
+            for key in total:
+                total[key] += values.get(key, 0)
+
+    # pytest hooks
+
+    def pytest_runtest_logstart(self, nodeid, location):  # pylint: disable=unused-argument
+        """
+        runtest logstart hook
+        :param nodeid: pytest node id
+        :param location: unused
+        :return: None
+        """
+        self._nodeid = nodeid
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_logreport(self, report):
+        """
+        logreport hook
+        :param report: TestReport
+        :return: None
+        """
+        self._test(report.nodeid)['phases'][report.when] = report.duration
+
+    @pytest.hookimpl(hookwrapper=True)
+    def pytest_fixture_setup(self, fixturedef, request):  # pylint: disable=unused-argument
+        """
+        fixture setup hook
+        :param fixturedef: FixtureDef
+        :param request: unused
+        :return: None
+        """
+        start = time.perf_counter()
+        yield
+        self._add(fixturedef, 'setup', time.perf_counter() - start)
+
+        def teardown_started():
+            self._teardown_started[id(fixturedef)] = time.perf_counter()
+        # finalizers are run in reverse order: this one runs before the fixture teardown
+        fixturedef.addfinalizer(teardown_started)
+
+    def pytest_fixture_post_finalizer(self, fixturedef, request):  # pylint: disable=unused-argument
+        """
+        fixture post finalizer hook
+        :param fixturedef: FixtureDef
+        :param request: unused
+        :return: None
+        """
+        start = self._teardown_started.pop(id(fixturedef), None)
+        if start is not None:
+            self._add(fixturedef, 'teardown', time.perf_counter() - start)
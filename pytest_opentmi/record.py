@@ -0,0 +1,63 @@
+"""
+Test record module
+"""
+
+
+def tcid_of(node) -> str:
+    """
+    Test case id of collected item or test report: test name with parameters.
+    Only trailing brackets are stripped, e.g. "test_ok[1]" gives "test_ok[1", which is kept
+    as is for compatibility with tcids already stored in opentmi.
+    :param node: Item or TestReport
+    :return: str
+    """
+    return node.location[2].rstrip("[]")
+
+
+def tcid_of_nodeid(nodeid: str) -> str:
+    """
+    Test case id of node id, same as tcid_of gives for the collected item
+    :param nodeid: e.g. "test/test_a.py::TestA::test_ok[1]"
+    :return: str, e.g. "TestA.test_ok[1"
+    """
+    return '.'.join(nodeid.split('::')[1:]).rstrip("[]")
+
+
+# pylint: disable=too-many-instance-attributes, too-few-public-methods
+class TestRecord:
+    """
+    Compact per test record which holds raw result and testcase fields.
+    Records are converted to opentmi_client Result and Testcase objects only when uploaded.
+    """
+
+    __test__ = False  # not a pytest test class
+    __slots__ = ('nodeid', 'tcid', 'verdict', 'note', 'duration', 'keywords', 'properties',
+                 'logs', 'description', 'skipped', 'skip_reason', 'generated_at', 'profiling')
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, nodeid: str, tcid: str, duration: float = None, keywords: list = None,
+                 description: str = None):
+        """
+        Constructor
+        :param nodeid: pytest node id
+        :param tcid: test case id
+        :param duration: test duration in seconds
+        :param keywords: list of test keywords
+        :param description: test docstring
+        """
+        self.nodeid = nodeid
+        self.tcid = tcid
+        self.verdict = None
+        self.note = None
+        self.duration = duration
+        self.keywords = keywords
+        self.properties = None
+        self.logs = None  # list of (name, digest in LogStore) tuples
+        self.description = description
+        self.skipped = False
+        self.skip_reason = None
+        self.generated_at = None
+        self.profiling = None  # phase and fixture timings
+
+    def __repr__(self):
+        return f'TestRecord({self.nodeid!r}, verdict={self.verdict!r})'
@@ -0,0 +1,247 @@
+"""
+Duration regression detection module
+"""
+import functools
+import logging
+import statistics
+import threading
+import time
+
+# app modules
+from .cache import _host_key
+from .record import tcid_of
+from .schedule import recent_durations
+
+logger = logging.getLogger(__name__)
+
+# scales median absolute deviation to standard deviation of normal distribution
+MAD_SCALE = 1.4826
+
+
+# pylint: disable=too-many-instance-attributes
+class DurationBaseline:
+    """
+    DurationBaseline class.
+    Rolling duration baseline of performance tests: median and median absolute deviation (MAD)
+    of recent passed runs per tcid, fetched from opentmi results and kept in pytest cache so that
+    it is available also offline. Duration of a run is a regression when its robust z-score
+    (distance from median in scaled MADs) exceeds threshold and it is clearly slower than median.
+    """
+
+    CACHE_KEY = 'opentmi/baselines'
+    MIN_RUNS = 5  # fewer runs is not a baseline
+    MIN_SLOWDOWN = 0.1  # relative slowdown which is always tolerated, e.g. when MAD is 0
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, cache=None, host: str = '', ttl: float = 24 * 3600, runs: int = 20,
+                 threshold: float = 3.5):
+        """
+        Constructor
+        :param cache: pytest config.cache or None to keep baselines only in memory
+        :param host: opentmi host, baselines are kept separately per host
+        :param ttl: seconds until cached baselines are fetched again
+        :param runs: number of recent passed runs in baseline
+        :param threshold: robust z-score above which slower run is a regression
+        """
+        self._cache = cache
+        self._key = _host_key(DurationBaseline.CACHE_KEY, host)
+        self._ttl = ttl
+        self.runs = runs
+        self.threshold = threshold
+        entry = (cache.get(self._key, None) if cache else None) or {}
+        if entry.get('runs') != runs:
+            entry = {}
+        self.updated = entry.get('updated', 0)
+        self.baselines = dict(entry.get('baselines', {}))
+        self.fetched = 0
+
+    @property
+    def fresh(self) -> bool:
+        """
+        Check if cached baselines are younger than ttl
+        :return: bool
+        """
+        return time.time() - self.updated < self._ttl
+
+    def missing(self, tcids) -> list:
+        """
+        tcids which need to be fetched: all when cache is stale, otherwise unknown ones
+        :param tcids: iterable of tcids
+        :return: list of unique tcids
+        """
+        fresh = self.fresh
+        return [tcid for tcid in dict.fromkeys(tcids) if not fresh or tcid not in self.baselines]
+
+    def fetch(self, transport, tcids: list, chunk: int = 100):
+        """
+        Fetch durations of recent passed runs using bulk queries
+        :param transport: UploadTransport
+        :param tcids: list of tcids
+        :param chunk: number of tcids per query
+        :raise OpentmiException: when query fails
+        :return: None
+        """
+        stale = not self.fresh
+        for part, history in recent_durations(transport, tcids, self.runs, {'exec.verdict': 'pass'}, chunk):
+            for tcid in part:
+                self.baselines[tcid] = DurationBaseline.summarize(history.get(tcid))
+            self.fetched += len(part)
+        if stale:
+            self.updated = time.time()
+
+    @staticmethod
+    def summarize(durations: list) -> dict:
+        """
+        Baseline of durations
+        :param durations: list of durations in seconds
+        :return: dict of median, mad and runs or None without durations
+        """
+        if not durations:
+            return None
+        median = statistics.median(durations)
+        mad = statistics.median(abs(duration - median) for duration in durations)
+        return dict(median=median, mad=mad, runs=len(durations))
+
+    def check(self, tcid: str, duration: float) -> dict:
+        """
+        Compare duration of this run to baseline
+        :param tcid: test case id
+        :param duration: call duration in seconds
+        :return: dict of baseline, score and regression flag or None when there is no baseline
+        """
+        baseline = self.baselines.get(tcid)
+        if not baseline or baseline['runs'] < DurationBaseline.MIN_RUNS or duration is None:
+            return None
+        median = baseline['median']
+        # MAD of very stable test can be 0, scale is at least 1% of median
+        scale = max(MAD_SCALE * baseline['mad'], 0.01 * median, 1e-6)
+        score = (duration - median) / scale
+        regression = score > self.threshold and duration > median * (1 + DurationBaseline.MIN_SLOWDOWN)
+        return dict(baseline, score=round(score, 2), regression=regression)
+
+    def save(self):
+        """
+        Persist baselines
+        :return: None
+        """
+        if self._cache:
+            self._cache.set(self._key, dict(runs=self.runs, updated=self.updated, baselines=self.baselines))
+
+
+# pylint: disable=too-many-instance-attributes
+class RegressionCheck:
+    """
+    RegressionCheck class.
+    Compares durations of passed performance tests to their DurationBaseline.
+    Baselines of collected performance tests are fetched in background while tests run,
+    cached baselines are used when those are fresh or fetching takes too long.
+    """
+
+    def __init__(self, baseline: DurationBaseline, fetch, mode: str = 'warn', timeout: float = 5.0):
+        """
+        Constructor
+        :param baseline: DurationBaseline
+        :param fetch: callable which fetches baselines of given tcids
+        :param mode: 'warn' or 'fail' to fail the session when regressions are found
+        :param timeout: seconds to wait for baselines since collection
+        """
+        self.baseline = baseline
+        self._fetch = fetch
+        self.mode = mode
+        self._timeout = timeout
+        self._thread = None
+        self._deadline = None
+        self._tcids = set()
+        self.regressions = dict(checked=0, found=[])
+
+    @property
+    def failed(self) -> bool:
+        """
+        Check if regressions fail the session
+        :return: bool
+        """
+        return self.mode == 'fail' and bool(self.regressions['found'])
+
+    def start(self, items: list):
+        """
+        Fetch baselines of collected performance tests in background
+        :param items: collected test items
+        :return: None
+        """
+        self._tcids = {tcid_of(item) for item in items if 'performance' in item.keywords}
+        missing = self.baseline.missing(self._tcids)
+        if not missing:
+            return
+        self._deadline = time.time() + self._timeout
+        self._thread = threading.Thread(target=self._fetch, args=(missing,), name='opentmi-baselines', daemon=True)
+        self._thread.start()
+
+    def wait(self):
+        """
+        Wait until baselines are fetched, at most timeout seconds since collection
+        :return: None
+        """
+        if not self._thread:
+            return
+        self._thread.join(max(0.0, self._deadline - time.time()))
+        if self._thread.is_alive():
+            logger.warning(f'Duration baselines are not fetched in {self._timeout}s, using cached baselines')
+        self._thread = None
+
+    def check(self, record):
+        """
+        Compare duration of passed performance test to its baseline,
+        regression is flagged in execution note and profiling of record
+        :param record: TestRecord
+        :return: None
+        """
+        if record.verdict != 'pass' or record.tcid not in self._tcids:
+            return
+        self.wait()
+        check = self.baseline.check(record.tcid, record.duration)
+        if check is None:
+            return
+        self.regressions['checked'] += 1
+        record.profiling = dict(record.profiling or {}, baseline=check)
+        if check['regression']:
+            note = f"duration regression: {record.duration:.3f}s, baseline median {check['median']:.3f}s " \
+                   f"(MAD {check['mad']:.3f}s, {check['runs']} runs), score {check['score']}"
+            record.note = note if record.note is None else f'{record.note}\n{note}'
+            self.regressions['found'].append(dict(tcid=record.tcid, nodeid=record.nodeid, duration=record.duration,
+                                                  median=check['median'], score=check['score']))
+
+    def merge(self, regressions: dict):
+        """
+        Merge regressions checked by xdist worker
+        :param regressions: regressions of worker
+        :return: None
+        """
+        self.regressions['checked'] += regressions['checked']
+        self.regressions['found'].extend(regressions['found'])
+
+    def save(self):
+        """
+        Persist baselines of this session
+        :return: None
+        """
+        if self._tcids:
+            self.wait()
+            self.baseline.save()
+
+
+def new_regression_check(config, fetch):
+    """
+    Create RegressionCheck of plugin options, with xdist every worker checks its own tests
+    :param config: pytest config
+    :param fetch: callable(what, func, *args) which runs opentmi query once logged in, e.g. BackgroundLogin.fetch
+    :return: RegressionCheck or None when regressions are not checked
+    """
+    mode = config.getoption('opentmi_regressions')
+    if not mode:
+        return None
+    baseline = DurationBaseline(getattr(config, 'cache', None), config.getoption('opentmi'),
+                                ttl=config.getoption('opentmi_schedule_ttl'),
+                                runs=config.getoption('opentmi_regression_runs'),
+                                threshold=config.getoption('opentmi_regression_threshold'))
+    return RegressionCheck(baseline, functools.partial(fetch, 'Duration baselines', baseline.fetch),
+                           mode=mode, timeout=config.getoption('opentmi_history_timeout'))
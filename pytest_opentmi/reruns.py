@@ -0,0 +1,71 @@
+"""
+Rerun collapse module
+"""
+
+
+class RerunCollapse:
+    """
+    RerunCollapse class.
+    Buffers pytest-rerunfailures attempts of a test and collapses them into final result of the test
+    as attempt history, results of attempts are discarded.
+    """
+
+    # failure note of rerun attempt in history of collapsed result
+    MAX_ATTEMPT_NOTE_LENGTH = 200
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._attempts = {}  # attempts by nodeid
+        self.collapsed = 0
+        self.flaky = 0
+
+    def add(self, report, record=None):
+        """
+        Buffer rerun attempt
+        :param report: TestReport with rerun outcome
+        :param record: TestRecord of the attempt if it was created in earlier phase, e.g. passed call
+        :return: None
+        """
+        crash = getattr(report.longrepr, 'reprcrash', None)
+        message = crash.message if crash else str(report.longrepr)
+        self._attempts.setdefault(report.nodeid, []).append(dict(
+            verdict='fail' if report.when == 'call' else 'error', when=report.when,
+            duration=record.duration if record else report.duration,
+            note=message.split('\n')[0][:RerunCollapse.MAX_ATTEMPT_NOTE_LENGTH]))
+
+    def collapse(self, record):
+        """
+        Add history of rerun attempts to final result of test
+        :param record: TestRecord of finished test
+        :return: None
+        """
+        if record.nodeid not in self._attempts:
+            return
+        attempts = self._attempts.pop(record.nodeid)
+        attempts.append(dict(verdict=record.verdict, duration=record.duration))
+        flaky = record.verdict == 'pass'
+        record.profiling = dict(record.profiling or {}, reruns=dict(count=len(attempts) - 1, flaky=flaky,
+                                                                   attempts=attempts))
+        if flaky and record.note is None:
+            record.note = f'flaky: passed on attempt {len(attempts)}'
+        self.collapsed += 1
+        self.flaky += flaky
+
+    def totals(self, reruns: int) -> dict:
+        """
+        Suite totals of collapsed reruns
+        :param reruns: count of rerun attempts
+        :return: dict
+        """
+        return dict(count=reruns, collapsed=self.collapsed, flaky=self.flaky)
+
+    def merge(self, totals: dict):
+        """
+        Add totals reported by xdist worker
+        :param totals: dict from totals()
+        :return: None
+        """
+        self.collapsed += totals.get('collapsed', 0)
+        self.flaky += totals.get('flaky', 0)
@@ -0,0 +1,230 @@
+"""
+Resource usage sampler module
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def _read_io():
+    """
+    Bytes read and written by the process, including cached I/O (linux only)
+    :return: tuple of (read, write) or None
+    """
+    try:
+        with open('/proc/self/io', encoding='ascii') as file:
+            values = dict(line.split(':', 1) for line in file)
+        return int(values['rchar']), int(values['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def _read_rss():
+    """
+    Current resident set size in bytes (linux only)
+    :return: int or None
+    """
+    try:
+        with open('/proc/self/statm', encoding='ascii') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _max_rss():
+    """
+    Peak resident set size of the process in bytes
+    :return: int
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class Snapshot:  # pylint: disable=too-few-public-methods
+    """
+    Process resource usage at one point of time
+    """
+    __slots__ = ('cpu_user', 'cpu_system', 'rss', 'max_rss', 'io_counters')
+
+    def __init__(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        self.cpu_user = usage.ru_utime
+        self.cpu_system = usage.ru_stime
+        self.rss = _read_rss()
+        self.max_rss = _max_rss()
+        self.io_counters = _read_io()
+
+
+# pylint: disable=too-many-instance-attributes
+class ResourceSampler:
+    """
+    ResourceSampler pytest plugin.
+    Takes process resource snapshots when test starts and finishes, and samples
+    resident memory in background thread to find the peak during the test.
+    CPU time and I/O are process wide, i.e. include background threads like streaming uploads.
+    """
+
+    def __init__(self, interval: float = 0.1, all_tests: bool = False):
+        """
+        Constructor
+        :param interval: resident memory sampling interval in seconds, 0 disables background sampling
+        :param all_tests: sample all tests, by default only tests marked as performance tests
+        """
+        self._interval = interval
+        self._all_tests = all_tests
+        self._lock = threading.Lock()
+        self._active = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._nodeid = None
+        self._start = None
+        self._peak_rss = None
+        self._samples = 0
+        self._results = {}
+        self.tests = 0
+        self.overhead = 0.0  # seconds spent by sampler itself
+
+    @staticmethod
+    def available() -> bool:
+        """
+        Check if resource usage can be sampled on this platform
+        :return: bool
+        """
+        return resource is not None
+
+    def _sample(self):
+        while not self._stopped.is_set():
+            self._active.wait()
+            if self._stopped.wait(self._interval):
+                break
+            started = time.thread_time()
+            rss = _read_rss()
+            with self._lock:
+                if self._nodeid is not None and rss is not None:
+                    self._peak_rss = max(self._peak_rss or 0, rss)
+                    self._samples += 1
+                self.overhead += time.thread_time() - started
+
+    def start(self, nodeid: str):
+        """
+        Start sampling test
+        :param nodeid: pytest node id
+        :return: None
+        """
+        started = time.perf_counter()
+        snapshot = Snapshot()
+        with self._lock:
+            self._nodeid = nodeid
+            self._start = snapshot
+            self._peak_rss = snapshot.rss
+            self._samples = 0
+            self.overhead += time.perf_counter() - started
+        if self._interval > 0:
+            if not self._thread:
+                self._thread = threading.Thread(target=self._sample, name='opentmi-sampler', daemon=True)
+                self._thread.start()
+            self._active.set()
+
+    def stop(self, nodeid: str):
+        """
+        Stop sampling test and store its resource usage
+        :param nodeid: pytest node id
+        :return: None
+        """
+        if self._nodeid != nodeid:
+            return
+        started = time.perf_counter()
+        self._active.clear()
+        end = Snapshot()
+        with self._lock:
+            start = self._start
+            usage = dict(cpu_user=end.cpu_user - start.cpu_user,
+                         cpu_system=end.cpu_system - start.cpu_system,
+                         samples=self._samples)
+            if start.rss is not None and end.rss is not None:
+                usage['rss_peak_delta'] = max(self._peak_rss or 0, end.rss) - start.rss
+            else:
+                usage['rss_peak_delta'] = end.max_rss - start.max_rss
+            if start.io_counters and end.io_counters:
+                usage['read_bytes'] = end.io_counters[0] - start.io_counters[0]
+                usage['write_bytes'] = end.io_counters[1] - start.io_counters[1]
+            self._results[nodeid] = usage
+            self._nodeid = None
+            self.tests += 1
+            self.overhead += time.perf_counter() - started
+
+    def pop(self, nodeid: str):
+        """
+        Get and forget resource usage of finished test
+        :param nodeid: pytest node id
+        :return: dict or None
+        """
+        return self._results.pop(nodeid, None)
+
+    def close(self):
+        """
+        Stop background sampling thread
+        :return: None
+        """
+        self._stopped.set()
+        self._active.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    # pytest hooks
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_setup(self, item):
+        """
+        runtest setup hook
+        :param item: test item
+        :return: None
+        """
+        if self._all_tests or 'performance' in item.keywords:
+            self.start(item.nodeid)
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_runtest_logreport(self, report):
+        """
+        logreport hook
+        :param report: TestReport
+        :return: None
+        """
+        if report.when == 'teardown':
+            self.stop(report.nodeid)
+
+    def pytest_sessionfinish(self, session):  # pylint: disable=unused-argument
+        """
+        session finish hook
+        :param session: unused
+        :return: None
+        """
+        self.close()
+
+
+def new_sampler(config):
+    """
+    Create ResourceSampler of plugin options
+    :param config: pytest config
+    :return: ResourceSampler or None when resources are not sampled
+    """
+    resources = config.getoption('opentmi_resources')
+    if not resources:
+        return None
+    if not ResourceSampler.available():
+        logger.warning('Resource sampling is not supported on this platform')
+        return None
+    return ResourceSampler(interval=config.getoption('opentmi_resources_interval'), all_tests=resources == 'all')
@@ -0,0 +1,507 @@
+"""
+History based test scheduling module
+"""
+import datetime
+import functools
+import logging
+import statistics
+import threading
+import time
+
+import pytest
+# app modules
+from .cache import _host_key
+from .record import tcid_of, tcid_of_nodeid
+
+logger = logging.getLogger(__name__)
+
+def recent_durations(transport, tcids: list, runs: int, query: dict = None, chunk: int = 100):
+    """
+    Fetch durations of recent runs per tcid using bulk queries.
+    Bulk query limit is shared by all tcids of a chunk, so frequently run tcids can fill it.
+    When it is full, tcids left with fewer than runs durations are queried one by one.
+    :param transport: UploadTransport
+    :param tcids: list of tcids
+    :param runs: maximum number of durations per tcid
+    :param query: additional result query, e.g. {'exec.verdict': 'pass'}
+    :param chunk: number of tcids per query
+    :raise OpentmiException: when query fails
+    :return: generator of (tcids, dict of tcid to list of durations newest first) per chunk
+    """
+    def query_into(history: dict, part: list, limit: int) -> int:
+        docs = transport.find_results(dict(query or {}, tcid={'$in': part}), fields='tcid exec.duration',
+                                      sort={'cre.time': -1}, limit=limit) or []
+        for doc in docs:
+            duration = (doc.get('exec') or {}).get('duration')
+            if isinstance(duration, (int, float)):
+                durations = history.setdefault(doc.get('tcid'), [])
+                if len(durations) < runs:
+                    durations.append(duration)
+        return len(docs)
+
+    for start in range(0, len(tcids), chunk):
+        part = tcids[start:start + chunk]
+        history = {}
+        limit = len(part) * runs
+        if query_into(history, part, limit) >= limit:
+            for tcid in part:
+                if len(history.get(tcid, [])) < runs:
+                    history.pop(tcid, None)
+                    query_into(history, [tcid], runs)
+        yield part, history
+
+
+class DurationHistory:
+    """
+    DurationHistory class.
+    Median call duration of recent runs per tcid, fetched from opentmi results
+    and kept in pytest cache so that it is available also offline.
+    tcids without history in opentmi are kept with None duration.
+    """
+
+    CACHE_KEY = 'opentmi/durations'
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, cache=None, host: str = '', ttl: float = 24 * 3600, runs: int = 5, durations: dict = None):
+        """
+        Constructor
+        :param cache: pytest config.cache or None to keep durations only in memory
+        :param host: opentmi host, durations are kept separately per host
+        :param ttl: seconds until cached durations are fetched again
+        :param runs: number of recent runs used for median duration
+        :param durations: fixed durations, e.g. from xdist controller, those are never fetched
+        """
+        self._cache = cache
+        self._key = _host_key(DurationHistory.CACHE_KEY, host)
+        self._ttl = ttl
+        self._runs = runs
+        entry = (cache.get(self._key, None) if cache else None) or {}
+        self.updated = time.time() if durations is not None else entry.get('updated', 0)
+        self.durations = dict(entry.get('durations', {}) if durations is None else durations)
+        self.fetched = 0
+
+    @property
+    def fresh(self) -> bool:
+        """
+        Check if cached durations are younger than ttl
+        :return: bool
+        """
+        return time.time() - self.updated < self._ttl
+
+    def missing(self, tcids) -> list:
+        """
+        tcids which need to be fetched: all when cache is stale, otherwise unknown ones
+        :param tcids: iterable of tcids
+        :return: list of unique tcids
+        """
+        fresh = self.fresh
+        return [tcid for tcid in dict.fromkeys(tcids) if not fresh or tcid not in self.durations]
+
+    def fetch(self, transport, tcids: list, chunk: int = 100):
+        """
+        Fetch durations of recent runs using bulk queries
+        :param transport: UploadTransport
+        :param tcids: list of tcids
+        :param chunk: number of tcids per query
+        :raise OpentmiException: when query fails
+        :return: None
+        """
+        stale = not self.fresh
+        for part, history in recent_durations(transport, tcids, self._runs, chunk=chunk):
+            for tcid in part:
+                self.durations[tcid] = statistics.median(history[tcid]) if tcid in history else None
+            self.fetched += len(part)
+        if stale:
+            self.updated = time.time()
+
+    def add(self, tcid: str, duration: float):
+        """
+        Record duration of this run, used until durations are fetched again
+        :param tcid: test case id
+        :param duration: call duration in seconds
+        :return: None
+        """
+        self.durations[tcid] = duration
+
+    def save(self):
+        """
+        Persist durations
+        :return: None
+        """
+        if self._cache:
+            self._cache.set(self._key, dict(updated=self.updated, durations=self.durations))
+
+
+# pylint: disable=too-many-instance-attributes
+class FailureHistory:
+    """
+    FailureHistory class.
+    Tests which failed or were flaky (rerun, i.e. inconclusive) recently on the same branch,
+    fetched from opentmi results and kept in pytest cache so that it is available also offline.
+    Failures of this run are added to cache, like pytest --ff does locally.
+    """
+
+    CACHE_KEY = 'opentmi/failures'
+    VERDICTS = ('fail', 'error', 'inconclusive')
+    COMMITS = 5  # failing commits kept per tcid
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, cache=None, host: str = '', branch: str = '', commit: str = '',
+                 ttl: float = 600, window: float = 7 * 24 * 3600, limit: int = 1000, failures: dict = None):
+        """
+        Constructor
+        :param cache: pytest config.cache or None to keep failures only in memory
+        :param host: opentmi host, failures are kept separately per host
+        :param branch: SUT branch, failures of other branches are ignored
+        :param commit: SUT commit id, failures of the same commit are run first
+        :param ttl: seconds until cached failures are fetched again
+        :param window: seconds how old failures are fetched
+        :param limit: maximum number of failed results fetched
+        :param failures: fixed failures, e.g. from xdist controller, those are never fetched
+        """
+        self._cache = cache
+        self._key = _host_key(FailureHistory.CACHE_KEY, host)
+        self._ttl = ttl
+        self._window = window
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._observed = {}
+        self.branch = branch
+        self.commit = commit
+        entry = (cache.get(self._key, None) if cache else None) or {}
+        if entry.get('branch') != branch:
+            entry = {}
+        self.updated = time.time() if failures is not None else entry.get('updated', 0)
+        self.failures = dict(entry.get('failures', {}) if failures is None else failures)
+
+    @property
+    def fresh(self) -> bool:
+        """
+        Check if cached failures are younger than ttl
+        :return: bool
+        """
+        return time.time() - self.updated < self._ttl
+
+    def fetch(self, transport):
+        """
+        Fetch recent failures of the branch using single bulk query
+        :param transport: UploadTransport
+        :raise OpentmiException: when query fails
+        :return: None
+        """
+        since = datetime.datetime.fromtimestamp(time.time() - self._window, datetime.timezone.utc).isoformat()
+        query = {'exec.verdict': {'$in': list(FailureHistory.VERDICTS)}, 'cre.time': {'$gte': since}}
+        if self.branch:
+            query['exec.sut.branch'] = self.branch
+        docs = transport.find_results(query, fields='tcid exec.verdict exec.sut.commit_id cre.time',
+                                      sort={'cre.time': -1}, limit=self._limit)
+        failures = {}
+        for doc in docs or []:
+            execution = doc.get('exec') or {}
+            FailureHistory._add(failures, doc.get('tcid'), execution.get('verdict'),
+                                (execution.get('sut') or {}).get('commit_id'), (doc.get('cre') or {}).get('time'))
+        with self._lock:
+            self.failures = failures
+            self.updated = time.time()
+
+    @staticmethod
+    def _add(failures: dict, tcid: str, verdict: str, commit: str, created: str):
+        failure = failures.setdefault(tcid, dict(failed=0, flaky=False, commits=[], last=None))
+        if verdict == 'inconclusive':
+            failure['flaky'] = True
+        else:
+            failure['failed'] += 1
+        if commit and commit not in failure['commits'] and len(failure['commits']) < FailureHistory.COMMITS:
+            failure['commits'].append(commit)
+        # results are sorted newest first
+        failure['last'] = failure['last'] or created
+
+    def add(self, tcid: str, verdict: str):
+        """
+        Record failure of this run
+        :param tcid: test case id
+        :param verdict: 'fail', 'error' or 'inconclusive'
+        :return: None
+        """
+        with self._lock:
+            FailureHistory._add(self._observed, tcid, verdict, self.commit,
+                                datetime.datetime.now(datetime.timezone.utc).isoformat())
+
+    def rank(self, tcid: str) -> tuple:
+        """
+        Priority of test, higher runs first:
+        failed on the same commit, failed on the branch, flaky, no recent failures
+        :param tcid: test case id
+        :return: tuple
+        """
+        failure = self.failures.get(tcid)
+        if not failure:
+            return 0, 0
+        if self.commit and self.commit in failure['commits']:
+            return 3, failure['failed']
+        return (2 if failure['failed'] else 1), failure['failed']
+
+    def save(self):
+        """
+        Persist failures, including failures of this run
+        :return: None
+        """
+        if self._cache:
+            with self._lock:
+                failures = {tcid: dict(failure, commits=list(failure['commits']))
+                            for tcid, failure in self.failures.items()}
+                for tcid, observed in self._observed.items():
+                    failure = failures.setdefault(tcid, dict(failed=0, flaky=False, commits=[], last=None))
+                    failure['failed'] += observed['failed']
+                    failure['flaky'] = failure['flaky'] or observed['flaky']
+                    failure['commits'] = (observed['commits'] + [commit for commit in failure['commits']
+                                                                 if commit not in observed['commits']])
+                    failure['commits'] = failure['commits'][:FailureHistory.COMMITS]
+                    failure['last'] = observed['last']
+                self._cache.set(self._key, dict(branch=self.branch, updated=self.updated, failures=failures))
+
+
+def estimate(tcids: list, durations: dict) -> list:
+    """
+    Estimated duration per test, tests without history get mean of known durations
+    :param tcids: list of tcids
+    :param durations: dict of tcid -> duration or None
+    :return: list of floats
+    """
+    known = [durations[tcid] for tcid in tcids if durations.get(tcid) is not None]
+    default = statistics.mean(known) if known else 0.0
+    return [durations[tcid] if durations.get(tcid) is not None else default for tcid in tcids]
+
+
+def balanced_groups(estimates: list, count: int) -> list:
+    """
+    Partition tests to groups of about equal total duration (longest processing time first)
+    :param estimates: estimated duration per test
+    :param count: number of groups
+    :return: list of groups, each a list of test indexes longest first
+    """
+    groups = [[] for _ in range(count)]
+    loads = [0.0] * count
+    for index in sorted(range(len(estimates)), key=lambda i: -estimates[i]):
+        target = min(range(count), key=lambda group: (loads[group], len(groups[group])))
+        groups[target].append(index)
+        loads[target] += estimates[index]
+    return groups
+
+
+# pylint: disable=too-many-instance-attributes
+class Scheduler:
+    """
+    Scheduler pytest plugin.
+    Orders collected tests longest first using durations of earlier runs, so that parallel
+    workers finish at about the same time, marks tests to balanced xdist groups
+    with --dist loadgroup and selects balanced shard of tests for CI nodes.
+    Optionally tests which failed recently are run first.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, history: DurationHistory, fetch=None, shard: tuple = None, groups: int = 0,
+                 longest_first: bool = True, failures: FailureHistory = None):
+        """
+        Constructor
+        :param history: DurationHistory
+        :param fetch: callable which fetches durations of given tcids, None uses history as is
+        :param shard: (index, count) to run only given 1-based shard of tests
+        :param groups: number of xdist groups, 0 disables grouping
+        :param longest_first: order tests longest first
+        :param failures: FailureHistory to run recently failed tests first
+        """
+        self.history = history
+        self._fetch = fetch
+        self.shard = shard
+        self._groups = groups
+        self.longest_first = longest_first
+        self.failures = failures
+        self._failures_thread = None
+        self._failures_deadline = None
+        self.summary = None
+        self._schedule = None  # given to xdist workers
+        self._refresh_thread = None
+
+    def start_failures(self, failures: FailureHistory, fetch, timeout: float):
+        """
+        Run recently failed tests first. Failures are fetched in background while tests are collected,
+        cached failures are used when those are fresh.
+        :param failures: FailureHistory
+        :param fetch: callable which fetches failures
+        :param timeout: seconds to wait for failures before tests are ordered
+        :return: None
+        """
+        self.failures = failures
+        if failures.fresh:
+            return
+        self._failures_deadline = time.time() + timeout
+        self._failures_thread = threading.Thread(target=fetch, name='opentmi-failures', daemon=True)
+        self._failures_thread.start()
+
+    def wait_failures(self):
+        """
+        Wait until recent failures are fetched, at most timeout given to start_failures.
+        Cached failures are used if fetching takes longer.
+        :return: None
+        """
+        if not self._failures_thread:
+            return
+        self._failures_thread.join(max(0.0, self._failures_deadline - time.time()))
+        if self._failures_thread.is_alive():
+            logger.warning('Recent failures are not fetched in time, using cached failures')
+        self._failures_thread = None
+
+    def refresh(self, tcids=None):
+        """
+        Fetch missing or stale durations
+        :param tcids: tcids, by default all which are in history
+        :return: None
+        """
+        if not (self.longest_first or self.shard or self._groups):
+            return
+        missing = self.history.missing(self.history.durations if tcids is None else tcids)
+        if self._fetch and missing:
+            self._fetch(missing)
+
+    def schedule(self, items: list) -> tuple:
+        """
+        Order items recently failed and longest first and select shard
+        :param items: collected items
+        :return: tuple of (selected items, deselected items, estimated seconds of selected)
+        """
+        tcids = [tcid_of(item) for item in items]
+        estimates = estimate(tcids, self.history.durations)
+        if self.shard:
+            index, count = self.shard
+            selected = balanced_groups(estimates, count)[index - 1]
+            chosen = set(selected)
+            deselected = [item for position, item in enumerate(items) if position not in chosen]
+        else:
+            selected = list(range(len(items)))
+            if self.longest_first:
+                selected.sort(key=lambda i: -estimates[i])
+            deselected = []
+        if self.failures:
+            ranks = [self.failures.rank(tcid) for tcid in tcids]
+            selected.sort(key=lambda i: ranks[i], reverse=True)
+        return [items[i] for i in selected], deselected, sum(estimates[i] for i in selected)
+
+    def _mark_groups(self, items: list):
+        tcids = [tcid_of(item) for item in items]
+        estimates = estimate(tcids, self.history.durations)
+        for group, indexes in enumerate(balanced_groups(estimates, self._groups)):
+            for index in indexes:
+                item = items[index]
+                # keep groups given by user
+                if not any(item.iter_markers('xdist_group')):
+                    item.add_marker(pytest.mark.xdist_group(name=f'opentmi_{group}'))
+
+    # pytest hooks
+
+    @pytest.hookimpl(tryfirst=True)
+    def pytest_collection_modifyitems(self, session, config, items):  # pylint: disable=unused-argument
+        """
+        collection modifyitems hook, runs before xdist applies xdist_group marks
+        :param session: unused
+        :param config: pytest config
+        :param items: collected items
+        :return: None
+        """
+        if not items:
+            return
+        self.refresh([tcid_of(item) for item in items])
+        self.wait_failures()
+        selected, deselected, estimated = self.schedule(items)
+        if deselected:
+            config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+        if self._groups > 1:
+            self._mark_groups(items)
+        known = sum(1 for item in items if self.history.durations.get(tcid_of(item)) is not None)
+        self.summary = dict(tests=len(items), known=known, estimated=estimated, deselected=len(deselected))
+        if self.failures:
+            self.summary['failed_first'] = sum(1 for item in items if self.failures.rank(tcid_of(item))[0])
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_configure_node(self, node):
+        """
+        xdist hook, called on controller for each worker node.
+        Workers use durations and failures of controller, so that all of them collect tests in the same order.
+        :param node: WorkerController
+        :return: None
+        """
+        if self._schedule is None:
+            # refresh known durations once for all workers
+            self.refresh()
+            groups = 0
+            if node.config.getoption('dist') == 'loadgroup' and (self.shard or self.longest_first):
+                groups = len(node.config.getoption('tx') or [])
+            self._schedule = dict(durations=self.history.durations, groups=groups, failures=None)
+            if self.failures:
+                self.wait_failures()
+                self._schedule.update(failures=self.failures.failures, commit=self.failures.commit)
+        node.workerinput['opentmi_schedule'] = self._schedule
+
+    @pytest.hookimpl(optionalhook=True)
+    def pytest_xdist_node_collection_finished(self, node, ids):  # pylint: disable=invalid-name,unused-argument
+        """
+        xdist hook, called on controller when worker node has collected tests.
+        Controller does not collect, so durations of collected tests are fetched here
+        in background for next runs, workers of this run use durations given by controller.
+        :param node: unused
+        :param ids: collected node ids
+        :return: None
+        """
+        if self._refresh_thread is None:
+            tcids = [tcid_of_nodeid(nodeid) for nodeid in ids]
+            self._refresh_thread = threading.Thread(target=self.refresh, args=(tcids,), daemon=True)
+            self._refresh_thread.start()
+
+    def pytest_runtest_logreport(self, report):
+        """
+        logreport hook
+        :param report: TestReport
+        :return: None
+        """
+        if report.when == 'call' and not report.skipped:
+            self.history.add(tcid_of(report), report.duration)
+        if self.failures and report.failed:
+            self.failures.add(tcid_of(report), 'fail' if report.when == 'call' else 'error')
+
+    def pytest_sessionfinish(self, session):  # pylint: disable=unused-argument
+        """
+        session finish hook
+        :param session: unused
+        :return: None
+        """
+        if self._refresh_thread:
+            self._refresh_thread.join()
+        self.history.save()
+        if self.failures:
+            self.failures.save()
+
+
+def new_scheduler(config, fetch, workerinput: dict = None):
+    """
+    Create Scheduler of plugin options, xdist workers use durations and failures given by controller
+    :param config: pytest config
+    :param fetch: callable(what, func, *args) which runs opentmi query once logged in, e.g. BackgroundLogin.fetch
+    :param workerinput: xdist workerinput or None
+    :return: Scheduler or None when tests are not scheduled
+    """
+    shard = config.getoption('opentmi_shard')
+    longest_first = config.getoption('opentmi_schedule')
+    if not (longest_first or shard or config.getoption('opentmi_failed_first')):
+        return None
+    schedule = (workerinput or {}).get('opentmi_schedule')
+    if schedule:
+        failures = None
+        if schedule.get('failures') is not None:
+            failures = FailureHistory(commit=schedule['commit'], failures=schedule['failures'])
+        return Scheduler(DurationHistory(durations=schedule['durations']), shard=shard, groups=schedule['groups'],
+                         longest_first=longest_first, failures=failures)
+    history = DurationHistory(getattr(config, 'cache', None), config.getoption('opentmi'),
+                              ttl=config.getoption('opentmi_schedule_ttl'))
+    return Scheduler(history, fetch=functools.partial(fetch, 'Test durations', history.fetch),
+                     shard=shard, longest_first=longest_first)
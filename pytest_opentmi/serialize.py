@@ -0,0 +1,65 @@
+"""
+Payload serialization module.
+Request bodies are encoded once to compact UTF-8 JSON using orjson when it is
+installed (pip install pytest-opentmi[fast]), stdlib json otherwise, and
+gzip compressed when they are larger than given threshold.
+"""
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:  # optional fast encoder
+    orjson = None
+
+ENCODER = 'orjson' if orjson else 'json'
+GZIP_MAGIC = b'\x1f\x8b'  # JSON body never starts with these
+
+
+def _json_dumps(payload) -> bytes:
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def dumps(payload) -> bytes:
+    """
+    Encode payload to JSON
+    :param payload: dict or list
+    :raise TypeError: when payload is not JSON serializable
+    :return: bytes
+    """
+    if orjson:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS)  # pylint: disable=no-member
+        except TypeError:
+            # e.g. integers larger than 64 bits, which stdlib json handles
+            pass
+    return _json_dumps(payload)
+
+
+def join(items: list) -> bytes:
+    """
+    JSON array of already encoded items
+    :param items: list of bytes from dumps()
+    :return: bytes
+    """
+    return b'[' + b','.join(items) + b']'
+
+
+def compress(data: bytes, threshold: int) -> bytes:
+    """
+    Gzip compress encoded body larger than threshold
+    :param data: encoded body
+    :param threshold: size in bytes, 0 disables compression
+    :return: bytes, compressed body starts with GZIP_MAGIC
+    """
+    if threshold and len(data) > threshold:
+        return gzip.compress(data, compresslevel=6)
+    return data
+
+
+def is_compressed(body: bytes) -> bool:
+    """
+    :param body: body from compress()
+    :return: True if body is gzip compressed
+    """
+    return body[:2] == GZIP_MAGIC
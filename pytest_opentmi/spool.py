@@ -0,0 +1,241 @@
+"""
+Result spool module.
+Finished results and testcases are appended to an append-only JSONL file
+so they survive a killed pytest process or an unreachable server,
+and can be replayed later with `opentmi-upload`.
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+import uuid
+from multiprocessing.dummy import Pool as ThreadPool
+
+# app modules
+from . import serialize
+
+logger = logging.getLogger(__name__)
+
+SPOOL_SUFFIX = '.jsonl'
+STATE_SUFFIX = '.state'
+
+
+class Spool:
+    """
+    Spool writer.
+    Each record is flushed to OS when appended, so it survives a killed process,
+    and records are fsync'd to disk in batches.
+    """
+
+    def __init__(self, directory: str, host: str = '', sync_every: int = 100):
+        """
+        Constructor
+        :param directory: spool directory, created if missing
+        :param host: opentmi host, stored in spool header
+        :param sync_every: fsync interval in records
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._session = uuid.uuid4().hex
+        self.path = os.path.join(directory, f'{self._session}{SPOOL_SUFFIX}')
+        self._sync_every = max(1, sync_every)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._unsynced = 0
+        self._file = open(self.path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+        self._write(dict(type='header', host=host, created=datetime.datetime.now().isoformat()))
+
+    def _write(self, record: dict):
+        line = serialize.dumps(record).decode('utf-8')
+        self._file.write(line + '\n')
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self._sync_every:
+            self.sync()
+
+    def append(self, kind: str, data: dict) -> dict:
+        """
+        Append record to spool, document which is not JSON serializable is logged and left out
+        :param kind: 'result' or 'testcase'
+        :param data: plain document to be uploaded
+        :return: appended record or None when document is not serializable
+        """
+        with self._lock:
+            record = dict(id=f'{self._session}-{self._seq + 1}', type=kind, data=data)
+            try:
+                self._write(record)
+            except (TypeError, ValueError) as error:
+                logger.warning(f"{kind} {data.get('tcid')} is not serializable, not spooled: {error}")
+                return None
+            self._seq += 1
+        return record
+
+    def sync(self):
+        """
+        fsync spool file
+        :return: None
+        """
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        """
+        Sync and close spool file
+        :return: None
+        """
+        with self._lock:
+            if not self._file.closed:
+                self.sync()
+                self._file.close()
+
+
+class SpoolState:
+    """
+    Upload state of single spool file.
+    Ids of uploaded records are appended to '<spool>.state'.
+    """
+
+    def __init__(self, spool_path: str, sync_every: int = 100):
+        """
+        Constructor
+        :param spool_path: spool file path
+        :param sync_every: fsync interval in records
+        """
+        self.path = spool_path + STATE_SUFFIX
+        self._sync_every = max(1, sync_every)
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self.uploaded = set()
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as file:
+                self.uploaded = set(filter(None, file.read().split('\n')))
+        self._file = open(self.path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+
+    def mark(self, record_id: str):
+        """
+        Mark record uploaded
+        :param record_id: record id
+        :return: None
+        """
+        with self._lock:
+            if record_id in self.uploaded:
+                return
+            self.uploaded.add(record_id)
+            self._file.write(record_id + '\n')
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= self._sync_every:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def close(self):
+        """
+        Sync and close state file
+        :return: None
+        """
+        with self._lock:
+            if not self._file.closed:
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+def read_records(path: str):
+    """
+    Read spool file
+    :param path: spool file path
+    :return: tuple of (header dict, list of records)
+    """
+    header = {}
+    records = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # last line might be partially written if process was killed
+                logger.warning(f'Skipping corrupted record in {path}')
+                continue
+            if record.get('type') == 'header':
+                header = record
+            else:
+                records.append(record)
+    return header, records
+
+
+def find_spools(directory: str):
+    """
+    Find spool files from directory
+    :param directory: spool directory
+    :return: sorted list of spool file paths
+    """
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.endswith(SPOOL_SUFFIX))
+
+
+class SpoolReplayer:
+    """
+    Uploads spooled records in parallel and tracks per-record upload state,
+    so replay can be resumed after a partial upload without duplicates.
+    """
+
+    def __init__(self, upload_result, upload_testcase, workers: int = 10):
+        """
+        Constructor
+        :param upload_result: callable(dict) -> bool
+        :param upload_testcase: callable(dict) -> bool
+        :param workers: number of parallel uploads
+        """
+        self._uploaders = dict(result=upload_result, testcase=upload_testcase)
+        self._workers = max(1, workers)
+
+    def upload_record(self, record: dict, state: SpoolState) -> bool:
+        """
+        Upload single record unless already uploaded
+        :param record: spool record
+        :param state: SpoolState of spool file
+        :return: True if record is uploaded
+        """
+        if record['id'] in state.uploaded:
+            return True
+        uploader = self._uploaders.get(record['type'])
+        if not uploader:
+            logger.warning(f"Unknown record type: {record['type']}")
+            return False
+        try:
+            uploaded = uploader(record['data'])
+        except Exception as error:  # pylint: disable=broad-except
+            logger.warning(f"Record {record['id']} upload failed: {error}")
+            uploaded = False
+        if uploaded:
+            state.mark(record['id'])
+        return uploaded
+
+    def replay_file(self, path: str, state: SpoolState = None):
+        """
+        Upload pending records of spool file, testcases first
+        :param path: spool file path
+        :param state: optional SpoolState, opened from path if not given
+        :return: tuple of (uploaded, failed, already uploaded) counts
+        """
+        _, records = read_records(path)
+        own_state = state is None
+        state = state or SpoolState(path)
+        done = sum(1 for record in records if record['id'] in state.uploaded)
+        pending = [record for record in records if record['id'] not in state.uploaded]
+        uploaded = failed = 0
+        pool = ThreadPool(self._workers)
+        try:
+            for kind in ('testcase', 'result'):
+                batch = [record for record in pending if record['type'] == kind]
+                for success in pool.map(lambda record: self.upload_record(record, state), batch):
+                    if success:
+                        uploaded += 1
+                    else:
+                        failed += 1
+        finally:
+            pool.close()
+            pool.join()
+            if own_state:
+                state.close()
+        logger.info(f'{path}: uploaded {uploaded}, failed {failed}, already uploaded {done}')
+        return uploaded, failed, done
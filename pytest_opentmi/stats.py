@@ -0,0 +1,240 @@
+"""
+Plugin self-instrumentation module
+"""
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+
+def percentile(values, percent: float):
+    """
+    Nearest-rank percentile
+    :param values: list of numbers
+    :param percent: percentile, 0-100
+    :return: value or None if values is empty
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+# pylint: disable=too-many-instance-attributes
+class Stats:
+    """
+    Stats class.
+    Collects time spent in plugin hooks and methods, upload request latencies,
+    bytes on wire and retries per endpoint, payload encoding time and size,
+    and upload queue depth over time.
+    Timings are inclusive: time of nested instrumented methods is counted also to the caller.
+    """
+
+    # minimum interval in seconds between queue depth samples, unless depth reaches new maximum
+    QUEUE_DEPTH_INTERVAL = 0.25
+
+    def __init__(self, node: str = 'main'):
+        """
+        Constructor
+        :param node: name of this process in queue depth series, e.g. xdist worker id
+        """
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self._node = node
+        self._depth_sampled = None
+        self._depth_max = 0
+        self.timings = {}  # name -> [calls, total seconds, max seconds]
+        self.requests = {}  # endpoint -> dict(latencies, failed, retries, bytes)
+        self.queue_depth = {}  # node -> list of [seconds since start, depth]
+        self.encoding = [0, 0.0, 0]  # encoded payloads, seconds, bytes before compression
+        self.merged = 0  # number of merged xdist workers
+
+    def add_timing(self, name: str, elapsed: float):
+        """
+        Record single call
+        :param name: hook or method name
+        :param elapsed: seconds
+        :return: None
+        """
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                self.timings[name] = [1, elapsed, elapsed]
+            else:
+                timing[0] += 1
+                timing[1] += elapsed
+                timing[2] = max(timing[2], elapsed)
+
+    def timed(self, name: str, func):
+        """
+        Wrap callable to record its calls
+        :param name: name for timings
+        :param func: callable
+        :return: wrapped callable
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add_timing(name, time.perf_counter() - start)
+        return wrapper
+
+    def instrument(self, obj, names, prefix: str = ''):
+        """
+        Replace methods of an object with timed ones. Only the instance is modified,
+        so there is no overhead when stats are not collected.
+        :param obj: object, e.g. pytest plugin instance
+        :param names: method names
+        :param prefix: prefix of timing names
+        :return: None
+        """
+        for name in names:
+            setattr(obj, name, self.timed(f'{prefix}{name}', getattr(obj, name)))
+
+    def _request(self, endpoint: str) -> dict:
+        return self.requests.setdefault(endpoint, dict(latencies=[], failed=0, retries=0, bytes=0))
+
+    def add_request(self, endpoint: str, elapsed: float, size: int = 0, failed: bool = False):
+        """
+        Record upload request
+        :param endpoint: request method and path, e.g. 'POST /api/v0/results'
+        :param elapsed: latency in seconds
+        :param size: request body bytes on wire
+        :param failed: True if request failed
+        :return: None
+        """
+        with self._lock:
+            request = self._request(endpoint)
+            request['latencies'].append(elapsed)
+            request['bytes'] += size
+            if failed:
+                request['failed'] += 1
+
+    def add_encoding(self, elapsed: float, size: int):
+        """
+        Record encoded payload
+        :param elapsed: encoding time in seconds
+        :param size: encoded bytes
+        :return: None
+        """
+        with self._lock:
+            self.encoding[0] += 1
+            self.encoding[1] += elapsed
+            self.encoding[2] += size
+
+    def add_retry(self, endpoint: str):
+        """
+        Record retried request
+        :param endpoint: request method and path
+        :return: None
+        """
+        with self._lock:
+            self._request(endpoint)['retries'] += 1
+
+    def add_queue_depth(self, depth: int):
+        """
+        Sample upload queue depth, samples are taken at most every QUEUE_DEPTH_INTERVAL
+        unless depth reaches new maximum
+        :param depth: number of queued uploads
+        :return: None
+        """
+        now = time.perf_counter()
+        with self._lock:
+            if self._depth_sampled is not None and depth <= self._depth_max and \
+                    now - self._depth_sampled < Stats.QUEUE_DEPTH_INTERVAL:
+                return
+            self._depth_sampled = now
+            self._depth_max = max(self._depth_max, depth)
+            self.queue_depth.setdefault(self._node, []).append([round(now - self._started, 3), depth])
+
+    def state(self) -> dict:
+        """
+        Raw collected data, e.g. to be sent from xdist worker to controller
+        :return: dict
+        """
+        with self._lock:
+            return dict(timings={name: list(timing) for name, timing in self.timings.items()},
+                        requests={endpoint: dict(request, latencies=list(request['latencies']))
+                                  for endpoint, request in self.requests.items()},
+                        queue_depth=dict(self.queue_depth),
+                        encoding=list(self.encoding))
+
+    def merge(self, state: dict):
+        """
+        Aggregate data collected by another process
+        :param state: dict from state()
+        :return: None
+        """
+        with self._lock:
+            for name, (calls, total, longest) in state.get('timings', {}).items():
+                timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+                timing[0] += calls
+                timing[1] += total
+                timing[2] = max(timing[2], longest)
+            for endpoint, other in state.get('requests', {}).items():
+                request = self._request(endpoint)
+                request['latencies'].extend(other['latencies'])
+                for key in ('failed', 'retries', 'bytes'):
+                    request[key] += other[key]
+            self.queue_depth.update(state.get('queue_depth', {}))
+            for index, value in enumerate(state.get('encoding', ())):
+                self.encoding[index] += value
+            self.merged += 1
+
+    @property
+    def hook_time(self) -> float:
+        """
+        Total seconds spent in pytest hooks of the plugin
+        :return: float
+        """
+        return sum(timing[1] for name, timing in self.timings.items() if name.startswith('pytest_'))
+
+    def summary(self) -> dict:
+        """
+        Summarize collected data
+        :return: dict
+        """
+        with self._lock:
+            timings = {name: dict(calls=calls, total=total, mean=total / calls, max=longest)
+                       for name, (calls, total, longest) in self.timings.items()}
+            requests = {}
+            for endpoint, request in self.requests.items():
+                latencies = request['latencies']
+                requests[endpoint] = dict(count=len(latencies),
+                                          failed=request['failed'],
+                                          retries=request['retries'],
+                                          bytes=request['bytes'],
+                                          p50=percentile(latencies, 50),
+                                          p95=percentile(latencies, 95),
+                                          p99=percentile(latencies, 99),
+                                          max=max(latencies) if latencies else None)
+            queue_depth = {node: dict(max=max((depth for _, depth in series), default=0), series=series)
+                           for node, series in self.queue_depth.items()}
+            payloads, encode_time, encoded = self.encoding
+        return dict(timings=timings,
+                    requests=requests,
+                    bytes_on_wire=sum(request['bytes'] for request in requests.values()),
+                    retries=sum(request['retries'] for request in requests.values()),
+                    encoding=dict(payloads=payloads, time=encode_time, bytes=encoded),
+                    queue_depth=queue_depth)
+
+    def dump(self, path: str, **extra):
+        """
+        Write summary as JSON, existing file is overwritten only when it is JSON
+        :param path: file path
+        :param extra: additional top level fields
+        :raise ValueError: when path is an existing file which is not JSON
+        :return: None
+        """
+        if os.path.exists(path):
+            try:
+                with open(path, encoding='utf-8') as file:
+                    json.load(file)
+            except (UnicodeDecodeError, ValueError) as error:
+                raise ValueError(f'{path} exists and is not a JSON file') from error
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(dict(self.summary(), **extra), file, indent=2)
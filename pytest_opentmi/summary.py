@@ -0,0 +1,149 @@
+"""
+Terminal summary module: opentmi lines written at the end of pytest terminal summary
+"""
+from . import serialize
+
+
+def write_transfer(terminalreporter, transport, transfer: dict):
+    """
+    Write requests, bytes and encoding of uploads and reduced upload concurrency
+    :param terminalreporter: pytest TerminalReporter
+    :param transport: UploadTransport
+    :param transfer: totals of session including xdist workers: requests, bytes_sent,
+    bytes_encoded, encode_time and testcases_skipped
+    :return: None
+    """
+    terminalreporter.write_line(f"opentmi: {transfer['requests']} requests, {transfer['bytes_sent']} bytes sent, "
+                                f"{transfer['testcases_skipped']} unchanged testcases skipped")
+    if transfer['bytes_encoded']:
+        compressed = f", gzip above {transport.gzip_threshold} bytes" if transport.gzip_threshold else ""
+        terminalreporter.write_line(f"opentmi: {transfer['bytes_encoded']} bytes encoded with {serialize.ENCODER} "
+                                    f"in {transfer['encode_time'] * 1000:.1f}ms{compressed}")
+    limiter = transport.limiter
+    if limiter.lowest < limiter.max_limit:
+        terminalreporter.write_line(f"opentmi: upload concurrency reduced to {limiter.lowest} "
+                                    f"(max {limiter.max_limit}) due to slow or overloaded server")
+
+
+def write_fixtures(terminalreporter, fixtures: list):
+    """
+    Write slowest fixtures
+    :param terminalreporter: pytest TerminalReporter
+    :param fixtures: fixture totals from FixtureProfiler.slowest_fixtures
+    :return: None
+    """
+    for fixture in fixtures:
+        terminalreporter.write_line(f"opentmi: slow fixture {fixture['name']}: {fixture['total']:.2f}s "
+                                    f"(setup {fixture['setup']:.2f}s, teardown {fixture['teardown']:.2f}s, "
+                                    f"{fixture['count']} times)")
+
+
+def write_sampling(terminalreporter, sampling: dict):
+    """
+    Write resource sampling overhead
+    :param terminalreporter: pytest TerminalReporter
+    :param sampling: dict of sampled tests and overhead in seconds
+    :return: None
+    """
+    if sampling['tests']:
+        terminalreporter.write_line(f"opentmi: resource usage sampled for {sampling['tests']} tests, "
+                                    f"sampler overhead {sampling['overhead'] * 1000:.1f}ms "
+                                    f"({sampling['overhead'] * 1000 / sampling['tests']:.2f}ms per test)")
+
+
+def write_schedule(terminalreporter, scheduler):
+    """
+    Write test order and estimated duration
+    :param terminalreporter: pytest TerminalReporter
+    :param scheduler: Scheduler
+    :return: None
+    """
+    summary = scheduler.summary
+    order = []
+    if 'failed_first' in summary:
+        order.append(f"{summary['failed_first']} recently failed first")
+    if scheduler.longest_first:
+        order.append("longest first")
+    if scheduler.shard:
+        order.append(f"shard {scheduler.shard[0]}/{scheduler.shard[1]}")
+    terminalreporter.write_line(f"opentmi: {summary['tests']} tests scheduled {', '.join(order)}, "
+                                f"{summary['known']} with duration history, "
+                                f"estimated {summary['estimated']:.1f}s")
+
+
+def write_aggregated(terminalreporter, totals: dict):
+    """
+    Write results aggregated by upload policy
+    :param terminalreporter: pytest TerminalReporter
+    :param totals: Aggregator.totals
+    :return: None
+    """
+    policy = f"sampling {totals['rate']:.2%}" if totals['policy'] == 'sample' else 'aggregating'
+    terminalreporter.write_line(f"opentmi: upload policy {policy}: {totals['passed']} passed and "
+                                f"{totals['skipped']} skipped results aggregated to "
+                                f"{totals['functions']} test function results, "
+                                f"{totals['sampled']} of them uploaded in full")
+
+
+def write_reruns(terminalreporter, totals: dict):
+    """
+    Write reruns collapsed into final results
+    :param terminalreporter: pytest TerminalReporter
+    :param totals: RerunCollapse.totals
+    :return: None
+    """
+    terminalreporter.write_line(f"opentmi: {totals['count']} reruns collapsed into {totals['collapsed']} results, "
+                                f"{totals['flaky']} flaky")
+
+
+def write_regressions(terminalreporter, check):
+    """
+    Write duration regressions, slowest first
+    :param terminalreporter: pytest TerminalReporter
+    :param check: RegressionCheck
+    :return: None
+    """
+    found = sorted(check.regressions['found'], key=lambda regression: -regression['score'])
+    failing = " (session failed, --opentmi_regressions fail)" if check.failed else ""
+    terminalreporter.write_line(f"opentmi: {len(found)} duration regressions in "
+                                f"{check.regressions['checked']} performance tests "
+                                f"compared to baseline{failing}", red=bool(found))
+    for regression in found[:10]:
+        terminalreporter.write_line(f"  {regression['nodeid']}: {regression['duration']:.3f}s, "
+                                    f"baseline median {regression['median']:.3f}s, "
+                                    f"score {regression['score']}", red=True)
+
+
+def write_stats(terminalreporter, stats, wall_time: float = None, path: str = None):
+    """
+    Write plugin self-instrumentation stats
+    :param terminalreporter: pytest TerminalReporter
+    :param stats: Stats
+    :param wall_time: seconds since session start or None
+    :param path: file where stats are written at exit or None
+    :return: None
+    """
+    summary = stats.summary()
+    terminalreporter.write_sep("-", "opentmi stats")
+    hook_time = stats.hook_time
+    if wall_time and not stats.merged:
+        terminalreporter.write_line(f"opentmi: {hook_time:.3f}s spent in plugin hooks, "
+                                    f"{hook_time * 100 / wall_time:.1f}% of {wall_time:.2f}s session")
+    else:
+        terminalreporter.write_line(f"opentmi: {hook_time:.3f}s spent in plugin hooks")
+    for name, timing in sorted(summary['timings'].items(), key=lambda item: -item[1]['total']):
+        terminalreporter.write_line(f"  {name}: {timing['calls']} calls, {timing['total']:.3f}s, "
+                                    f"{timing['mean'] * 1000:.3f}ms per call, "
+                                    f"max {timing['max'] * 1000:.1f}ms")
+    for endpoint, request in sorted(summary['requests'].items()):
+        terminalreporter.write_line(f"  {endpoint}: {request['count']} requests, "
+                                    f"p50 {request['p50'] * 1000:.1f}ms, p95 {request['p95'] * 1000:.1f}ms, "
+                                    f"p99 {request['p99'] * 1000:.1f}ms, {request['failed']} failed, "
+                                    f"{request['retries']} retries")
+    depth = max((node['max'] for node in summary['queue_depth'].values()), default=0)
+    encoding = summary['encoding']
+    terminalreporter.write_line(f"opentmi: {summary['bytes_on_wire']} bytes on wire, "
+                                f"{encoding['bytes']} bytes encoded in {encoding['time'] * 1000:.1f}ms, "
+                                f"{summary['retries']} retries, max upload queue depth {depth}")
+    if path:
+        terminalreporter.write_line(f"opentmi: stats are written to {path} at exit")
@@ -0,0 +1,133 @@
+"""
+Testcase sync module
+"""
+import inspect
+import threading
+from multiprocessing.dummy import Pool as ThreadPool
+
+from . import documents
+from .record import tcid_of
+
+
+# pylint: disable=too-many-instance-attributes
+class TestcaseSync:
+    """
+    TestcaseSync class.
+    Testcase documents of collected tests are precomputed at collection and synced
+    in background while tests are running. Testcases which may change by the time
+    results are known are synced only with results.
+    """
+
+    __test__ = False  # not a test class for pytest collection
+
+    # tests which may be skipped, their testcases are synced only with results so that
+    # the same document, with or without skip fields, is sent at most once per session
+    SKIP_MARKERS = ('skip', 'skipif', 'xfail')
+
+    def __init__(self, cache, update, login, workers: int = 1):
+        """
+        Constructor
+        :param cache: TestcaseCache
+        :param update: callable(document) which syncs testcase document and returns True if it is synced
+        :param login: BackgroundLogin
+        :param workers: count of concurrent uploads
+        """
+        self._cache = cache
+        self._update = update
+        self._login = login
+        self._workers = workers
+        self._descriptions = {}  # docstrings by test function nodeid
+        self.testcases = {}  # testcase documents precomputed at collection by tcid
+        self._late = set()  # tcids not synced at collection, see precompute
+        self._thread = None
+        self._unsynced = []
+
+    def describe(self, item):
+        """
+        Docstring of test, shared by all parametrizations of test function
+        :param item: test item
+        :return: str or None
+        """
+        function = item.nodeid.split('[')[0]
+        if function not in self._descriptions:
+            self._descriptions[function] = inspect.getdoc(item.obj)
+        return self._descriptions[function]
+
+    def document(self, record) -> dict:
+        """
+        Create testcase document from record, uses document precomputed at collection when available
+        :param record: TestRecord
+        :return: dict
+        """
+        document = self.testcases.get(record.tcid)
+        if document is None:
+            document = documents.testcase_document(record.tcid, record.description, record.keywords)
+        if record.skipped:
+            skip = dict(value=True)
+            if record.skip_reason:
+                skip['reason'] = record.skip_reason
+            document = dict(document, execution=dict(skip=skip))
+        return document
+
+    def precompute(self, items: list):
+        """
+        Create testcase documents of collected tests. Testcases of tests with skip markers and
+        testcases synced earlier with other document, e.g. with skip fields of a test skipped at runtime,
+        are synced only with results, when their final document is known
+        :param items: collected test items
+        :return: None
+        """
+        for item in items:
+            tcid = tcid_of(item)
+            document = documents.testcase_document(tcid, self.describe(item), list(item.keywords))
+            self.testcases[tcid] = document
+            if any(marker in item.keywords for marker in TestcaseSync.SKIP_MARKERS) or \
+                    self._cache.changed(document):
+                self._late.add(tcid)
+
+    def early(self) -> list:
+        """
+        Testcase documents which are synced at collection
+        :return: list of dict
+        """
+        return [document for tcid, document in self.testcases.items() if tcid not in self._late]
+
+    def start(self):
+        """
+        Sync testcase documents of collected tests in background once logged in
+        :return: None
+        """
+        testcases = self.early()
+
+        def sync():
+            if not self._login.wait(retry=False):
+                self._unsynced = testcases
+                return
+            pool = ThreadPool(self._workers)
+            synced = pool.map(self._update, testcases)
+            pool.close()
+            pool.join()
+            self._unsynced = [document for document, ok in zip(testcases, synced) if not ok]
+        self._thread = threading.Thread(target=sync, name='opentmi-testcases', daemon=True)
+        self._thread.start()
+
+    def wait(self) -> list:
+        """
+        Wait for background testcase sync
+        :return: list of documents which were not synced
+        """
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        unsynced, self._unsynced = self._unsynced, []
+        return unsynced
+
+    def pending(self, results: list) -> list:
+        """
+        Finished records with unique tcid, latest record wins.
+        Testcases synced at collection are updated only for skipped tests.
+        :param results: list of TestRecord
+        :return: list of TestRecord
+        """
+        return [record for record in {record.tcid: record for record in results}.values()
+                if record.skipped or record.tcid not in self.testcases or record.tcid in self._late]
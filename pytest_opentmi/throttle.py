@@ -0,0 +1,147 @@
+"""
+Upload throttling module: adaptive concurrency limiter and circuit breaker
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# pylint: disable=too-many-instance-attributes
+class AdaptiveLimiter:
+    """
+    AIMD (additive increase, multiplicative decrease) concurrency limiter.
+    Limit grows by one per limit worth of fast successful requests and is cut
+    by decrease factor when server signals overload (429/5xx, timeouts) or
+    latency exceeds the target.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, max_limit: int, min_limit: int = 1, initial: int = None,
+                 decrease: float = 0.5, latency_target: float = 2.0):
+        """
+        Constructor
+        :param max_limit: maximum number of concurrent requests
+        :param min_limit: minimum number of concurrent requests
+        :param initial: initial limit, defaults to max_limit
+        :param decrease: multiplicative decrease factor
+        :param latency_target: latency in seconds considered as congestion
+        """
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self._limit = float(initial or self.max_limit)
+        self._decrease = decrease
+        self._latency_target = latency_target
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self.lowest = self.limit
+
+    @property
+    def limit(self) -> int:
+        """
+        Current concurrency limit
+        :return: int
+        """
+        return max(self.min_limit, int(self._limit))
+
+    def acquire(self):
+        """
+        Wait until request is allowed by current limit
+        :return: None
+        """
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, latency: float, overloaded: bool = False):
+        """
+        Finish request and adjust limit
+        :param latency: request latency in seconds
+        :param overloaded: True if server signalled overload
+        :return: None
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded or latency > self._latency_target:
+                self._limit = max(self.min_limit, self._limit * self._decrease)
+                self.lowest = min(self.lowest, self.limit)
+                logger.debug(f'Upload concurrency decreased to {self.limit}')
+            else:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker which opens after sustained consecutive failures.
+    When open, requests are rejected until cooldown is passed,
+    then a single probe request is let through (half-open state).
+    """
+
+    def __init__(self, threshold: int = 10, cooldown: float = 30):
+        """
+        Constructor
+        :param threshold: consecutive failures which opens the circuit, 0 disables breaker
+        :param cooldown: seconds until probe request is allowed when open
+        """
+        self._threshold = threshold
+        self._cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self.trips = 0
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Check if circuit is open, i.e. requests are rejected
+        :return: bool
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            return self._probing or time.monotonic() - self._opened_at < self._cooldown
+
+    def allow(self) -> bool:
+        """
+        Check if request is allowed
+        :return: True if request can be sent
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self._cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def success(self):
+        """
+        Record successful request, closes the circuit
+        :return: None
+        """
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info('Upload circuit breaker closed')
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def failure(self):
+        """
+        Record failed request
+        :return: None
+        """
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                # probe failed, stay open for another cooldown
+                self._probing = False
+                self._opened_at = time.monotonic()
+            elif self._threshold and self._opened_at is None and self._failures >= self._threshold:
+                self._opened_at = time.monotonic()
+                self.trips += 1
+                logger.error(f'Upload circuit breaker opened after {self._failures} consecutive failures')
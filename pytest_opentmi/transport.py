@@ -0,0 +1,313 @@
+"""
+Transport module
+"""
+import json
+import logging
+import random
+import re
+import threading
+import time
+from urllib.parse import urlencode, urlparse
+
+# 3rd party modules
+from requests import RequestException
+from opentmi_client.transport import Transport
+from opentmi_client.transport.HttpAdapter import TimeoutHTTPAdapter
+from opentmi_client.utils import TransportException, resolve_host
+# app modules
+from . import serialize
+from .throttle import AdaptiveLimiter, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# status codes which are worth to retry
+RETRYABLE_CODES = (429, 500, 502, 503, 504)
+# document ids in url paths, replaced to group requests by endpoint
+ID_PATTERN = re.compile(r'/(?:[0-9a-f]{24}|\d+)(?=/|$)')
+
+
+class CircuitOpenError(TransportException):
+    """
+    Request not sent because circuit breaker is open
+    """
+
+
+# pylint: disable=too-many-instance-attributes
+class UploadTransport(Transport):
+    """
+    Transport used for uploads.
+    Shares one keep-alive connection pool sized by number of upload workers,
+    retries retryable errors with exponential backoff and jitter,
+    adapts concurrency to server health, stops sending when circuit breaker opens
+    and counts issued requests and sent payload bytes.
+    JSON bodies are encoded once, also for retries, and gzip compressed above threshold.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, host="127.0.0.1", port=None, token=None, workers: int = 10,
+                 timeout: float = 30, retries: int = 3, backoff: float = 0.5, backoff_max: float = 10,
+                 breaker_threshold: int = 10, breaker_cooldown: float = 30, stats=None,
+                 gzip_threshold: int = 0):
+        """
+        Constructor
+        :param host: opentmi host
+        :param port: optional port
+        :param token: optional access token
+        :param workers: number of concurrent upload workers, used as connection pool size
+        :param timeout: per request timeout in seconds
+        :param retries: maximum number of retries per request
+        :param backoff: base delay in seconds for exponential backoff
+        :param backoff_max: maximum delay in seconds between retries
+        :param breaker_threshold: consecutive failures which opens circuit breaker, 0 disables
+        :param breaker_cooldown: seconds until probe request is sent when circuit is open
+        :param stats: optional Stats which records request latencies
+        :param gzip_threshold: bodies larger than this many bytes are gzip compressed, 0 disables
+        """
+        self._lock = threading.Lock()
+        self._workers = max(1, workers)
+        self._timeout = timeout
+        self._retries = max(0, retries)
+        self._backoff = backoff
+        self._backoff_max = backoff_max
+        self.requests = 0
+        self.bytes_sent = 0  # on wire, after compression
+        self.bytes_encoded = 0
+        self.encode_time = 0.0
+        self.retries = 0
+        self.gzip_threshold = gzip_threshold
+        self.stats = stats
+        self.limiter = AdaptiveLimiter(self._workers, latency_target=max(1.0, timeout / 4))
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        super().__init__(host, port, token)
+
+    def set_host(self, host, port=None):
+        """
+        Set host address and port
+        :param host: opentmi host
+        :param port: optional port
+        :return: None
+        """
+        super().set_host(host, port)
+        # replace default adapter: retries are handled by this class
+        adapter = TimeoutHTTPAdapter(timeout=self._timeout, max_retries=0,
+                                     pool_connections=1, pool_maxsize=self._workers)
+        self._session.mount(resolve_host(host, port), adapter)
+
+    def encode(self, payload) -> bytes:
+        """
+        Encode JSON payload, encoding time and size are counted
+        :param payload: dict or list
+        :return: bytes
+        """
+        start = time.perf_counter()
+        data = serialize.dumps(payload)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.bytes_encoded += len(data)
+            self.encode_time += elapsed
+        if self.stats:
+            self.stats.add_encoding(elapsed, len(data))
+        return data
+
+    def _count(self, payload=None) -> int:
+        if payload is None:
+            size = 0
+        elif isinstance(payload, bytes):
+            size = len(payload)
+        else:
+            size = len(json.dumps(payload).encode('utf-8'))
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += size
+        return size
+
+    @staticmethod
+    def endpoint(func, url) -> str:
+        """
+        Request method and url path without document ids, e.g. 'PUT /api/v0/testcases/:id'
+        :param func: request function, e.g. get_json
+        :param url: url as a string
+        :return: str
+        """
+        method = func.__name__.strip('_').split('_')[0].upper()
+        return f"{method} {ID_PATTERN.sub('/:id', urlparse(url).path)}"
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Exponential backoff with full jitter
+        :param attempt: retry attempt, starting from 0
+        :return: delay in seconds
+        """
+        return random.uniform(0, min(self._backoff_max, self._backoff * 2 ** attempt))
+
+    @staticmethod
+    def is_retryable(error: TransportException) -> bool:
+        """
+        Check if failed request is worth to retry
+        :param error: TransportException
+        :return: True for connection errors, timeouts and retryable status codes
+        """
+        if error.code in RETRYABLE_CODES:
+            return True
+        return error.code is None and isinstance(error.__context__, RequestException)
+
+    def _call(self, func, url, payload=None, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f'Circuit breaker is open, {url} not requested')
+        size = self._count(payload)
+        self.limiter.acquire()
+        start = time.monotonic()
+        try:
+            if payload is None:
+                response = func(url, **kwargs)
+            else:
+                response = func(url, payload, **kwargs)
+        except TransportException as error:
+            retryable = UploadTransport.is_retryable(error)
+            elapsed = time.monotonic() - start
+            self.limiter.release(elapsed, overloaded=retryable)
+            if self.stats:
+                self.stats.add_request(UploadTransport.endpoint(func, url), elapsed, size, failed=True)
+            if retryable:
+                self.breaker.failure()
+            else:
+                # server is responsive
+                self.breaker.success()
+            raise
+        elapsed = time.monotonic() - start
+        self.limiter.release(elapsed)
+        if self.stats:
+            self.stats.add_request(UploadTransport.endpoint(func, url), elapsed, size)
+        self.breaker.success()
+        return response
+
+    def _request(self, func, url, payload=None, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return self._call(func, url, payload, **kwargs)
+            except CircuitOpenError:
+                raise
+            except TransportException as error:
+                if attempt >= self._retries or not UploadTransport.is_retryable(error) \
+                        or self.breaker.is_open:
+                    raise
+                delay = self.backoff_delay(attempt)
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                if self.stats:
+                    self.stats.add_retry(UploadTransport.endpoint(func, url))
+                logger.debug(f'Retrying {url} in {delay:.2f}s ({attempt}/{self._retries}): {error.code}')
+                time.sleep(delay)
+
+    def get_json(self, url, params=None):
+        """
+        GET request
+        :param url: url as a string
+        :param params: url parameters as dict
+        :return: response as dict
+        """
+        return self._request(super().get_json, url, params=params)
+
+    def _send(self, method: str, url: str, body: bytes):
+        """
+        Send encoded JSON body, errors are handled like in opentmi_client Transport
+        :param method: 'POST' or 'PUT'
+        :param url: url as a string
+        :param body: body from serialize.compress()
+        :return: response as dict
+        """
+        headers = {'Content-Type': 'application/json'}
+        if serialize.is_compressed(body):
+            headers['Content-Encoding'] = 'gzip'
+        try:
+            response = self._session.request(method, url, data=body, headers=headers)
+            if Transport.is_success(response):
+                return response.json()
+            logger.warning(f'status_code: {response.status_code}')
+            raise TransportException(response.text, response.status_code)
+        except RequestException as error:
+            logger.warning(error)
+            raise TransportException(str(error)) from error
+        except ValueError as error:
+            raise TransportException(str(error)) from error
+
+    def _post(self, url, body):
+        return self._send('POST', url, body)
+
+    def _put(self, url, body):
+        return self._send('PUT', url, body)
+
+    def post_json(self, url, payload, files=None):
+        """
+        POST request
+        :param url: url as a string
+        :param payload: dict or list
+        :param files: optional files
+        :return: response as dict
+        """
+        if files:
+            return self._request(super().post_json, url, payload, files=files)
+        return self.post_encoded(url, self.encode(payload))
+
+    def post_encoded(self, url, data: bytes):
+        """
+        POST request with already encoded JSON payload
+        :param url: url as a string
+        :param data: bytes from encode()
+        :return: response as dict
+        """
+        return self._request(self._post, url, serialize.compress(data, self.gzip_threshold))
+
+    def put_json(self, url, payload):
+        """
+        PUT request
+        :param url: url as a string
+        :param payload: dict
+        :return: response as dict
+        """
+        return self._request(self._put, url, serialize.compress(self.encode(payload), self.gzip_threshold))
+
+    def post_result_data(self, data: dict):
+        """
+        Post plain result document
+        :param data: result document
+        :raise TransportException: when upload fails
+        :return: stored document as dict
+        """
+        return self.post_json(self.get_url('/api/v0/results'), data)
+
+    # pylint: disable=too-many-arguments
+    def find_results(self, query: dict, fields: str = None, sort: dict = None, limit: int = None):
+        """
+        Query result documents
+        :param query: mongodb query, e.g. {'tcid': {'$in': ['a', 'b']}}
+        :param fields: space separated fields to be returned
+        :param sort: sort order, e.g. {'cre.time': -1}
+        :param limit: maximum number of documents
+        :raise TransportException: when query fails
+        :return: list of result documents
+        """
+        params = dict(q=json.dumps(query))
+        if fields:
+            params['f'] = fields
+        if sort:
+            params['s'] = json.dumps(sort)
+        if limit:
+            params['l'] = limit
+        # query string is encoded here, opentmi client would encode parameter values twice
+        return self.get_json(f"{self.get_url('/api/v0/results')}?{urlencode(params)}")
+
+    def upsert_testcase(self, data: dict):
+        """
+        Create or update testcase document by tcid
+        :param data: testcase document
+        :raise TransportException: when upload fails
+        :return: stored document as dict
+        """
+        url = self.get_url('/api/v0/testcases')
+        docs = self.get_json(url, params={'tcid': data['tcid']})
+        if docs and len(docs) == 1:
+            return self.put_json(f"{url}/{docs[0]['_id']}", data)
+        return self.post_json(url, data)
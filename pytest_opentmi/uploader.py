@@ -0,0 +1,84 @@
+"""
+Background uploader module
+"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class StreamUploader:
+    """
+    StreamUploader class.
+    Upload jobs are pushed to a bounded queue and consumed by background
+    worker threads, so uploading overlaps test execution.
+    When the queue is full, put() blocks until workers catch up.
+    """
+
+    def __init__(self, workers: int = 4, maxsize: int = 1000):
+        """
+        Constructor
+        :param workers: number of worker threads
+        :param maxsize: maximum number of queued upload jobs
+        """
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._threads = []
+        self._workers = max(1, workers)
+        self._lock = threading.Lock()
+        self.processed = 0
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of queued upload jobs not yet picked by workers
+        :return: int
+        """
+        return self._queue.qsize()
+
+    def start(self):
+        """
+        Start worker threads
+        :return: StreamUploader
+        """
+        for index in range(self._workers):
+            thread = threading.Thread(target=self._run, name=f'opentmi-uploader-{index}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def put(self, func, *args):
+        """
+        Queue upload job, blocks if queue is full
+        :param func: callable to be called in worker thread
+        :param args: arguments for callable
+        :return: None
+        """
+        self._queue.put((func, args))
+
+    def close(self):
+        """
+        Wait until all queued jobs are processed and stop workers
+        :return: None
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                func, args = job
+                func(*args)
+            except Exception as error:  # pylint: disable=broad-except
+                logger.error(f'Upload job failed: {error}')
+            finally:
+                if job is not None:
+                    with self._lock:
+                        self.processed += 1
+                self._queue.task_done()
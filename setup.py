@@ -18,9 +18,11 @@ setup(
     url="https://github.com/opentmi/pytest-opentmi",
     packages=["pytest_opentmi"],
     # package_data={"pytest_opentmi": ["resources/*"]},
-    entry_points={"pytest11": ["pytest_opentmi = pytest_opentmi.plugin"]},
+    entry_points={"pytest11": ["pytest_opentmi = pytest_opentmi.plugin"],
+                  "console_scripts": ["opentmi-upload = pytest_opentmi.cli:main"]},
     setup_requires=["setuptools_scm"],
-    install_requires=["pytest>=5.0", "pytest-metadata", "opentmi-client>=0.10.1", "joblib"],
+    install_requires=["pytest>=5.0", "pytest-metadata", "opentmi-client>=0.10.1", "joblib",
+                      "importlib_metadata; python_version < '3.8'"],
     # List additional groups of dependencies here (e.g. development
     # dependencies). Users will be able to install these using the "extras"
     # syntax, for example:
@@ -30,7 +32,8 @@ setup(
     # Similar to `install_requires` above, these must be valid existing
     # projects.
     extras_require={  # Optional
-        'dev': ['coverage', 'coveralls', 'mock', 'pylint==2.15.10', 'pynose', 'pyinstaller']
+        'dev': ['coverage', 'coveralls', 'mock', 'pylint==2.15.10', 'pynose', 'pyinstaller'],
+        'fast': ['orjson']
     },
     license="Mozilla Public License 2.0 (MPL 2.0)",
     keywords="py.test pytest opentmi report",
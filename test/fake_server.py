@@ -0,0 +1,125 @@
+"""
+In-process stand-in for opentmi server used by tests and benchmarks
+"""
+import gzip
+import itertools
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenTmiHandler(BaseHTTPRequestHandler):
+    """
+    Minimal opentmi REST API: login, testcases and results
+    """
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def _reply(self, code, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.record(self.command, self.path, len(raw))
+        if self.headers.get('Content-Encoding') == 'gzip':
+            raw = gzip.decompress(raw)
+        return json.loads(raw) if raw else None
+
+    def _handle(self):
+        body = self._read()
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        status = server.next_status()
+        if status:
+            return self._reply(status, {'error': 'fake error'})
+        if self.path.startswith('/auth/'):
+            return self._reply(200, {'token': 'fake-token'})
+        if self.command == 'GET':
+            return self._reply(200, server.get(self.path))
+        if isinstance(body, list):
+            if not server.bulk:
+                return self._reply(400, {'error': 'bulk not supported'})
+            return self._reply(200, [server.store(self.path, item) for item in body])
+        return self._reply(200, server.store(self.path, body))
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+
+
+# pylint: disable=too-many-instance-attributes
+class FakeOpenTmiServer(ThreadingHTTPServer):
+    """
+    Fake opentmi server running in a background thread.
+    :param latency: delay in seconds for each response
+    :param error_rate: probability of 503 response
+    :param bulk: accept list payloads
+    """
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0, error_rate: float = 0, bulk: bool = False):
+        super().__init__(('127.0.0.1', 0), FakeOpenTmiHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.bulk = bulk
+        self.fail_next = []  # status codes for next responses
+        self.requests = []
+        self.bytes_received = 0
+        self.documents = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._random = random.Random(0)
+        self._thread = None
+
+    @property
+    def url(self):
+        """ server base url """
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def record(self, method, path, size):
+        """ record received request """
+        with self._lock:
+            self.requests.append((method, path))
+            self.bytes_received += size
+
+    def next_status(self):
+        """ error status for next response or None """
+        with self._lock:
+            if self.fail_next:
+                return self.fail_next.pop(0)
+            if self.error_rate and self._random.random() < self.error_rate:
+                return 503
+        return None
+
+    def store(self, path, document):
+        """ store document and return it with _id, and id like opentmi responds """
+        with self._lock:
+            document = dict(document or {}, _id=str(next(self._ids)))
+            self.documents.setdefault(path.split('?')[0], []).append(document)
+        return dict(document, id=document['_id'])
+
+    def get(self, path):  # pylint: disable=unused-argument
+        """ lookup documents, nothing is found """
+        return []
+
+    def start(self):
+        """ start serving in background thread """
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ stop server """
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,89 @@
+# pylint: disable=missing-docstring
+
+import json
+import unittest
+from pytest_opentmi.aggregate import Aggregator
+from pytest_opentmi.record import TestRecord
+
+
+def record(nodeid, verdict, duration=0.5):
+    test = TestRecord(nodeid, nodeid.split('::')[-1].rstrip(']'), duration=duration, keywords=['smoke', ''])
+    test.verdict = verdict
+    return test
+
+
+class TestAggregator(unittest.TestCase):
+
+    def test_failures_are_kept(self):
+        aggregator = Aggregator('aggregate')
+        for verdict in ('fail', 'error', 'inconclusive'):
+            self.assertTrue(aggregator.keep(record('test_a.py::test_a[1]', verdict)))
+        self.assertFalse(aggregator.keep(record('test_a.py::test_a[1]', 'pass')))
+        self.assertEqual(aggregator.totals(), dict(policy='aggregate', rate=0.0, functions=1,
+                                                   passed=1, skipped=0, sampled=0))
+
+    def test_records(self):
+        aggregator = Aggregator('aggregate')
+        for index, duration in enumerate((0.0005, 0.05, 2.0)):
+            aggregator.keep(record(f'test_a.py::test_a[{index}]', 'pass', duration))
+        aggregator.keep(record('test_a.py::test_a[3]', 'skip', 0.0))
+        skip = record('test_a.py::test_b', 'skip', 0.0)
+        skip.skip_reason = 'not supported'
+        aggregator.keep(skip)
+        passed, skipped = aggregator.records()
+        self.assertEqual((passed.nodeid, passed.tcid), ('test_a.py::test_a', 'test_a'))
+        self.assertEqual(passed.verdict, 'pass')
+        self.assertEqual(passed.keywords, ['smoke'])
+        aggregate = passed.profiling['aggregate']
+        self.assertEqual((aggregate['count'], aggregate['passed'], aggregate['skipped']), (4, 3, 1))
+        self.assertEqual(aggregate['duration']['min'], 0.0)
+        self.assertEqual(aggregate['duration']['max'], 2.0)
+        self.assertAlmostEqual(aggregate['duration']['mean'], 2.0505 / 4)
+        self.assertEqual(aggregate['duration']['histogram'], [2, 0, 1, 0, 1, 0, 0])
+        self.assertEqual((skipped.verdict, skipped.skipped, skipped.skip_reason), ('skip', True, 'not supported'))
+
+    def test_sample(self):
+        aggregator = Aggregator('sample', rate=0.1)
+        nodeids = [f'test_a.py::test_a[{index}]' for index in range(1000)]
+        kept = [nodeid for nodeid in nodeids if aggregator.keep(record(nodeid, 'pass'))]
+        self.assertLess(abs(len(kept) - 100), 30)
+        self.assertEqual(aggregator.totals()['sampled'], len(kept))
+        # same tests are sampled in every run
+        self.assertEqual(kept, [nodeid for nodeid in nodeids if Aggregator('sample', rate=0.1).sampled(nodeid)])
+        self.assertFalse(any(Aggregator('aggregate', rate=0.1).sampled(nodeid) for nodeid in nodeids))
+
+    def test_in_full(self):
+        aggregator = Aggregator('aggregate')
+        self.assertTrue(aggregator.keep(record('test_a.py::test_a[1]', 'pass'), in_full=True))
+        self.assertFalse(aggregator.keep(record('test_a.py::test_a[2]', 'pass')))
+        self.assertEqual(aggregator.totals()['sampled'], 1)
+        self.assertIn('1 uploaded in full', aggregator.records()[0].note)
+
+    def test_single_case_in_full(self):
+        aggregator = Aggregator('aggregate')
+        self.assertTrue(aggregator.keep(record('test_a.py::test_flaky', 'pass'), in_full=True))
+        self.assertFalse(aggregator.keep(record('test_a.py::test_b', 'pass')))
+        # results of test_flaky are not counted again in an aggregate with the same tcid
+        self.assertEqual([result.tcid for result in aggregator.records()], ['test_b'])
+        self.assertEqual(aggregator.totals()['functions'], 1)
+
+    def test_common_keywords(self):
+        first, second = Aggregator(), Aggregator()
+        for aggregator, index in ((first, 1), (second, 2), (second, 3)):
+            test = record(f'test_a.py::test_a[{index}]', 'pass')
+            test.keywords = [f'test_a[{index}]', 'smoke', str(index), 'test_a.py']
+            aggregator.keep(test)
+        self.assertEqual(second.functions['test_a']['keywords'], ['smoke', 'test_a.py'])
+        first.merge(json.loads(json.dumps(second.functions)))
+        self.assertEqual(first.records()[0].keywords, ['smoke', 'test_a.py'])
+
+    def test_merge(self):
+        first, second = Aggregator(), Aggregator()
+        first.keep(record('test_a.py::test_a[1]', 'pass', 1.0))
+        second.keep(record('test_a.py::test_a[2]', 'pass', 3.0))
+        second.keep(record('test_a.py::test_b', 'skip'))
+        first.merge(json.loads(json.dumps(second.functions)))
+        self.assertEqual(first.totals()['functions'], 2)
+        aggregate = first.records()[0].profiling['aggregate']
+        self.assertEqual(aggregate['count'], 2)
+        self.assertEqual((aggregate['duration']['min'], aggregate['duration']['max']), (1.0, 3.0))
@@ -0,0 +1,67 @@
+# pylint: disable=missing-docstring
+
+import json
+import unittest
+from opentmi_client.utils import TransportException
+from pytest_opentmi.batch import BatchUploader
+from pytest_opentmi.serialize import dumps
+
+
+class MockTransport:
+    def __init__(self, bulk=True):
+        self.bulk = bulk
+        self.requests = []
+        self.encoded = 0
+
+    def encode(self, payload):
+        self.encoded += 1
+        return dumps(payload)
+
+    def post_encoded(self, url, data):
+        payload = json.loads(data)
+        self.requests.append(payload)
+        if isinstance(payload, list):
+            if not self.bulk:
+                raise TransportException('not supported', 400)
+            return [{'id': str(index)} for index in range(len(payload))]
+        return {'id': '1'}
+
+
+class TestBatchUploader(unittest.TestCase):
+
+    def test_split_by_count(self):
+        uploader = BatchUploader(MockTransport(), 'url', max_count=2)
+        batches = list(uploader.split([{'a': i} for i in range(5)]))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+    def test_split_by_bytes(self):
+        uploader = BatchUploader(MockTransport(), 'url', max_count=100, max_bytes=20)
+        batches = list(uploader.split([{'a': 'x' * 5} for _ in range(3)]))
+        # each item is 12 bytes serialized
+        self.assertEqual([len(batch) for batch in batches], [1, 1, 1])
+
+    def test_bulk_upload(self):
+        transport = MockTransport()
+        uploader = BatchUploader(transport, 'url', max_count=10)
+        self.assertEqual(uploader.upload([{'a': i} for i in range(25)]), (25, 0))
+        self.assertEqual(len(transport.requests), 3)
+        self.assertTrue(uploader.bulk_supported)
+
+    def test_unserializable_item(self):
+        transport = MockTransport()
+        failed = []
+        uploader = BatchUploader(transport, 'url', max_count=10, on_failed=failed.append)
+        payloads = [{'a': 0}, {'a': object()}, {'a': 2}]
+        self.assertEqual(uploader.upload(payloads), (2, 1))
+        self.assertEqual(transport.requests, [[{'a': 0}, {'a': 2}]])
+        self.assertEqual(failed, [payloads[1]])
+
+    def test_fallback_per_item(self):
+        transport = MockTransport(bulk=False)
+        uploader = BatchUploader(transport, 'url', max_count=10)
+        self.assertEqual(uploader.upload([{'a': i} for i in range(15)]), (15, 0))
+        # one rejected bulk request, rest per item
+        self.assertEqual(len(transport.requests), 16)
+        self.assertFalse(uploader.bulk_supported)
+        # payloads are encoded once, also when posted again one by one
+        self.assertEqual(transport.encoded, 15)
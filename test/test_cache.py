@@ -0,0 +1,103 @@
+# pylint: disable=missing-docstring
+
+import unittest
+from pytest_opentmi.cache import TestcaseCache, TokenCache
+
+
+class MockCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key, default):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+class TestTestcaseCache(unittest.TestCase):
+
+    def test_deduplicate_in_session(self):
+        cache = TestcaseCache()
+        test = {'tcid': 'a', 'other_info': {'type': 'smoke'}}
+        self.assertTrue(cache.claim(test))
+        self.assertFalse(cache.claim(dict(test)))
+        cache.confirm(test)
+        self.assertFalse(cache.claim(dict(test)))
+        self.assertEqual(cache.skipped, 2)
+
+    def test_changed(self):
+        cache = TestcaseCache()
+        test = {'tcid': 'a'}
+        self.assertFalse(cache.changed(test))
+        cache.claim(test)
+        cache.confirm(test)
+        self.assertFalse(cache.changed(dict(test)))
+        self.assertTrue(cache.changed(dict(test, execution={'skip': {'value': True}})))
+
+    def test_changed_document(self):
+        cache = TestcaseCache()
+        self.assertTrue(cache.claim({'tcid': 'a'}))
+        cache.confirm({'tcid': 'a'})
+        self.assertTrue(cache.claim({'tcid': 'a', 'other_info': {'type': 'smoke'}}))
+
+    def test_release_failed(self):
+        cache = TestcaseCache()
+        self.assertTrue(cache.claim({'tcid': 'a'}))
+        cache.release({'tcid': 'a'})
+        self.assertTrue(cache.claim({'tcid': 'a'}))
+
+    def test_persist_across_sessions(self):
+        storage = MockCache()
+        cache = TestcaseCache(storage, 'https://localhost')
+        cache.claim({'tcid': 'a'})
+        cache.confirm({'tcid': 'a'})
+        cache.save()
+        self.assertFalse(TestcaseCache(storage, 'https://localhost').claim({'tcid': 'a'}))
+        self.assertTrue(TestcaseCache(storage, 'https://otherhost').claim({'tcid': 'a'}))
+
+    def test_merge_worker_hashes(self):
+        storage = MockCache()
+        storage.set(TestcaseCache(storage, 'https://localhost')._key, {'old': 'x'})  # pylint: disable=protected-access
+        worker = TestcaseCache(storage, 'https://localhost')
+        worker.claim({'tcid': 'a'})
+        worker.confirm({'tcid': 'a'})
+        worker.claim({'tcid': 'b'})
+        self.assertEqual(list(worker.confirmed), ['a'])
+        controller = TestcaseCache(storage, 'https://localhost')
+        controller.merge(worker.confirmed)
+        controller.save()
+        controller = TestcaseCache(storage, 'https://localhost')
+        self.assertFalse(controller.claim({'tcid': 'a'}))
+        self.assertTrue(controller.claim({'tcid': 'b'}))
+        self.assertIn('old', storage.values[controller._key])  # pylint: disable=protected-access
+
+
+class TestTokenCache(unittest.TestCase):
+
+    def test_reuse_in_same_job(self):
+        storage = MockCache()
+        TokenCache(storage, 'https://localhost', environ={'BUILD_TAG': 'job-1'}).set('secret', 'jwt')
+        self.assertEqual(TokenCache(storage, 'https://localhost', environ={'BUILD_TAG': 'job-1'}).get('secret'),
+                         'jwt')
+        self.assertNotIn('secret', str(storage.values))
+        self.assertIsNone(TokenCache(storage, 'https://localhost', environ={'BUILD_TAG': 'job-2'}).get('secret'))
+        self.assertIsNone(TokenCache(storage, 'https://localhost', environ={'BUILD_TAG': 'job-1'}).get('other'))
+        self.assertIsNone(TokenCache(storage, 'https://otherhost', environ={'BUILD_TAG': 'job-1'}).get('secret'))
+
+    def test_expired_and_cleared(self):
+        storage = MockCache()
+        cache = TokenCache(storage, 'https://localhost', ttl=-1, environ={'CI_JOB_ID': '1'})
+        cache.set('secret', 'jwt')
+        self.assertIsNone(cache.get('secret'))
+        cache = TokenCache(storage, 'https://localhost', environ={'CI_JOB_ID': '1'})
+        cache.set('secret', 'jwt')
+        cache.clear()
+        self.assertIsNone(cache.get('secret'))
+
+    def test_disabled_outside_ci(self):
+        storage = MockCache()
+        cache = TokenCache(storage, 'https://localhost', environ={})
+        cache.set('secret', 'jwt')
+        self.assertIsNone(cache.get('secret'))
+        self.assertEqual(storage.values, {})
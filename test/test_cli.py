@@ -1,6 +1,17 @@
 # pylint: disable=missing-docstring
 
+import shutil
+import tempfile
+import threading
 import unittest
+import warnings
+from unittest import mock
+from pytest_opentmi.cli import get_parser, main
+from pytest_opentmi.cache import TestcaseCache
+from pytest_opentmi.detach import read_status, read_synced_testcases, spawn_uploader, status_path, \
+    upload_lock, wait, write_status
+from pytest_opentmi.spool import Spool
+from pytest_opentmi.transport import UploadTransport
 
 
 class TestCli(unittest.TestCase):
@@ -12,3 +23,88 @@ class TestCli(unittest.TestCase):
         Instead writing tests, I'll get one beer and go to sauna, sorry about buggy plugin.
         """
         pass
+
+
+class TestUploadCli(unittest.TestCase):
+
+    def test_parser(self):
+        args = get_parser().parse_args(['spool', '--host', 'http://localhost', '--workers', '3'])
+        self.assertEqual(args.directory, 'spool')
+        self.assertEqual(args.host, 'http://localhost')
+        self.assertEqual(args.workers, 3)
+
+    def test_missing_directory(self):
+        self.assertEqual(main(['/not/existing/directory']), 2)
+
+    def test_replay(self):
+        directory = tempfile.mkdtemp()
+        try:
+            spool = Spool(directory, host='http://localhost')
+            spool.append('testcase', {'tcid': 'a'})
+            spool.append('result', {'tcid': 'a'})
+            spool.close()
+            with mock.patch.object(UploadTransport, 'post_result_data') as post_result, \
+                    mock.patch.object(UploadTransport, 'upsert_testcase') as upsert_testcase:
+                self.assertEqual(main([directory]), 0)
+                post_result.assert_called_once_with({'tcid': 'a'})
+                upsert_testcase.assert_called_once_with({'tcid': 'a'})
+                self.assertEqual(read_synced_testcases(directory), {'a': TestcaseCache.digest({'tcid': 'a'})})
+                self.assertEqual(main([directory]), 0)
+                post_result.assert_called_once_with({'tcid': 'a'})
+        finally:
+            shutil.rmtree(directory)
+
+    def test_status(self):
+        directory = tempfile.mkdtemp()
+        try:
+            spool = Spool(directory, host='http://localhost')
+            spool.append('result', {'tcid': 'a'})
+            spool.close()
+            with mock.patch.object(UploadTransport, 'post_result_data'):
+                self.assertEqual(main([directory, '--status', status_path(directory)]), 0)
+            status = read_status(status_path(directory))
+            self.assertEqual((status['state'], status['uploaded'], status['failed']), ('done', 1, 0))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_replay_waits_for_lock(self):
+        directory = tempfile.mkdtemp()
+        try:
+            spool = Spool(directory, host='http://localhost')
+            spool.append('result', {'tcid': 'a'})
+            spool.close()
+            with mock.patch.object(UploadTransport, 'post_result_data') as post_result:
+                with upload_lock(directory):
+                    uploader = threading.Thread(target=main, args=([directory],))
+                    uploader.start()
+                    uploader.join(0.2)
+                    self.assertTrue(uploader.is_alive())
+                    post_result.assert_not_called()
+                uploader.join(10)
+                post_result.assert_called_once_with({'tcid': 'a'})
+        finally:
+            shutil.rmtree(directory)
+
+    def test_spawn_uploader(self):
+        directory = tempfile.mkdtemp()
+        try:
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertTrue(spawn_uploader(directory))
+            self.assertFalse([warning for warning in caught if issubclass(warning.category, ResourceWarning)])
+            self.assertEqual(wait(status_path(directory), timeout=30, interval=0.05)['state'], 'done')
+        finally:
+            shutil.rmtree(directory)
+
+    def test_wait(self):
+        directory = tempfile.mkdtemp()
+        try:
+            self.assertEqual(main([directory, '--wait']), 2)
+            write_status(status_path(directory), 'running')
+            self.assertEqual(main([directory, '--wait', '--timeout', '0']), 3)
+            write_status(status_path(directory), 'failed', failed=1)
+            self.assertEqual(main([directory, '--wait']), 1)
+            write_status(status_path(directory), 'done', uploaded=2)
+            self.assertEqual(main([directory, '--wait']), 0)
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,31 @@
+# pylint: disable=missing-docstring
+
+import subprocess
+import sys
+import unittest
+
+# plugin is imported by every pytest invocation, modules needed only with --opentmi are imported lazily
+HEAVY_MODULES = ('pkg_resources', 'opentmi_client', 'requests', 'pytest_opentmi.OpenTmiReport')
+
+
+def loaded_modules(code: str) -> str:
+    """
+    Run code in fresh interpreter
+    :return: comma separated heavy modules which are imported by code
+    """
+    code += f'; print(",".join(name for name in {HEAVY_MODULES!r} if name in sys.modules))'
+    process = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return process.stdout.strip()
+
+
+class TestImport(unittest.TestCase):
+
+    def test_plugin_import_is_light(self):
+        self.assertEqual(loaded_modules('import sys, pytest, pytest_opentmi.plugin'), '')
+
+    def test_configure_without_opentmi_is_light(self):
+        code = 'import sys, pytest, pytest_opentmi.plugin; ' \
+               'from _pytest.config import get_config; ' \
+               'config = get_config(); config.option.opentmi = None; ' \
+               'pytest_opentmi.plugin.pytest_configure(config)'
+        self.assertEqual(loaded_modules(code), '')
@@ -0,0 +1,43 @@
+# pylint: disable=missing-docstring
+
+import os
+import unittest
+from opentmi_client import Result
+from pytest_opentmi.logstore import LogStore, StoredLog
+
+
+class TestLogStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = LogStore(max_bytes=100)
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_store_and_load(self):
+        digest = self.store.store('hello\nwörld\n')
+        self.assertEqual(self.store.load(digest), 'hello\nwörld\n')
+        self.assertTrue(os.path.exists(os.path.join(self.store.directory, f'{digest}.gz')))
+
+    def test_deduplicate(self):
+        self.assertEqual(self.store.store('same'), self.store.store('same'))
+        self.assertEqual(self.store.stored, 1)
+        self.assertEqual(self.store.deduplicated, 1)
+
+    def test_keep_head_and_tail(self):
+        text = self.store.load(self.store.store('a' * 100 + 'b' * 100))
+        self.assertTrue(text.startswith('a' * 50))
+        self.assertTrue(text.endswith('b' * 50))
+        self.assertIn('[100 bytes truncated]', text)
+        self.assertEqual(self.store.truncated, 1)
+
+    def test_file_content_read_on_serialize(self):
+        result = Result(tcid='a')
+        result.execution.append_log(StoredLog(self.store, self.store.store('output'), 'stdout'))
+        self.assertEqual(result.data['exec']['logs'],
+                         [{'name': 'stdout', 'mime_type': 'txt', 'encoding': 'raw', 'data': 'output'}])
+
+    def test_close_removes_directory(self):
+        self.store.store('log')
+        self.store.close()
+        self.assertFalse(os.path.exists(self.store.directory))
@@ -0,0 +1,22 @@
+# pylint: disable=missing-docstring
+
+import unittest
+from pytest_opentmi.options import Options
+from .test_plugin import MockConfig
+
+
+class TestOptions(unittest.TestCase):
+
+    def test_defaults(self):
+        options = Options(MockConfig())
+        self.assertEqual(options.host, 'https://localhost')
+        self.assertEqual((options.detach_dir, options.spool_dir, options.stats), (None, None, False))
+
+    def test_detach(self):
+        options = Options(MockConfig(opentmi_detach=True))
+        self.assertEqual((options.detach_dir, options.spool_dir), (Options.DETACH_DIR, Options.DETACH_DIR))
+        options = Options(MockConfig(opentmi_detach_dir='handoff', opentmi_spool='spool'))
+        self.assertEqual((options.detach_dir, options.spool_dir), ('handoff', 'spool'))
+
+    def test_stats_file(self):
+        self.assertTrue(Options(MockConfig(opentmi_stats_file='stats.json')).stats)
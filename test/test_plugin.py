@@ -1,5 +1,18 @@
+import shutil
+import tempfile
 import unittest
+from _pytest.config.argparsing import Parser
+from opentmi_client import api
+from pytest_opentmi import documents
 from pytest_opentmi.OpenTmiReport import OpenTmiReport
+from pytest_opentmi.detach import status_path, wait
+from pytest_opentmi.logstore import LogStore, StoredLog
+from pytest_opentmi.plugin import pytest_addoption
+from pytest_opentmi.record import TestRecord
+from pytest_opentmi.spool import read_records
+from pytest_opentmi.uploader import StreamUploader
+from .fake_server import FakeOpenTmiServer
+from .test_cache import MockCache
 
 
 class MockPluginManager:
@@ -7,23 +20,116 @@ class MockPluginManager:
         return False
 
 
+class MockOption:
+    metadata = []
+
+
 class MockConfig:
     pluginmanager = MockPluginManager()
+    option = MockOption()
+    options = {
+        'opentmi': 'https://localhost',
+        'opentmi_token': None,
+        'opentmi_store_logs': False,
+        'opentmi_log_limit': 1024,
+        'opentmi_stream': False,
+        'opentmi_stream_queue': 10,
+        'opentmi_batch_size': 0,
+        'opentmi_batch_bytes': 1024,
+        'opentmi_spool': None,
+        'opentmi_upload_workers': 2,
+        'opentmi_timeout': 1,
+        'opentmi_retries': 0,
+        'opentmi_breaker_threshold': 2,
+        'opentmi_fallback_dir': None,
+        'opentmi_login_check': 'warn',
+        'opentmi_profiling': False,
+        'opentmi_resources': None,
+        'opentmi_resources_interval': 0.1,
+        'opentmi_stats': False,
+        'opentmi_stats_file': None,
+        'opentmi_suite_document': False,
+        'opentmi_schedule': False,
+        'opentmi_shard': None,
+        'opentmi_schedule_ttl': 3600,
+        'opentmi_failed_first': False,
+        'opentmi_history_timeout': 1,
+        'opentmi_upload_policy': 'all',
+        'opentmi_sample_rate': 0.01,
+        'opentmi_detach': False,
+        'opentmi_detach_dir': None,
+        'opentmi_gzip_threshold': 4096,
+        'opentmi_regressions': None,
+        'opentmi_regression_runs': 20,
+        'opentmi_regression_threshold': 3.5,
+        'opentmi_collapse_reruns': False
+    }
+
+    def __init__(self, **options):
+        if options:
+            self.options = dict(MockConfig.options, **options)
 
     def getoption(self, opt):
-        if opt == 'opentmi':
-            return 'https://localhost'
-        if opt == 'opentmi_store_logs':
-            return False
+        if opt in self.options:
+            return self.options[opt]
         raise AssertionError('invalid opt')
 
 
+class MockReport:
+    # pylint: disable=too-many-instance-attributes, too-few-public-methods
+    class ReprCrash:
+        message = 'boom'
+        path = 'test_a.py'
+        lineno = 1
+
+    class LongRepr:
+        pass
+
+    def __init__(self, nodeid, when, outcome):
+        self.nodeid = nodeid
+        self.head_line = nodeid.split('::')[-1]
+        self.location = ('test_a.py', 1, self.head_line)
+        self.obj = lambda: None
+        self.when = when
+        self.outcome = outcome
+        self.passed = outcome == 'passed'
+        self.failed = outcome == 'failed'
+        self.skipped = outcome == 'skipped'
+        self.duration = 0.1
+        self.keywords = {self.head_line: 1, 'smoke': 1}
+        self.user_properties = []
+        self.capstdout = self.capstderr = ''
+        self.longrepr = MockReport.LongRepr()
+        self.longrepr.reprcrash = MockReport.ReprCrash()
+
+
+def run_tests(report, tests):
+    """
+    Report collected tests which pass teardown
+    """
+    for test in tests:
+        report.pytest_runtest_logreport(test)
+        report.pytest_runtest_logreport(MockReport(test.nodeid, 'teardown', 'passed'))
+
+
 class TestPlugin(unittest.TestCase):
 
     def test_constructor(self):
         report = OpenTmiReport(config=MockConfig())
         self.assertIsInstance(report, OpenTmiReport)
 
+    def test_options_keep_test_paths(self):
+        parser = Parser(_ispytest=True)
+        pytest_addoption(parser)
+        options = parser.parse(['--opentmi_stats', 'test_many.py'])
+        self.assertEqual((options.opentmi_stats, options.opentmi_stats_file), (True, None))
+        self.assertEqual(options.file_or_dir, ['test_many.py'])
+        options = parser.parse(['--opentmi_stats_file', 'stats.json', 'test_many.py'])
+        self.assertEqual((options.opentmi_stats_file, options.file_or_dir), ('stats.json', ['test_many.py']))
+        options = parser.parse(['--opentmi_detach', 'tests'])
+        self.assertEqual((options.opentmi_detach, options.opentmi_detach_dir), (True, None))
+        self.assertEqual(options.file_or_dir, ['tests'])
+
     def test_get_test_key(self):
         report = OpenTmiReport(config=MockConfig())
 
@@ -33,3 +139,393 @@ class TestPlugin(unittest.TestCase):
                 return ['a', 2, 'b']
         key = report._get_test_key(Item())
         self.assertEqual(key, 'a_2_b')
+
+    def test_stream_pending(self):
+        report = OpenTmiReport(config=MockConfig())
+        report._uploader = StreamUploader(maxsize=10)
+        report.results = [TestRecord('test_a.py::test_a', 'a')]
+        report._stream_pending()
+        self.assertEqual(report.results, [])
+        self.assertEqual(report._uploader.pending, 2)
+
+    def test_result_template(self):
+        class Option:
+            metadata = [('DUT_MODEL', 'S5'), ('SUT_BRANCH', 'main'), ('foo', 'bar'), ('bad', object())]
+
+        config = MockConfig()
+        config.option = Option()
+        report = OpenTmiReport(config=config)
+        with self.assertLogs('pytest_opentmi.documents', level='WARNING') as logs:
+            first = report._new_templated_result('a')
+            second = report._new_templated_result('b')
+        # template is validated only once
+        self.assertEqual(len(logs.output), 1)
+        self.assertIs(first['exec']['metadata'], second['exec']['metadata'])
+        self.assertEqual(first['exec']['metadata'], {'foo': 'bar'})
+        self.assertEqual(second['exec']['duts'], [{'type': 'hw', 'model': 'S5'}])
+        self.assertEqual(second['exec']['sut']['branch'], 'main')
+        self.assertEqual(second['tcid'], 'b')
+        self.assertEqual(first['job'], second['job'])
+        self.assertEqual(report._new_templated_result('c', shared=False), {'tcid': 'c', 'job': first['job']})
+
+    def test_result_document(self):
+        class Option:
+            metadata = [('DUT_MODEL', 'S5'), ('SUT_BRANCH', 'main'), ('foo', {'bar': [1, {}]})]
+
+        config = MockConfig()
+        config.option = Option()
+        report = OpenTmiReport(config=config)
+        report._log_store = LogStore()
+        record = TestRecord('test_a.py::test_a', 'a', duration=0.5, keywords=['a', '', 'smoke'])
+        record.verdict = 'fail'
+        record.note = 'boom'
+        record.properties = {'x': 1, 'empty': None}
+        record.profiling = dict(phases=dict(setup=0.0, call=0.5), fixtures=[])
+        record.logs = [('stdout', report._log_store.store('output'))]
+        # equal to document built using opentmi_client
+        template = documents.new_template(Option.metadata, report._job_id)
+        template.tcid = 'a'
+        template.execution.duration = 0.5
+        template.execution.verdict = 'fail'
+        template.execution.note = 'boom'
+        template.execution.profiling['properties'] = dict(record.properties)
+        template.execution.profiling['keywords'] = ['a', 'smoke']
+        template.execution.profiling.update(record.profiling)
+        template.execution.append_log(StoredLog(report._log_store, record.logs[0][1], 'stdout'))
+        self.assertEqual(report._new_result(record), template.data)
+        report._log_store.close()
+
+    def test_teardown_failure_updates_own_result(self):
+        report = OpenTmiReport(config=MockConfig())
+        first = MockReport('test_a.py::test_first', 'call', 'passed')
+        second = MockReport('test_a.py::test_second', 'call', 'passed')
+        for item in (first, second):
+            report.pytest_itemcollected(item)
+        # results of the two tests are interleaved, e.g. by async plugins
+        report.pytest_runtest_logreport(first)
+        report.pytest_runtest_logreport(second)
+        report.pytest_runtest_logreport(MockReport('test_a.py::test_first', 'teardown', 'failed'))
+        report.pytest_runtest_logreport(MockReport('test_a.py::test_second', 'teardown', 'passed'))
+        self.assertEqual(report.records, {})
+        verdicts = {record.tcid: record.verdict for record in report.results}
+        self.assertEqual(verdicts, {'test_first': 'fail', 'test_second': 'pass'})
+        self.assertEqual((report.passed, report.failed), (1, 1))
+        result = report._new_result(report.results[0])
+        self.assertEqual(result['exec']['verdict'], 'fail')
+        self.assertTrue(result['exec']['note'].startswith('Failed on teardown: boom'))
+        self.assertEqual(report._testcase_sync.document(report.results[0])['other_info']['type'], 'smoke')
+
+    def test_testcase_document(self):
+        for description, keywords in ((None, ['test_a', 'smoke', 'regression']), ('doc', ['', 'a']), ('', [])):
+            test = api.Testcase(tcid='a')
+            test.status.value = 'released'
+            if description is not None:
+                test.other_info.description = description
+            test.other_info.keywords = keywords
+            if 'smoke' in keywords:
+                test.other_info.type = 'smoke'
+            self.assertEqual(documents.testcase_document('a', description, keywords), test.data)
+
+    def test_collapse_reruns(self):
+        class PluginManager:
+            def hasplugin(self, plugin):
+                return plugin == 'rerunfailures'
+
+        config = MockConfig(opentmi_collapse_reruns=True, opentmi_upload_policy='aggregate')
+        config.pluginmanager = PluginManager()
+        report = OpenTmiReport(config=config)
+        attempts = [('test_a.py::test_flaky', 'call', 'rerun'), ('test_a.py::test_flaky', 'teardown', 'passed'),
+                    ('test_a.py::test_flaky', 'call', 'passed'), ('test_a.py::test_flaky', 'teardown', 'rerun'),
+                    ('test_a.py::test_flaky', 'call', 'passed'), ('test_a.py::test_flaky', 'teardown', 'passed'),
+                    ('test_a.py::test_broken', 'call', 'rerun'), ('test_a.py::test_broken', 'teardown', 'passed'),
+                    ('test_a.py::test_broken', 'call', 'failed'), ('test_a.py::test_broken', 'teardown', 'passed')]
+        for nodeid, when, outcome in attempts:
+            test = MockReport(nodeid, when, outcome)
+            report.pytest_itemcollected(test)
+            report.pytest_runtest_logreport(test)
+        self.assertEqual([record.tcid for record in report.results], ['test_flaky', 'test_broken'])
+        flaky, broken = report.results
+        self.assertEqual((flaky.verdict, flaky.note), ('pass', 'flaky: passed on attempt 3'))
+        reruns = flaky.profiling['reruns']
+        self.assertEqual((reruns['count'], reruns['flaky']), (2, True))
+        self.assertEqual([attempt['verdict'] for attempt in reruns['attempts']], ['fail', 'error', 'pass'])
+        self.assertEqual(reruns['attempts'][0]['note'], 'boom')
+        self.assertEqual(broken.verdict, 'fail')
+        self.assertFalse(broken.profiling['reruns']['flaky'])
+        self.assertEqual((report.passed, report.failed, report.rerun), (1, 1, 3))
+        self.assertEqual((report._reruns.collapsed, report._reruns.flaky), (2, 1))
+        # flaky test is uploaded in full and not again as an aggregate
+        self.assertEqual(report._aggregator.records(), [])
+
+    def test_background_login_failure(self):
+        report = OpenTmiReport(config=MockConfig(opentmi='http://127.0.0.1:1'))
+        report._login.start()
+        self.assertFalse(report._login.wait(retry=False))
+        self.assertIsNotNone(report._login.error)
+
+    def test_xdist_worker_counters(self):
+        config = MockConfig()
+        config.workerinput = {'opentmi_job_id': 'job-1'}
+        worker = OpenTmiReport(config=config)
+        self.assertTrue(worker._is_worker)
+        self.assertEqual(worker._job_id, 'job-1')
+        worker.passed = 3
+        worker.failed = 1
+        worker._uploaded_success = 4
+        worker._tc_cache.claim({'tcid': 'a'})
+        worker._tc_cache.confirm({'tcid': 'a'})
+        controller = OpenTmiReport(config=MockConfig())
+
+        class Node:
+            workerinput = {}
+            workeroutput = {'opentmi': worker._counters()}
+        controller.pytest_configure_node(Node)
+        self.assertTrue(controller._is_controller)
+        self.assertEqual(Node.workerinput['opentmi_job_id'], controller._job_id)
+        controller.pytest_testnodedown(Node, None)
+        controller.pytest_testnodedown(Node, None)
+        self.assertEqual(controller.passed, 6)
+        self.assertEqual(controller.failed, 2)
+        self.assertEqual(controller._uploaded_success, 8)
+        # testcases synced by workers are saved by controller
+        self.assertFalse(controller._tc_cache.claim({'tcid': 'a'}))
+
+    def test_divert_when_circuit_open(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        report = OpenTmiReport(config=MockConfig(opentmi_fallback_dir=directory))
+        for _ in range(2):
+            report._transport.breaker.failure()
+        report._upload_report({'tcid': 'a'})
+        report._upload_result_data({'tcid': 'b'})
+        self.assertEqual(report._diverted, 2)
+        self.assertEqual(report._uploaded_failed, 0)
+        report._fallback_spool.close()
+        _, records = read_records(report._fallback_spool.path)
+        self.assertEqual([record['data']['tcid'] for record in records], ['a', 'b'])
+
+
+class TestPluginUploads(unittest.TestCase):
+    """
+    Reporter sessions which upload to fake opentmi server
+    """
+
+    def setUp(self):
+        self.server = FakeOpenTmiServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def new_config(self, **options):
+        return MockConfig(opentmi=self.server.url, **options)
+
+    def test_suite_document(self):
+        class Option:
+            metadata = [('DUT_MODEL', 'S5'), ('foo', 'bar')]
+
+        config = self.new_config(opentmi_suite_document=True)
+        config.option = Option()
+        report = OpenTmiReport(config=config)
+        test = MockReport('test_a.py::test_a', 'call', 'passed')
+        report.pytest_itemcollected(test)
+        report.pytest_sessionstart(None)
+        run_tests(report, [test])
+        report._upload_reports()
+        suite, result = self.server.documents['/api/v0/results']
+        self.assertEqual(suite['tcid'], 'suite:pytest')
+        self.assertEqual(suite['exec']['metadata'], {'foo': 'bar'})
+        self.assertEqual(suite['exec']['duts'], [{'type': 'hw', 'model': 'S5'}])
+        self.assertEqual(suite['exec']['profiling']['suite']['numtests'], 1)
+        self.assertEqual(result['job'], suite['job'])
+        self.assertEqual(set(result['exec']), {'duration', 'verdict', 'profiling'})
+        self.assertEqual(set(result['exec']['profiling']), {'keywords'})
+
+    def test_unserializable_result_is_counted(self):
+        report = OpenTmiReport(config=self.new_config())
+        report.pytest_sessionstart(None)
+        for name in ('test_a', 'test_b'):
+            test = MockReport(f'test_a.py::{name}', 'call', 'passed')
+            if name == 'test_b':
+                # record_property('x', object())
+                test.user_properties = [('x', object())]
+            report.pytest_itemcollected(test)
+            run_tests(report, [test])
+        report._upload_reports()
+        self.assertEqual([result['tcid'] for result in self.server.documents['/api/v0/results']], ['test_a'])
+        self.assertEqual((report._uploaded_success, report._uploaded_failed), (1, 1))
+
+    def test_upload_policy_aggregate(self):
+        report = OpenTmiReport(config=self.new_config(opentmi_upload_policy='aggregate'))
+        report.pytest_sessionstart(None)
+        for index, outcome in enumerate(('passed', 'passed', 'failed')):
+            test = MockReport(f'test_a.py::test_a[{index}]', 'call', outcome)
+            report.pytest_itemcollected(test)
+            run_tests(report, [test])
+        report._upload_reports()
+        results = {result['tcid']: result for result in self.server.documents['/api/v0/results']}
+        self.assertEqual(set(results), {'test_a[2', 'test_a'})
+        self.assertEqual(results['test_a[2']['exec']['verdict'], 'fail')
+        self.assertEqual(results['test_a']['exec']['profiling']['aggregate']['passed'], 2)
+        self.assertEqual(results['test_a']['exec']['profiling']['suite']['aggregated']['passed'], 2)
+        self.assertEqual((report.passed, report.failed), (2, 1))
+
+    def test_testcase_sync_at_collection(self):
+        class Session:
+            items = [MockReport('test_a.py::test_a[1]', 'call', 'passed'),
+                     MockReport('test_a.py::test_a[2]', 'call', 'passed')]
+
+        report = OpenTmiReport(config=self.new_config())
+        for item in Session.items:
+            report.pytest_itemcollected(item)
+        report.pytest_sessionstart(None)
+        report.pytest_collection_finish(Session)
+        report._wait_testcase_sync()
+        testcases = self.server.documents['/api/v0/testcases']
+        self.assertEqual(sorted(test['tcid'] for test in testcases), ['test_a[1', 'test_a[2'])
+        self.assertEqual(testcases[0]['other_info']['type'], 'smoke')
+        skipped = MockReport('test_a.py::test_a[2]', 'call', 'skipped')
+        skipped.longrepr = ('test_a.py', 1, 'Skipped: later')
+        run_tests(report, [Session.items[0], skipped])
+        report._upload_reports()
+        # only skip fields of skipped test are updated at the end of session
+        testcases = self.server.documents['/api/v0/testcases']
+        self.assertEqual(len(testcases), 3)
+        self.assertEqual(testcases[2]['tcid'], 'test_a[2')
+        self.assertEqual(testcases[2]['execution']['skip'], {'value': True, 'reason': 'Skipped: later'})
+
+    def test_skip_marked_testcases_synced_once(self):
+        class Session:
+            items = [MockReport('test_a.py::test_a', 'call', 'passed'),
+                     MockReport('test_a.py::test_b', 'call', 'passed'),
+                     MockReport('test_a.py::test_c', 'call', 'passed')]
+        Session.items[1].keywords['skipif'] = 1
+        Session.items[2].keywords['xfail'] = 1
+
+        report = OpenTmiReport(config=self.new_config())
+        for item in Session.items:
+            report.pytest_itemcollected(item)
+        report.pytest_sessionstart(None)
+        report.pytest_collection_finish(Session)
+        report._wait_testcase_sync()
+        self.assertEqual([test['tcid'] for test in self.server.documents['/api/v0/testcases']], ['test_a'])
+        skipped = MockReport('test_a.py::test_b', 'call', 'skipped')
+        skipped.longrepr = ('test_a.py', 1, 'Skipped: condition')
+        run_tests(report, [Session.items[0], skipped, Session.items[2]])
+        report._upload_reports()
+        # skipped and not skipped tests with skip markers are synced only with results
+        testcases = {test['tcid']: test for test in self.server.documents['/api/v0/testcases']}
+        self.assertEqual(len(self.server.documents['/api/v0/testcases']), 3)
+        self.assertEqual(testcases['test_b']['execution']['skip']['value'], True)
+        self.assertNotIn('execution', testcases['test_c'])
+
+    def test_runtime_skipped_testcase_synced_once(self):
+        class Session:
+            items = [MockReport('test_a.py::test_a', 'call', 'passed')]
+
+        config = self.new_config()
+        config.cache = MockCache()
+        for _ in range(3):
+            report = OpenTmiReport(config=config)
+            report.pytest_itemcollected(Session.items[0])
+            report.pytest_sessionstart(None)
+            report.pytest_collection_finish(Session)
+            # pytest.skip() in test body
+            skipped = MockReport('test_a.py::test_a', 'call', 'skipped')
+            skipped.longrepr = ('test_a.py', 1, 'Skipped: runtime')
+            run_tests(report, [skipped])
+            report._upload_reports()
+            report._tc_cache.save()
+        # plain document at collection and skip fields at the end of first session only
+        testcases = self.server.documents['/api/v0/testcases']
+        self.assertEqual(len(testcases), 2)
+        self.assertEqual(testcases[1]['execution']['skip']['reason'], 'Skipped: runtime')
+
+    def test_duration_regressions(self):
+        class Session:
+            items = [MockReport('test_a.py::test_fast', 'call', 'passed'),
+                     MockReport('test_a.py::test_slow', 'call', 'passed'),
+                     MockReport('test_a.py::test_other', 'call', 'passed')]
+            exitstatus = 0
+
+        config = self.new_config(opentmi_regressions='fail')
+        config.cache = MockCache()
+        self.server.get = lambda path: [{'tcid': tcid, 'exec': {'duration': 0.1 + index * 0.001}}
+                                        for index in range(5) for tcid in ('test_fast', 'test_slow')]
+        Session.items[1].duration = 0.5
+        for item in Session.items[:2]:
+            item.keywords['performance'] = 1
+        report = OpenTmiReport(config=config)
+        for item in Session.items:
+            report.pytest_itemcollected(item)
+        report.pytest_sessionstart(None)
+        report.pytest_collection_finish(Session)
+        run_tests(report, Session.items)
+        report.pytest_sessionfinish(Session)
+        results = {result['tcid']: result['exec'] for result in self.server.documents['/api/v0/results']}
+        self.assertFalse(results['test_fast']['profiling']['baseline']['regression'])
+        self.assertTrue(results['test_slow']['profiling']['baseline']['regression'])
+        self.assertTrue(results['test_slow']['note'].startswith('duration regression: 0.500s'))
+        self.assertNotIn('baseline', results['test_other']['profiling'])
+        regressions = report._regressions.regressions
+        self.assertEqual(regressions['checked'], 2)
+        self.assertEqual([regression['tcid'] for regression in regressions['found']], ['test_slow'])
+        self.assertEqual(Session.exitstatus, 1)
+        # baselines are cached for offline use
+        cached = OpenTmiReport(config=config)._regressions.baseline
+        self.assertEqual(cached.missing(['test_fast', 'test_slow']), [])
+
+    def test_detach(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        config = self.new_config(opentmi_detach_dir=directory)
+        report = OpenTmiReport(config=config)
+        report.pytest_sessionstart(None)
+        report.results = [TestRecord('test_a.py::test_a', 'a', duration=0.1)]
+        report._upload_reports()
+        self.assertIsNotNone(report._detached_pid)
+        status = wait(status_path(directory), timeout=30, interval=0.05)
+        self.assertEqual(status['state'], 'done')
+        self.assertEqual(sorted(result['tcid'] for result in self.server.documents['/api/v0/results']),
+                         ['a', 'suite:pytest'])
+        # testcase uploaded by detached uploader is not handed off again
+        report = OpenTmiReport(config=config)
+        report.pytest_sessionstart(None)
+        report.results = [TestRecord('test_a.py::test_a', 'a', duration=0.1)]
+        report._upload_reports()
+        self.assertEqual(wait(status_path(directory), timeout=30, interval=0.05)['state'], 'done')
+        self.assertEqual(len(self.server.documents['/api/v0/results']), 4)
+        self.assertEqual(len(self.server.documents['/api/v0/testcases']), 1)
+
+    def test_background_login(self):
+        config = self.new_config(opentmi_token='secret')
+        config.cache = MockCache()
+        report = OpenTmiReport(config=config)
+        report._login.token_cache.job = 'BUILD_TAG=job-1'
+        report._login.start()
+        self.assertTrue(report._login.wait())
+        self.assertEqual(report._transport.token, 'fake-token')
+        # next invocation of the same CI job reuses token
+        report = OpenTmiReport(config=config)
+        report._login.token_cache.job = 'BUILD_TAG=job-1'
+        self.assertTrue(report._login.wait())
+        self.assertEqual(self.server.requests, [('POST', '/auth/github/token'), ('GET', '/auth/me')])
+
+    def test_xdist_results_keep_suite_profiling(self):
+        config = self.new_config()
+        config.workerinput = {'workerid': 'gw1'}
+        worker = OpenTmiReport(config=config)
+        test = MockReport('test_a.py::test_a', 'call', 'passed')
+        worker.pytest_itemcollected(test)
+        worker.pytest_sessionstart(None)
+        run_tests(worker, [test])
+        worker._upload_reports()
+        del config.workerinput
+        controller = OpenTmiReport(config=config)
+        controller.pytest_sessionstart(None)
+        controller._is_controller = True
+        controller._upload_reports()
+        # no summary result without --opentmi_suite_document
+        result, = self.server.documents['/api/v0/results']
+        self.assertEqual(result['tcid'], 'test_a')
+        self.assertEqual(result['exec']['profiling']['suite']['numtests'], 1)
+        self.assertEqual(result['exec']['profiling']['suite']['worker'], 'gw1')
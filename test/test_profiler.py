@@ -0,0 +1,67 @@
+# pylint: disable=missing-docstring
+
+import unittest
+from pytest_opentmi.profiler import FixtureProfiler
+
+
+class FixtureDef:
+    def __init__(self, argname, scope='function'):
+        self.argname = argname
+        self.scope = scope
+        self.finalizers = []
+
+    def addfinalizer(self, finalizer):
+        self.finalizers.append(finalizer)
+
+    def finish(self, profiler):
+        while self.finalizers:
+            self.finalizers.pop()()
+        profiler.pytest_fixture_post_finalizer(self, None)
+
+
+class Report:
+    def __init__(self, nodeid, when, duration):
+        self.nodeid = nodeid
+        self.when = when
+        self.duration = duration
+
+
+def setup_fixture(profiler, fixturedef):
+    hook = profiler.pytest_fixture_setup(fixturedef, None)
+    next(hook)
+    try:
+        next(hook)
+    except StopIteration:
+        pass
+
+
+class TestFixtureProfiler(unittest.TestCase):
+
+    def test_phases_and_fixtures(self):
+        profiler = FixtureProfiler()
+        module = FixtureDef('hw', 'module')
+        profiler.pytest_runtest_logstart('test_a.py::test_a', None)
+        setup_fixture(profiler, module)
+        profiler.pytest_runtest_logreport(Report('test_a.py::test_a', 'setup', 0.5))
+        profiler.pytest_runtest_logreport(Report('test_a.py::test_a', 'call', 1.0))
+        profiler.pytest_runtest_logreport(Report('test_a.py::test_a', 'teardown', 0.1))
+        first = profiler.pop('test_a.py::test_a')
+        self.assertEqual(first['phases'], {'setup': 0.5, 'call': 1.0, 'teardown': 0.1})
+        self.assertEqual(list(first['fixtures']['hw']), ['scope', 'setup'])
+        # module fixture teardown belongs to the test running at that time
+        profiler.pytest_runtest_logstart('test_a.py::test_b', None)
+        module.finish(profiler)
+        second = profiler.pop('test_a.py::test_b')
+        self.assertEqual(list(second['fixtures']['hw']), ['scope', 'teardown'])
+        self.assertIsNone(profiler.pop('test_a.py::test_b'))
+
+    def test_slowest_fixtures(self):
+        profiler = FixtureProfiler()
+        profiler.add_totals({'fast': {'setup': 0.1, 'teardown': 0, 'count': 2},
+                             'slow': {'setup': 1, 'teardown': 2, 'count': 1}})
+        profiler.add_totals({'fast': {'setup': 0.1, 'teardown': 0, 'count': 2}})
+        ranking = profiler.slowest_fixtures()
+        self.assertEqual([fixture['name'] for fixture in ranking], ['slow', 'fast'])
+        self.assertEqual(ranking[0]['total'], 3)
+        self.assertEqual(ranking[1]['count'], 4)
+        self.assertEqual(len(profiler.slowest_fixtures(1)), 1)
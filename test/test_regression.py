@@ -0,0 +1,118 @@
+# pylint: disable=missing-docstring
+
+import json
+import time
+import unittest
+from urllib.parse import parse_qs, urlparse
+from pytest_opentmi.record import TestRecord
+from pytest_opentmi.regression import DurationBaseline, RegressionCheck
+from pytest_opentmi.transport import UploadTransport
+from .fake_server import FakeOpenTmiServer
+from .test_cache import MockCache
+
+
+class Item:
+    def __init__(self, name, keywords=()):
+        self.location = ('test_a.py', 1, name)
+        self.keywords = dict.fromkeys(keywords, 1)
+
+
+class TestDurationBaseline(unittest.TestCase):
+
+    def test_summarize(self):
+        self.assertEqual(DurationBaseline.summarize([1.0, 1.5, 0.75, 1.25, 5.0]), dict(median=1.25, mad=0.25, runs=5))
+        self.assertIsNone(DurationBaseline.summarize([]))
+
+    def test_check(self):
+        baseline = DurationBaseline()
+        baseline.baselines = {'a': dict(median=1.0, mad=0.05, runs=20), 'b': dict(median=1.0, mad=0.0, runs=20),
+                              'c': dict(median=1.0, mad=0.05, runs=3), 'd': None}
+        self.assertTrue(baseline.check('a', 1.5)['regression'])
+        self.assertEqual(baseline.check('a', 1.5)['score'], 6.74)
+        # within noise or faster
+        self.assertFalse(baseline.check('a', 1.2)['regression'])
+        self.assertFalse(baseline.check('a', 0.5)['regression'])
+        # without deviation small slowdowns are tolerated
+        self.assertFalse(baseline.check('b', 1.08)['regression'])
+        self.assertTrue(baseline.check('b', 1.2)['regression'])
+        # too few runs or no history
+        for tcid in ('c', 'd', 'e'):
+            self.assertIsNone(baseline.check(tcid, 10.0))
+
+    def test_fetch(self):
+        server = FakeOpenTmiServer().start()
+        queries = []
+
+        def get(path):
+            queries.append(parse_qs(urlparse(path).query))
+            return [{'tcid': 'a', 'exec': {'duration': duration}} for duration in (1.0, 3.0, 2.0, 9.0)] + \
+                [{'tcid': 'b', 'exec': {}}]
+        server.get = get
+        try:
+            baseline = DurationBaseline(runs=3)
+            baseline.fetch(UploadTransport(server.url), ['a', 'b'])
+        finally:
+            server.stop()
+        self.assertEqual(baseline.baselines, {'a': dict(median=2.0, mad=1.0, runs=3), 'b': None})
+        self.assertEqual(json.loads(queries[0]['q'][0]), {'tcid': {'$in': ['a', 'b']}, 'exec.verdict': 'pass'})
+        self.assertEqual(queries[0]['l'], ['6'])
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(baseline.fresh)
+
+    def test_fetch_starved(self):
+        server = FakeOpenTmiServer().start()
+        queries = []
+
+        def get(path):
+            query = json.loads(parse_qs(urlparse(path).query)['q'][0])
+            queries.append(query['tcid']['$in'])
+            if query['tcid']['$in'] == ['b']:
+                return [{'tcid': 'b', 'exec': {'duration': 5.0}}] * 2
+            # frequently run 'a' fills the limit of bulk query
+            return [{'tcid': 'a', 'exec': {'duration': 1.0}}] * 6
+        server.get = get
+        try:
+            baseline = DurationBaseline(runs=3)
+            baseline.fetch(UploadTransport(server.url), ['a', 'b'])
+        finally:
+            server.stop()
+        self.assertEqual(queries, [['a', 'b'], ['b']])
+        self.assertEqual(baseline.baselines, {'a': dict(median=1.0, mad=0.0, runs=3),
+                                              'b': dict(median=5.0, mad=0.0, runs=2)})
+
+    def test_cache(self):
+        cache = MockCache()
+        baseline = DurationBaseline(cache, 'host', ttl=60, runs=10)
+        self.assertEqual(baseline.missing(['a', 'a']), ['a'])
+        baseline.updated = time.time()
+        baseline.baselines['a'] = dict(median=1.0, mad=0.1, runs=10)
+        baseline.save()
+        self.assertEqual(DurationBaseline(cache, 'host', ttl=60, runs=10).missing(['a', 'b']), ['b'])
+        # baselines of other window size are not used
+        self.assertEqual(DurationBaseline(cache, 'host', ttl=60, runs=5).baselines, {})
+
+
+class TestRegressionCheck(unittest.TestCase):
+
+    def test_check(self):
+        fetched = []
+        baseline = DurationBaseline()
+        regressions = RegressionCheck(baseline, fetched.extend, mode='fail')
+        regressions.start([Item('test_slow', ['performance']), Item('test_other')])
+        regressions.wait()
+        self.assertEqual(fetched, ['test_slow'])
+        baseline.baselines['test_slow'] = dict(median=1.0, mad=0.01, runs=5)
+        record = TestRecord('test_a.py::test_slow', 'test_slow', duration=2.0)
+        record.verdict = 'pass'
+        regressions.check(record)
+        self.assertTrue(record.profiling['baseline']['regression'])
+        self.assertTrue(record.note.startswith('duration regression: 2.000s'))
+        # tests which are not performance tests are not checked
+        other = TestRecord('test_a.py::test_other', 'test_other', duration=2.0)
+        other.verdict = 'pass'
+        regressions.check(other)
+        self.assertIsNone(other.profiling)
+        regressions.merge(dict(checked=1, found=[]))
+        self.assertEqual(regressions.regressions['checked'], 2)
+        self.assertEqual([found['nodeid'] for found in regressions.regressions['found']], ['test_a.py::test_slow'])
+        self.assertTrue(regressions.failed)
@@ -0,0 +1,48 @@
+# pylint: disable=missing-docstring
+
+import unittest
+from pytest_opentmi.record import TestRecord
+from pytest_opentmi.reruns import RerunCollapse
+
+
+class Crash:
+    message = 'assert False\nmore details'
+
+
+class Longrepr:
+    reprcrash = Crash()
+
+
+class Report:
+    def __init__(self, when, longrepr=None):
+        self.nodeid = 'test_a.py::test_a'
+        self.when = when
+        self.duration = 0.25
+        self.longrepr = longrepr or Longrepr()
+
+
+class TestRerunCollapse(unittest.TestCase):
+
+    def test_collapse(self):
+        reruns = RerunCollapse()
+        reruns.add(Report('call'))
+        reruns.add(Report('setup', longrepr='fixture failed'))
+        record = TestRecord('test_a.py::test_a', 'test_a', duration=0.5)
+        record.verdict = 'pass'
+        reruns.collapse(record)
+        self.assertEqual(record.note, 'flaky: passed on attempt 3')
+        self.assertEqual(record.profiling['reruns']['attempts'], [
+            dict(verdict='fail', when='call', duration=0.25, note='assert False'),
+            dict(verdict='error', when='setup', duration=0.25, note='fixture failed'),
+            dict(verdict='pass', duration=0.5)])
+        # final result without attempts is not modified
+        other = TestRecord('test_a.py::test_b', 'test_b')
+        reruns.collapse(other)
+        self.assertIsNone(other.profiling)
+        self.assertEqual(reruns.totals(2), dict(count=2, collapsed=1, flaky=1))
+
+    def test_merge(self):
+        reruns = RerunCollapse()
+        reruns.merge(dict(count=3, collapsed=2, flaky=1))
+        reruns.merge({})
+        self.assertEqual(reruns.totals(3), dict(count=3, collapsed=2, flaky=1))
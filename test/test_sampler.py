@@ -0,0 +1,47 @@
+# pylint: disable=missing-docstring
+
+import time
+import unittest
+from pytest_opentmi.sampler import ResourceSampler
+
+
+class Item:
+    def __init__(self, nodeid, keywords):
+        self.nodeid = nodeid
+        self.keywords = keywords
+
+
+class Report:
+    def __init__(self, nodeid, when):
+        self.nodeid = nodeid
+        self.when = when
+
+
+@unittest.skipUnless(ResourceSampler.available(), 'resource module not available')
+class TestResourceSampler(unittest.TestCase):
+
+    def test_sample_performance_test(self):
+        sampler = ResourceSampler(interval=0.01)
+        sampler.pytest_runtest_setup(Item('test_a.py::test_perf', {'performance': 1}))
+        data = bytearray(20 * 1024 * 1024)
+        data[::4096] = b'\x01' * len(data[::4096])
+        time.sleep(0.05)
+        sampler.pytest_runtest_logreport(Report('test_a.py::test_perf', 'teardown'))
+        sampler.close()
+        usage = sampler.pop('test_a.py::test_perf')
+        self.assertGreaterEqual(usage['cpu_user'] + usage['cpu_system'], 0)
+        self.assertGreater(usage['rss_peak_delta'], 10 * 1024 * 1024)
+        self.assertEqual(sampler.tests, 1)
+        self.assertGreater(sampler.overhead, 0)
+        self.assertIsNone(sampler.pop('test_a.py::test_perf'))
+        del data
+
+    def test_only_performance_tests_by_default(self):
+        sampler = ResourceSampler(interval=0)
+        sampler.pytest_runtest_setup(Item('test_a.py::test_plain', {}))
+        sampler.pytest_runtest_logreport(Report('test_a.py::test_plain', 'teardown'))
+        self.assertIsNone(sampler.pop('test_a.py::test_plain'))
+        sampler = ResourceSampler(interval=0, all_tests=True)
+        sampler.pytest_runtest_setup(Item('test_a.py::test_plain', {}))
+        sampler.pytest_runtest_logreport(Report('test_a.py::test_plain', 'teardown'))
+        self.assertEqual(sampler.pop('test_a.py::test_plain')['samples'], 0)
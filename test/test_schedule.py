@@ -0,0 +1,268 @@
+# pylint: disable=missing-docstring
+
+import json
+import time
+import unittest
+from urllib.parse import parse_qs, urlparse
+from pytest_opentmi.schedule import DurationHistory, FailureHistory, Scheduler, balanced_groups, estimate, \
+    new_scheduler
+from pytest_opentmi.transport import UploadTransport
+from .fake_server import FakeOpenTmiServer
+from .test_cache import MockCache
+
+
+class Item:
+    def __init__(self, name):
+        self.location = ('test_a.py', 1, name)
+        self.markers = []
+
+    def iter_markers(self, name):
+        return [marker for marker in self.markers if marker.name == name]
+
+    def add_marker(self, marker):
+        self.markers.append(marker.mark)
+
+
+class Hook:
+    def __init__(self):
+        self.deselected = []
+
+    def pytest_deselected(self, items):
+        self.deselected.extend(items)
+
+
+class Config:
+    def __init__(self, **options):
+        self.hook = Hook()
+        self.options = options
+
+    def getoption(self, name):
+        return self.options[name]
+
+
+class Node:
+    def __init__(self, config):
+        self.config = config
+        self.workerinput = {}
+
+
+class TestDurationHistory(unittest.TestCase):
+
+    def test_fetch(self):
+        server = FakeOpenTmiServer().start()
+        queries = []
+
+        def get(path):
+            queries.append(parse_qs(urlparse(path).query))
+            return [{'tcid': 'a', 'exec': {'duration': duration}} for duration in (1.0, 3.0, 2.0, 9.0)] + \
+                [{'tcid': 'b', 'exec': {}}]
+        server.get = get
+        try:
+            history = DurationHistory(runs=3)
+            history.fetch(UploadTransport(server.url), ['a', 'b', 'c'])
+        finally:
+            server.stop()
+        self.assertEqual(history.durations, {'a': 2.0, 'b': None, 'c': None})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(json.loads(queries[0]['q'][0]), {'tcid': {'$in': ['a', 'b', 'c']}})
+        self.assertEqual(queries[0]['l'], ['9'])
+        self.assertTrue(history.fresh)
+
+    def test_fetch_starved(self):
+        server = FakeOpenTmiServer().start()
+        queries = []
+
+        def get(path):
+            query = json.loads(parse_qs(urlparse(path).query)['q'][0])
+            queries.append(query)
+            if query['tcid']['$in'] == ['b']:
+                return [{'tcid': 'b', 'exec': {'duration': 5.0}}]
+            # frequently run 'a' fills the limit of bulk query
+            return [{'tcid': 'a', 'exec': {'duration': 1.0}}] * 6
+        server.get = get
+        try:
+            history = DurationHistory(runs=3)
+            history.fetch(UploadTransport(server.url), ['a', 'b'])
+        finally:
+            server.stop()
+        self.assertEqual(queries, [{'tcid': {'$in': ['a', 'b']}}, {'tcid': {'$in': ['b']}}])
+        self.assertEqual(history.durations, {'a': 1.0, 'b': 5.0})
+
+    def test_cache(self):
+        cache = MockCache()
+        history = DurationHistory(cache, 'host', ttl=60)
+        self.assertFalse(history.fresh)
+        self.assertEqual(history.missing(['a', 'a']), ['a'])
+        history.updated = time.time()
+        history.add('a', 1.5)
+        history.save()
+        history = DurationHistory(cache, 'host', ttl=60)
+        self.assertEqual(history.durations, {'a': 1.5})
+        self.assertEqual(history.missing(['a', 'b']), ['b'])
+        # expired durations are fetched again
+        self.assertEqual(DurationHistory(cache, 'host', ttl=0).missing(['a', 'b']), ['a', 'b'])
+
+
+class TestFailureHistory(unittest.TestCase):
+
+    def test_fetch(self):
+        server = FakeOpenTmiServer().start()
+        queries = []
+
+        def get(path):
+            queries.append(parse_qs(urlparse(path).query))
+            return [{'tcid': 'a', 'exec': {'verdict': 'fail', 'sut': {'commit_id': 'c2'}}, 'cre': {'time': 't2'}},
+                    {'tcid': 'b', 'exec': {'verdict': 'inconclusive', 'sut': {}}, 'cre': {'time': 't1'}},
+                    {'tcid': 'a', 'exec': {'verdict': 'error', 'sut': {'commit_id': 'c1'}}, 'cre': {'time': 't0'}}]
+        server.get = get
+        try:
+            failures = FailureHistory(branch='main', commit='c1', limit=50)
+            failures.fetch(UploadTransport(server.url))
+        finally:
+            server.stop()
+        self.assertEqual(len(queries), 1)
+        query = json.loads(queries[0]['q'][0])
+        self.assertEqual(query['exec.sut.branch'], 'main')
+        self.assertEqual(query['exec.verdict'], {'$in': ['fail', 'error', 'inconclusive']})
+        self.assertIn('$gte', query['cre.time'])
+        self.assertEqual(queries[0]['l'], ['50'])
+        self.assertEqual(failures.failures['a'], dict(failed=2, flaky=False, commits=['c2', 'c1'], last='t2'))
+        # failed on same commit, failed on branch, flaky, no failures
+        self.assertEqual(failures.rank('a'), (3, 2))
+        self.assertEqual(failures.rank('b'), (1, 0))
+        self.assertEqual(failures.rank('c'), (0, 0))
+        self.assertTrue(failures.fresh)
+
+    def test_cache(self):
+        cache = MockCache()
+        failures = FailureHistory(cache, 'host', branch='main', commit='c1')
+        self.assertFalse(failures.fresh)
+        failures.add('a', 'fail')
+        failures.save()
+        failures = FailureHistory(cache, 'host', branch='main', commit='c2')
+        self.assertEqual(failures.failures['a']['commits'], ['c1'])
+        self.assertEqual(failures.rank('a'), (2, 1))
+        # failures of other branches are not used
+        self.assertEqual(FailureHistory(cache, 'host', branch='feature').failures, {})
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_balanced_groups(self):
+        groups = balanced_groups([5, 4, 3, 3, 3], 2)
+        self.assertEqual(groups, [[0, 3], [1, 2, 4]])
+        # tests without durations are spread evenly
+        self.assertEqual([len(group) for group in balanced_groups([0] * 5, 2)], [3, 2])
+
+    def test_estimate(self):
+        self.assertEqual(estimate(['a', 'b', 'c'], {'a': 1.0, 'b': 3.0, 'c': None}), [1.0, 3.0, 2.0])
+        self.assertEqual(estimate(['a'], {}), [0.0])
+
+    def test_longest_first(self):
+        fetched = []
+        history = DurationHistory(durations={'fast': 0.1, 'slow': 5.0, 'medium': 1.0})
+        scheduler = Scheduler(history, fetch=fetched.extend)
+        items = [Item(name) for name in ('fast', 'new', 'slow', 'medium')]
+        scheduler.pytest_collection_modifyitems(None, Config(), items)
+        self.assertEqual([item.location[2] for item in items], ['slow', 'new', 'medium', 'fast'])
+        self.assertEqual(fetched, ['new'])
+        self.assertEqual(scheduler.summary['known'], 3)
+
+    def test_xdist_controller_fetch(self):
+        fetched = []
+        cache = MockCache()
+        history = DurationHistory(cache, durations={'test_a': 1.0})
+        scheduler = Scheduler(history, fetch=fetched.extend)
+        # controller does not collect, durations of tests collected by workers are fetched once
+        ids = ['test/test_a.py::test_a', 'test/test_a.py::TestB::test_c[1]']
+        scheduler.pytest_xdist_node_collection_finished(None, ids)
+        scheduler.pytest_xdist_node_collection_finished(None, ids)
+        scheduler.pytest_sessionfinish(None)
+        self.assertEqual(fetched, ['TestB.test_c[1'])
+        self.assertEqual(DurationHistory(cache).durations, {'test_a': 1.0})
+
+    def test_xdist_workers_use_controller_schedule(self):
+        fetched = []
+        options = dict(opentmi='https://localhost', opentmi_schedule=True, opentmi_shard=None,
+                       opentmi_failed_first=False, opentmi_schedule_ttl=60, dist='loadgroup', tx=['popen'] * 2)
+        controller = new_scheduler(Config(**options), lambda what, func, tcids: fetched.extend(tcids))
+        controller.history.durations = {'a': 1.0}
+        nodes = [Node(Config(**options)) for _ in range(2)]
+        for node in nodes:
+            controller.pytest_configure_node(node)
+        # stale durations are refreshed once for all workers
+        self.assertEqual(fetched, ['a'])
+        self.assertEqual(nodes[1].workerinput['opentmi_schedule'],
+                         dict(durations={'a': 1.0}, groups=2, failures=None))
+        worker = new_scheduler(Config(**options), None, nodes[1].workerinput)
+        self.assertEqual(worker.history.durations, {'a': 1.0})
+        self.assertEqual(worker._groups, 2)  # pylint: disable=protected-access
+        self.assertIsNone(new_scheduler(Config(**dict(options, opentmi_schedule=False)), None))
+
+    def test_shards(self):
+        history = DurationHistory(durations={f'test_{index}': float(index) for index in range(10)})
+        selected = []
+        for index in (1, 2, 3):
+            config = Config()
+            items = [Item(f'test_{index}') for index in range(10)]
+            scheduler = Scheduler(history, shard=(index, 3))
+            scheduler.pytest_collection_modifyitems(None, config, items)
+            self.assertEqual(len(items) + len(config.hook.deselected), 10)
+            self.assertLessEqual(abs(scheduler.summary['estimated'] - 15), 2)
+            selected += [item.location[2] for item in items]
+        self.assertEqual(sorted(selected), sorted(f'test_{index}' for index in range(10)))
+
+    def test_xdist_groups(self):
+        history = DurationHistory(durations={'a': 3.0, 'b': 2.0, 'c': 1.0})
+        items = [Item(name) for name in ('a', 'b', 'c')]
+        items[2].markers.append(type('Mark', (), {'name': 'xdist_group'})())
+        Scheduler(history, groups=2).pytest_collection_modifyitems(None, Config(), items)
+        self.assertEqual(items[0].iter_markers('xdist_group')[0].kwargs, {'name': 'opentmi_0'})
+        self.assertEqual(items[1].iter_markers('xdist_group')[0].kwargs, {'name': 'opentmi_1'})
+        # group given by user is kept
+        self.assertEqual(len(items[2].iter_markers('xdist_group')), 1)
+
+    def test_record_durations(self):
+        history = DurationHistory()
+        scheduler = Scheduler(history)
+
+        class Report:
+            location = ('test_a.py', 1, 'test_a[1]')
+            when = 'call'
+            skipped = False
+            duration = 0.5
+        scheduler.pytest_runtest_logreport(Report)
+        self.assertEqual(history.durations, {'test_a[1': 0.5})
+
+    def test_failed_first(self):
+        history = DurationHistory(durations={'a': 1.0, 'b': 2.0, 'c': 3.0, 'd': 4.0})
+        failures = FailureHistory(commit='c1', failures={
+            'a': dict(failed=1, flaky=False, commits=['c1'], last=None),
+            'b': dict(failed=0, flaky=True, commits=[], last=None),
+            'c': dict(failed=3, flaky=False, commits=['c0'], last=None)})
+        failures.updated = 0
+        fetched = []
+
+        def fetch():
+            time.sleep(0.1)
+            fetched.append(True)
+        scheduler = Scheduler(history, longest_first=False)
+        # collection waits for failures which are fetched in background
+        scheduler.start_failures(failures, fetch, timeout=10)
+        items = [Item(name) for name in ('d', 'b', 'c', 'a')]
+        scheduler.pytest_collection_modifyitems(None, Config(), items)
+        self.assertEqual(fetched, [True])
+        self.assertEqual([item.location[2] for item in items], ['a', 'c', 'b', 'd'])
+        self.assertEqual(scheduler.summary['failed_first'], 3)
+
+    def test_record_failures(self):
+        failures = FailureHistory(commit='c1')
+        scheduler = Scheduler(DurationHistory(), failures=failures)
+
+        class Report:
+            location = ('test_a.py', 1, 'test_a')
+            when = 'setup'
+            skipped = False
+            failed = True
+        scheduler.pytest_runtest_logreport(Report)
+        self.assertEqual(failures._observed['test_a']['failed'], 1)  # pylint: disable=protected-access
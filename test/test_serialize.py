@@ -0,0 +1,30 @@
+# pylint: disable=missing-docstring
+
+import gzip
+import json
+import unittest
+from unittest import mock
+from pytest_opentmi import serialize
+
+
+class TestSerialize(unittest.TestCase):
+
+    def test_dumps(self):
+        payload = {'tcid': 'a', 'exec': {'note': 'ä', 'duration': 0.5}, 'big': 2 ** 70}
+        self.assertEqual(json.loads(serialize.dumps(payload)), payload)
+        with mock.patch.object(serialize, 'orjson', None):
+            self.assertEqual(serialize.dumps(payload), json.dumps(payload, separators=(',', ':'),
+                                                                  ensure_ascii=False).encode('utf-8'))
+
+    def test_join(self):
+        items = [serialize.dumps({'a': index}) for index in range(3)]
+        self.assertEqual(json.loads(serialize.join(items)), [{'a': 0}, {'a': 1}, {'a': 2}])
+
+    def test_compress(self):
+        data = serialize.dumps({'note': 'x' * 1000})
+        self.assertIs(serialize.compress(data, 0), data)
+        self.assertIs(serialize.compress(data, len(data)), data)
+        body = serialize.compress(data, 100)
+        self.assertTrue(serialize.is_compressed(body))
+        self.assertFalse(serialize.is_compressed(data))
+        self.assertEqual(gzip.decompress(body), data)
@@ -0,0 +1,69 @@
+# pylint: disable=missing-docstring
+
+import os
+import shutil
+import tempfile
+import unittest
+from pytest_opentmi.spool import Spool, SpoolReplayer, SpoolState, find_spools, read_records
+
+
+class TestSpool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _spool(self, count):
+        spool = Spool(self.directory, host='http://localhost', sync_every=2)
+        spool.append('testcase', {'tcid': 'a'})
+        for index in range(count):
+            spool.append('result', {'tcid': 'a', 'index': index})
+        return spool
+
+    def test_unserializable_record(self):
+        spool = Spool(self.directory)
+        self.assertIsNone(spool.append('result', {'tcid': 'a', 'x': object()}))
+        record = spool.append('result', {'tcid': 'b'})
+        spool.close()
+        _, records = read_records(spool.path)
+        self.assertEqual(records, [record])
+        self.assertTrue(record['id'].endswith('-1'))
+
+    def test_append_and_read(self):
+        spool = self._spool(3)
+        # records are readable before spool is closed
+        header, records = read_records(spool.path)
+        spool.close()
+        self.assertEqual(header['host'], 'http://localhost')
+        self.assertEqual([record['type'] for record in records], ['testcase', 'result', 'result', 'result'])
+        self.assertEqual(len({record['id'] for record in records}), 4)
+        self.assertEqual(find_spools(self.directory), [spool.path])
+
+    def test_truncated_record(self):
+        spool = self._spool(1)
+        spool.close()
+        with open(spool.path, 'a', encoding='utf-8') as file:
+            file.write('{"id": "x", "ty')
+        _, records = read_records(spool.path)
+        self.assertEqual(len(records), 2)
+
+    def test_replay_resume(self):
+        spool = self._spool(4)
+        spool.close()
+        uploaded = []
+        fail = {'enabled': True}
+
+        def upload_result(data):
+            if fail['enabled'] and data['index'] % 2:
+                raise ValueError('server down')
+            uploaded.append(data['index'])
+            return True
+        replayer = SpoolReplayer(upload_result, lambda data: True, workers=2)
+        self.assertEqual(replayer.replay_file(spool.path), (3, 2, 0))
+        fail['enabled'] = False
+        self.assertEqual(replayer.replay_file(spool.path), (2, 0, 3))
+        self.assertEqual(sorted(uploaded), [0, 1, 2, 3])
+        self.assertEqual(replayer.replay_file(spool.path), (0, 0, 5))
+        self.assertTrue(os.path.exists(SpoolState(spool.path).path))
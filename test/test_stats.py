@@ -0,0 +1,128 @@
+# pylint: disable=missing-docstring
+
+import json
+import os
+import tempfile
+import unittest
+from pytest_opentmi.stats import Stats, percentile
+from pytest_opentmi.transport import UploadTransport
+from .fake_server import FakeOpenTmiServer
+
+
+class Plugin:
+    def pytest_runtest_logreport(self, report):
+        return report
+
+    def helper(self):
+        raise ValueError('failed')
+
+
+class TestStats(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3], 99), 3)
+        self.assertIsNone(percentile([], 50))
+
+    def test_instrument(self):
+        stats = Stats()
+        plugin = Plugin()
+        stats.instrument(plugin, ('pytest_runtest_logreport', 'helper'))
+        self.assertEqual(plugin.pytest_runtest_logreport('report'), 'report')
+        plugin.pytest_runtest_logreport(report='report')
+        with self.assertRaises(ValueError):
+            plugin.helper()
+        self.assertEqual(stats.timings['pytest_runtest_logreport'][0], 2)
+        self.assertEqual(stats.timings['helper'][0], 1)
+        self.assertGreater(stats.hook_time, 0)
+        # other instances are not affected
+        self.assertNotIn('helper', vars(Plugin()))
+
+    def test_summary(self):
+        stats = Stats()
+        for latency in range(1, 101):
+            stats.add_request('POST /api/v0/results', latency / 1000, size=10)
+        stats.add_request('POST /api/v0/results', 1.0, size=10, failed=True)
+        stats.add_retry('POST /api/v0/results')
+        summary = stats.summary()
+        request = summary['requests']['POST /api/v0/results']
+        self.assertEqual(request['count'], 101)
+        self.assertEqual(request['failed'], 1)
+        self.assertEqual(request['p50'], 0.051)
+        self.assertEqual(request['max'], 1.0)
+        self.assertEqual(summary['bytes_on_wire'], 1010)
+        self.assertEqual(summary['retries'], 1)
+
+    def test_queue_depth_is_throttled(self):
+        stats = Stats(node='gw0')
+        for depth in (1, 1, 1, 5, 2):
+            stats.add_queue_depth(depth)
+        self.assertEqual([depth for _, depth in stats.queue_depth['gw0']], [1, 5])
+        self.assertEqual(stats.summary()['queue_depth']['gw0']['max'], 5)
+
+    def test_merge_worker_state(self):
+        stats = Stats()
+        stats.add_timing('pytest_sessionfinish', 1.0)
+        worker = Stats(node='gw0')
+        worker.add_timing('pytest_sessionfinish', 2.0)
+        worker.add_request('GET /auth/me', 0.1)
+        worker.add_queue_depth(3)
+        stats.merge(json.loads(json.dumps(worker.state())))
+        self.assertEqual(stats.timings['pytest_sessionfinish'], [2, 3.0, 2.0])
+        self.assertEqual(stats.summary()['requests']['GET /auth/me']['count'], 1)
+        self.assertIn('gw0', stats.queue_depth)
+        self.assertEqual(stats.merged, 1)
+
+    def test_dump(self):
+        stats = Stats()
+        stats.add_timing('pytest_runtest_logreport', 0.001)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stats.json')
+            stats.dump(path, session=dict(duration=1.0))
+            with open(path, encoding='utf-8') as file:
+                data = json.load(file)
+        self.assertEqual(data['timings']['pytest_runtest_logreport']['calls'], 1)
+        self.assertEqual(data['session']['duration'], 1.0)
+
+    def test_dump_keeps_other_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'test_many.py')
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write('def test_a():\n    pass\n')
+            with self.assertRaises(ValueError):
+                Stats().dump(path)
+            with open(path, encoding='utf-8') as file:
+                self.assertEqual(file.read(), 'def test_a():\n    pass\n')
+
+
+class TestTransportStats(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeOpenTmiServer().start()
+        self.stats = Stats()
+        self.transport = UploadTransport(self.server.url, retries=2, backoff=0.01, stats=self.stats)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_endpoint(self):
+        self.assertEqual(UploadTransport.endpoint(self.transport.put_json,
+                                                  'http://host/api/v0/testcases/5f2b8c0e9d1a4b3c2d1e0f9a'),
+                         'PUT /api/v0/testcases/:id')
+        self.assertEqual(UploadTransport.endpoint(self.transport.get_json, 'http://host/api/v0/testcases?tcid=a'),
+                         'GET /api/v0/testcases')
+
+    def test_requests_are_recorded(self):
+        self.server.fail_next = [503]
+        self.transport.post_result_data({'tcid': 'a'})
+        self.transport.upsert_testcase({'tcid': 'a'})
+        requests = self.stats.summary()['requests']
+        self.assertEqual(requests['POST /api/v0/results']['count'], 2)
+        self.assertEqual(requests['POST /api/v0/results']['failed'], 1)
+        self.assertEqual(requests['POST /api/v0/results']['retries'], 1)
+        self.assertEqual(requests['POST /api/v0/results']['bytes'], 2 * len('{"tcid":"a"}'))
+        self.assertEqual(requests['GET /api/v0/testcases']['count'], 1)
+        self.assertEqual(requests['POST /api/v0/testcases']['count'], 1)
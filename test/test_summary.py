@@ -0,0 +1,64 @@
+# pylint: disable=missing-docstring
+
+import unittest
+from pytest_opentmi import summary
+from pytest_opentmi.regression import DurationBaseline, RegressionCheck
+from pytest_opentmi.schedule import DurationHistory, Scheduler
+from pytest_opentmi.stats import Stats
+from pytest_opentmi.transport import UploadTransport
+
+
+class TerminalReporter:
+    def __init__(self):
+        self.lines = []
+
+    def write_sep(self, sep, title):
+        self.lines.append(f'{sep} {title}')
+
+    def write_line(self, line, **markup):  # pylint: disable=unused-argument
+        self.lines.append(line)
+
+
+class TestSummary(unittest.TestCase):
+
+    def test_transfer(self):
+        terminal = TerminalReporter()
+        transfer = dict(requests=3, bytes_sent=100, bytes_encoded=0, encode_time=0.0, testcases_skipped=1)
+        summary.write_transfer(terminal, UploadTransport('https://localhost'), transfer)
+        self.assertEqual(terminal.lines, ['opentmi: 3 requests, 100 bytes sent, 1 unchanged testcases skipped'])
+
+    def test_schedule(self):
+        terminal = TerminalReporter()
+        scheduler = Scheduler(DurationHistory(), shard=(2, 4))
+        scheduler.summary = dict(tests=5, known=4, estimated=12.34, deselected=15, failed_first=1)
+        summary.write_schedule(terminal, scheduler)
+        self.assertEqual(terminal.lines, ['opentmi: 5 tests scheduled 1 recently failed first, longest first, '
+                                          'shard 2/4, 4 with duration history, estimated 12.3s'])
+
+    def test_reruns(self):
+        terminal = TerminalReporter()
+        summary.write_reruns(terminal, dict(count=3, collapsed=2, flaky=1))
+        self.assertEqual(terminal.lines, ['opentmi: 3 reruns collapsed into 2 results, 1 flaky'])
+
+    def test_regressions(self):
+        terminal = TerminalReporter()
+        check = RegressionCheck(DurationBaseline(), None, mode='fail')
+        check.merge(dict(checked=3, found=[dict(tcid='a', nodeid='test_a.py::a', duration=2.0, median=1.0, score=4.0),
+                                           dict(tcid='b', nodeid='test_a.py::b', duration=3.0, median=1.0, score=9.0)]))
+        summary.write_regressions(terminal, check)
+        self.assertEqual(terminal.lines, [
+            'opentmi: 2 duration regressions in 3 performance tests compared to baseline '
+            '(session failed, --opentmi_regressions fail)',
+            '  test_a.py::b: 3.000s, baseline median 1.000s, score 9.0',
+            '  test_a.py::a: 2.000s, baseline median 1.000s, score 4.0'])
+
+    def test_stats(self):
+        terminal = TerminalReporter()
+        stats = Stats()
+        stats.add_timing('pytest_sessionfinish', 0.5)
+        summary.write_stats(terminal, stats, wall_time=10.0, path='stats.json')
+        self.assertEqual(terminal.lines[:3], ['- opentmi stats',
+                                              'opentmi: 0.500s spent in plugin hooks, 5.0% of 10.00s session',
+                                              '  pytest_sessionfinish: 1 calls, 0.500s, 500.000ms per call, '
+                                              'max 500.0ms'])
+        self.assertEqual(terminal.lines[-1], 'opentmi: stats are written to stats.json at exit')
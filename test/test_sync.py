@@ -0,0 +1,58 @@
+# pylint: disable=missing-docstring
+
+import unittest
+from pytest_opentmi.cache import TestcaseCache
+from pytest_opentmi.record import TestRecord
+from pytest_opentmi.sync import TestcaseSync
+
+
+class Item:
+    def __init__(self, nodeid, *markers):
+        self.nodeid = nodeid
+        self.location = (nodeid.split('::')[0], 1, nodeid.split('::')[-1])
+        self.keywords = dict.fromkeys((nodeid.split('::')[-1],) + markers, 1)
+
+    def obj(self):
+        """Test docstring"""
+
+
+class Login:
+    def __init__(self, logged_in):
+        self.logged_in = logged_in
+
+    def wait(self, retry=True):  # pylint: disable=unused-argument
+        return self.logged_in
+
+
+class TestTestcaseSync(unittest.TestCase):
+
+    def test_sync(self):
+        cache = TestcaseCache()
+        skipped = {'tcid': 'test_c', 'execution': {'skip': {'value': True}}}
+        cache.claim(skipped)
+        cache.confirm(skipped)
+        synced = []
+        sync = TestcaseSync(cache, lambda document: synced.append(document['tcid']) or True, Login(True))
+        sync.precompute([Item('test_a.py::test_a'), Item('test_a.py::test_b', 'skipif'), Item('test_a.py::test_c')])
+        self.assertEqual(sync.testcases['test_a']['other_info']['description'], 'Test docstring')
+        # skip marked and earlier synced with other document are synced only with results
+        self.assertEqual([document['tcid'] for document in sync.early()], ['test_a'])
+        sync.start()
+        self.assertEqual(sync.wait(), [])
+        self.assertEqual(synced, ['test_a'])
+        records = [TestRecord(f'test_a.py::{tcid}', tcid) for tcid in ('test_a', 'test_b', 'test_c', 'test_d')]
+        self.assertEqual([record.tcid for record in sync.pending(records)], ['test_b', 'test_c', 'test_d'])
+
+    def test_login_failed(self):
+        sync = TestcaseSync(TestcaseCache(), lambda document: True, Login(False))
+        sync.precompute([Item('test_a.py::test_a')])
+        sync.start()
+        self.assertEqual([document['tcid'] for document in sync.wait()], ['test_a'])
+        self.assertEqual(sync.wait(), [])
+
+    def test_skipped_document(self):
+        sync = TestcaseSync(TestcaseCache(), None, None)
+        record = TestRecord('test_a.py::test_a', 'test_a', description='doc', keywords=['smoke'])
+        record.skipped = True
+        record.skip_reason = 'later'
+        self.assertEqual(sync.document(record)['execution'], {'skip': {'value': True, 'reason': 'later'}})
@@ -0,0 +1,75 @@
+# pylint: disable=missing-docstring
+
+import time
+import unittest
+from pytest_opentmi.throttle import AdaptiveLimiter, CircuitBreaker
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def test_multiplicative_decrease(self):
+        limiter = AdaptiveLimiter(8)
+        limiter.acquire()
+        limiter.release(0.1, overloaded=True)
+        self.assertEqual(limiter.limit, 4)
+        limiter.acquire()
+        limiter.release(10)  # slow response
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.lowest, 2)
+
+    def test_additive_increase(self):
+        limiter = AdaptiveLimiter(8, initial=2)
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.1)
+        self.assertGreater(limiter.limit, 2)
+        self.assertLessEqual(limiter.limit, 8)
+
+    def test_min_limit(self):
+        limiter = AdaptiveLimiter(4, min_limit=2)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(0.1, overloaded=True)
+        self.assertEqual(limiter.limit, 2)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_open_after_threshold(self):
+        breaker = CircuitBreaker(threshold=3, cooldown=60)
+        for _ in range(2):
+            breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertTrue(breaker.is_open)
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.trips, 1)
+
+    def test_success_resets(self):
+        breaker = CircuitBreaker(threshold=2)
+        breaker.failure()
+        breaker.success()
+        breaker.failure()
+        self.assertFalse(breaker.is_open)
+
+    def test_half_open_probe(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0.05)
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        # only single probe at a time
+        self.assertFalse(breaker.allow())
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertFalse(breaker.is_open)
+        self.assertEqual(breaker.trips, 1)
+
+    def test_disabled(self):
+        breaker = CircuitBreaker(threshold=0)
+        for _ in range(100):
+            breaker.failure()
+        self.assertTrue(breaker.allow())
@@ -0,0 +1,79 @@
+# pylint: disable=missing-docstring
+
+import unittest
+from opentmi_client.utils import TransportException
+from pytest_opentmi.transport import CircuitOpenError, UploadTransport
+from .fake_server import FakeOpenTmiServer
+
+
+class TestUploadTransport(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeOpenTmiServer().start()
+        self.transport = UploadTransport(self.server.url, workers=2, timeout=5,
+                                         retries=3, backoff=0.01, backoff_max=0.05)
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_post_result(self):
+        data = self.transport.post_result_data({'tcid': 'a'})
+        self.assertEqual(data['tcid'], 'a')
+        self.assertEqual(self.transport.requests, 1)
+        self.assertEqual(self.transport.bytes_sent, len('{"tcid":"a"}'))
+
+    def test_gzip_above_threshold(self):
+        self.transport.gzip_threshold = 100
+        self.transport.post_result_data({'tcid': 'a'})
+        self.transport.post_result_data({'tcid': 'b', 'note': 'x' * 1000})
+        self.assertEqual([document['tcid'] for document in self.server.documents['/api/v0/results']], ['a', 'b'])
+        self.assertEqual(self.server.documents['/api/v0/results'][1]['note'], 'x' * 1000)
+        self.assertLess(self.transport.bytes_sent, 200)
+        self.assertGreater(self.transport.bytes_encoded, 1000)
+        self.assertEqual(self.transport.bytes_sent, self.server.bytes_received)
+
+    def test_retry_retryable_status(self):
+        self.server.fail_next = [503, 429]
+        self.transport.post_result_data({'tcid': 'a'})
+        self.assertEqual(self.transport.retries, 2)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_no_retry_client_error(self):
+        self.server.fail_next = [400]
+        with self.assertRaises(TransportException):
+            self.transport.post_result_data({'tcid': 'a'})
+        self.assertEqual(self.transport.retries, 0)
+
+    def test_give_up_after_retries(self):
+        self.server.fail_next = [500] * 10
+        with self.assertRaises(TransportException):
+            self.transport.post_result_data({'tcid': 'a'})
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_connection_error_is_retried(self):
+        self.server.stop()
+        transport = UploadTransport(self.server.url, retries=2, backoff=0.01)
+        with self.assertRaises(TransportException):
+            transport.post_result_data({'tcid': 'a'})
+        self.assertEqual(transport.retries, 2)
+        self.server = FakeOpenTmiServer().start()
+
+    def test_upsert_testcase(self):
+        self.transport.upsert_testcase({'tcid': 'a'})
+        self.assertEqual(self.server.requests, [('GET', '/api/v0/testcases?tcid=a'),
+                                                ('POST', '/api/v0/testcases')])
+
+    def test_backoff_delay(self):
+        for attempt in range(10):
+            self.assertLessEqual(self.transport.backoff_delay(attempt), 0.05)
+
+    def test_circuit_breaker_stops_requests(self):
+        self.server.fail_next = [503] * 100
+        transport = UploadTransport(self.server.url, retries=0, breaker_threshold=3, breaker_cooldown=60)
+        for _ in range(3):
+            with self.assertRaises(TransportException):
+                transport.post_result_data({'tcid': 'a'})
+        with self.assertRaises(CircuitOpenError):
+            transport.post_result_data({'tcid': 'a'})
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertLess(transport.limiter.limit, transport.limiter.max_limit)
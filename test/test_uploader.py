@@ -0,0 +1,42 @@
+# pylint: disable=missing-docstring
+
+import threading
+import unittest
+from pytest_opentmi.uploader import StreamUploader
+
+
+class TestStreamUploader(unittest.TestCase):
+
+    def test_process_all(self):
+        done = []
+        uploader = StreamUploader(workers=3, maxsize=2).start()
+        for index in range(20):
+            uploader.put(done.append, index)
+        uploader.close()
+        self.assertEqual(sorted(done), list(range(20)))
+        self.assertEqual(uploader.processed, 20)
+
+    def test_failing_job_does_not_stop_worker(self):
+        done = []
+
+        def fail(_):
+            raise ValueError('oh no')
+        uploader = StreamUploader(workers=1).start()
+        uploader.put(fail, 1)
+        uploader.put(done.append, 2)
+        uploader.close()
+        self.assertEqual(done, [2])
+
+    def test_put_blocks_when_full(self):
+        event = threading.Event()
+        uploader = StreamUploader(workers=1, maxsize=1).start()
+        uploader.put(lambda: event.wait(5))
+        uploader.put(lambda: None)
+        thread = threading.Thread(target=uploader.put, args=(lambda: None,))
+        thread.start()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        event.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        uploader.close()